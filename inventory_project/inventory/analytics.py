@@ -0,0 +1,244 @@
+"""
+Rollups behind the analytics endpoints.
+
+Sales are kept per user, per SKU and per supplier for each order day, and
+updated in the same transaction as the order: placing an order adds its
+lines, cancelling it (or deleting it) takes them out again, un-cancelling
+adds them back. Stock value is a daily snapshot taken by
+`manage.py refresh_analytics`, which can also rebuild the sales rollups
+from the order lines (after changes made outside the API, e.g. the admin).
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Case, Count, DecimalField, F, Max, Sum, Value, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from rest_framework import serializers
+
+from .instrumentation import MeasuredSerializerMixin
+from .models import DailySales, DailySkuSales, DailyStockValue, DailySupplierSales, InventoryItem, OrderItem
+
+CANCELLED = 'CANCELLED'
+ROLLUP_BATCH_SIZE = 1000
+DEFAULT_WINDOW_DAYS = 30
+MAX_WINDOW_DAYS = 366
+
+
+def counts_as_sale(status):
+    return status != CANCELLED
+
+
+def record_order(order, sign=1):
+    """Add the order's lines to the sales rollups, or take them out with sign=-1."""
+    lines = OrderItem.objects.filter(order=order).values_list(
+        'item__sku', 'item__supplier_id', 'quantity', 'price_at_order'
+    )
+    totals = {'orders': sign, 'units': 0, 'revenue': 0}
+    by_sku, by_supplier = {}, {}
+    for sku, supplier_id, quantity, price in lines:
+        line = {'units': sign * quantity, 'revenue': sign * quantity * price}
+        groups = [totals, by_sku.setdefault(sku, {})]
+        if supplier_id is not None:
+            groups.append(by_supplier.setdefault(supplier_id, {}))
+        for group in groups:
+            for field, amount in line.items():
+                group[field] = group.get(field, 0) + amount
+
+    day = timezone.localdate(order.created_at)
+    _increment(DailySales, order.user_id, day, None, {None: totals})
+    _increment(DailySkuSales, order.user_id, day, 'sku', by_sku)
+    _increment(DailySupplierSales, order.user_id, day, 'supplier_id', by_supplier)
+
+
+def order_status_changed(order, old_status):
+    was_sale, is_sale = counts_as_sale(old_status), counts_as_sale(order.status)
+    if was_sale != is_sale:
+        record_order(order, 1 if is_sale else -1)
+
+
+def order_deleted(order):
+    # Call before the delete: the order lines go with it.
+    if counts_as_sale(order.status):
+        record_order(order, -1)
+
+
+def _increment(model, user_id, day, key_field, totals):
+    """
+    Add `totals` ({key: {field: amount}}) to the (user, day, key) rows.
+    Missing rows are inserted first, ignoring conflicts, and then all of
+    them are incremented in place by one UPDATE, so concurrent orders for
+    the same day add up without a read-modify-write race.
+    """
+    if not totals:
+        return
+    keys = sorted(totals)
+    key_filter = (lambda key: {key_field: key}) if key_field else (lambda key: {})
+    model.objects.bulk_create(
+        [model(user_id=user_id, day=day, **key_filter(key)) for key in keys], ignore_conflicts=True
+    )
+
+    rows = model.objects.filter(user_id=user_id, day=day)
+    if key_field:
+        rows = rows.filter(**{f'{key_field}__in': keys})
+    increments = {}
+    for field in totals[keys[0]]:
+        output_field = model._meta.get_field(field)
+        if key_field:
+            amount = Case(
+                *[When(**key_filter(key), then=Value(totals[key][field])) for key in keys],
+                default=Value(0),
+                output_field=output_field,
+            )
+        else:
+            amount = Value(totals[None][field], output_field=output_field)
+        increments[field] = F(field) + amount
+    rows.update(**increments)
+
+
+def line_revenue():
+    return Sum(F('quantity') * F('price_at_order'), output_field=DecimalField(max_digits=14, decimal_places=2))
+
+
+@transaction.atomic
+def rebuild_sales(since=None):
+    """Recompute the sales rollups from the order lines, for every day or from `since` on."""
+    lines = OrderItem.objects.exclude(order__status=CANCELLED).order_by()
+    rollups = (DailySales, DailySkuSales, DailySupplierSales)
+    if since is not None:
+        lines = lines.filter(order__created_at__date__gte=since)
+    for model in rollups:
+        (model.objects.filter(day__gte=since) if since is not None else model.objects.all()).delete()
+
+    grouped = lines.values(owner=F('order__user_id'), order_day=TruncDate('order__created_at'))
+    aggregates = {'total_units': Sum('quantity'), 'total_revenue': line_revenue()}
+    sources = [
+        (DailySales, grouped.annotate(total_orders=Count('order', distinct=True), **aggregates), None),
+        (DailySkuSales, grouped.values('owner', 'order_day', 'item__sku').annotate(**aggregates), 'item__sku'),
+        (DailySupplierSales, grouped.filter(item__supplier__isnull=False)
+            .values('owner', 'order_day', 'item__supplier_id').annotate(**aggregates), 'item__supplier_id'),
+    ]
+    created = 0
+    for model, rows, key in sources:
+        objs = []
+        for row in rows.iterator():
+            obj = model(user_id=row['owner'], day=row['order_day'], units=row['total_units'], revenue=row['total_revenue'])
+            if model is DailySales:
+                obj.orders = row['total_orders']
+            elif key == 'item__sku':
+                obj.sku = row[key]
+            else:
+                obj.supplier_id = row[key]
+            objs.append(obj)
+        created += len(model.objects.bulk_create(objs, batch_size=ROLLUP_BATCH_SIZE))
+    return created
+
+
+@transaction.atomic
+def snapshot_stock_value(day=None):
+    """Store today's (or `day`'s) stock value per owner and supplier, replacing any earlier snapshot of that day."""
+    day = day or timezone.localdate()
+    DailyStockValue.objects.filter(day=day).delete()
+    rows = InventoryItem.objects.order_by().values('user_id', 'supplier_id').annotate(
+        item_count=Count('pk'),
+        total_units=Sum('quantity'),
+        total_value=Sum(F('quantity') * F('price'), output_field=DecimalField(max_digits=16, decimal_places=2)),
+    )
+    return len(DailyStockValue.objects.bulk_create([
+        DailyStockValue(
+            user_id=row['user_id'], supplier_id=row['supplier_id'], day=day,
+            items=row['item_count'], units=row['total_units'], value=row['total_value'],
+        )
+        for row in rows.iterator()
+    ], batch_size=ROLLUP_BATCH_SIZE))
+
+
+def scoped(model, user):
+    # Staff see everyone's figures, like everywhere else in the API.
+    return model.objects.all() if user.is_staff else model.objects.filter(user=user)
+
+
+def revenue_by_day(user, since, until):
+    rows = {
+        row['day']: row for row in
+        scoped(DailySales, user).filter(day__range=(since, until)).values('day').annotate(
+            orders=Sum('orders'), units=Sum('units'), revenue=Sum('revenue')
+        ).order_by()
+    }
+    # Every day in the window, so charts need not fill the gaps.
+    days = (since + timedelta(days=n) for n in range((until - since).days + 1))
+    return [rows.get(day, {'day': day, 'orders': 0, 'units': 0, 'revenue': 0}) for day in days]
+
+
+def top_skus(user, since, until, limit):
+    return list(
+        scoped(DailySkuSales, user).filter(day__range=(since, until)).values('sku')
+        .annotate(units=Sum('units'), revenue=Sum('revenue')).order_by('-units', 'sku')[:limit]
+    )
+
+
+def sales_by_supplier(user, since, until):
+    return list(
+        scoped(DailySupplierSales, user).filter(day__range=(since, until))
+        .values('supplier_id', supplier_name=F('supplier__name'))
+        .annotate(units=Sum('units'), revenue=Sum('revenue')).order_by('-revenue', 'supplier_id')
+    )
+
+
+def stock_value_by_supplier(user, day):
+    """The latest snapshot on or before `day`: (snapshot day, rows)."""
+    snapshots = scoped(DailyStockValue, user).filter(day__lte=day)
+    latest = snapshots.aggregate(latest=Max('day'))['latest']
+    if latest is None:
+        return None, []
+    return latest, list(
+        snapshots.filter(day=latest).values('supplier_id', supplier_name=F('supplier__name'))
+        .annotate(items=Sum('items'), units=Sum('units'), value=Sum('value')).order_by('-value', 'supplier_id')
+    )
+
+
+class AnalyticsParamsSerializer(serializers.Serializer):
+    since = serializers.DateField(required=False)
+    until = serializers.DateField(required=False)
+    limit = serializers.IntegerField(required=False, default=10, min_value=1, max_value=100)
+
+    def validate(self, attrs):
+        until = attrs.setdefault('until', timezone.localdate())
+        since = attrs.setdefault('since', until - timedelta(days=DEFAULT_WINDOW_DAYS - 1))
+        if since > until:
+            raise serializers.ValidationError({'since': 'Must not be after until.'})
+        if (until - since).days >= MAX_WINDOW_DAYS:
+            raise serializers.ValidationError({'since': f'The window is limited to {MAX_WINDOW_DAYS} days.'})
+        return attrs
+
+
+class RefreshParamsSerializer(serializers.Serializer):
+    rebuild_sales = serializers.BooleanField(required=False, default=False)
+    since = serializers.DateField(required=False)
+
+
+class SalesRowSerializer(MeasuredSerializerMixin, serializers.Serializer):
+    units = serializers.IntegerField()
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2)
+
+
+class DailyRevenueSerializer(SalesRowSerializer):
+    day = serializers.DateField()
+    orders = serializers.IntegerField()
+
+
+class SkuSalesSerializer(SalesRowSerializer):
+    sku = serializers.CharField()
+
+
+class SupplierSalesSerializer(SalesRowSerializer):
+    supplier_id = serializers.IntegerField()
+    supplier_name = serializers.CharField()
+
+
+class StockValueSerializer(MeasuredSerializerMixin, serializers.Serializer):
+    supplier_id = serializers.IntegerField(allow_null=True)
+    supplier_name = serializers.CharField(allow_null=True)
+    items = serializers.IntegerField()
+    units = serializers.IntegerField()
+    value = serializers.DecimalField(max_digits=16, decimal_places=2)
@@ -0,0 +1,149 @@
+"""
+Native async versions of the read-heavy endpoints, routed in place of the
+sync ones when ASYNC_READ_VIEWS is on (under ASGI). They authenticate, query
+and render on the event loop using the async ORM, instead of hopping to a
+thread for the whole request.
+
+Requests they don't handle natively - other methods, the browsable API,
+paginated / searched / delta / sparse inventory lists - are handed to the
+sync view, so behaviour is unchanged.
+
+Cache calls stay synchronous: Django's cache backends implement their
+async API by running the sync call in a thread, so calling them directly
+saves that hop.
+"""
+import functools
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import F
+from django.http import HttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import APIException, NotAcceptable, NotAuthenticated
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from . import views
+from .authentication import CachedJWTAuthentication
+from .caching import low_stock_cache_key
+from .models import InventoryItem
+from .renderers import FastJSONRenderer
+
+# Inventory list parameters that need pagination or the sync-only paths.
+SYNC_INVENTORY_PARAMS = ('cursor', 'page_size', 'page', 'q', 'fields', 'updated_since')
+
+
+def json_response(data, status=200):
+    response = HttpResponse(FastJSONRenderer().render(data), content_type='application/json', status=status)
+    response['Vary'] = 'Accept'
+    return response
+
+
+def error_response(exc):
+    data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+    response = json_response(data, status=exc.status_code)
+    if exc.status_code == 401:
+        response['WWW-Authenticate'] = CachedJWTAuthentication().authenticate_header(None)
+    return response
+
+
+def accepts_json(request):
+    renderers = [renderer() for renderer in api_settings.DEFAULT_RENDERER_CLASSES]
+    negotiator = api_settings.DEFAULT_CONTENT_NEGOTIATION_CLASS()
+    try:
+        renderer, media_type = negotiator.select_renderer(Request(request), renderers)
+    except NotAcceptable:
+        return None
+    return media_type if isinstance(renderer, JSONRenderer) else None
+
+
+def call_sync_view(view, request, *args, **kwargs):
+    # Render on the worker thread too, rather than in another hop from the handler.
+    response = view(request, *args, **kwargs)
+    if callable(getattr(response, 'render', None)):
+        response = response.render()
+    return response
+
+
+def async_read_view(sync_view, native=None):
+    """
+    Serve GETs that want JSON - and pass `native(request)`, if given - with
+    the decorated coroutine, called as view(request, media_type, *args).
+    Everything else goes to `sync_view`.
+    """
+    def decorator(func):
+        @csrf_exempt
+        @functools.wraps(func)
+        async def view(request, *args, **kwargs):
+            media_type = accepts_json(request) if request.method == 'GET' else None
+            if media_type is None or (native is not None and not native(request)):
+                return await sync_to_async(call_sync_view)(sync_view, request, *args, **kwargs)
+            try:
+                result = await CachedJWTAuthentication().aauthenticate(request)
+                if result is None:
+                    raise NotAuthenticated()
+                request.user = result[0]
+                return await func(request, media_type, *args, **kwargs)
+            except APIException as exc:
+                return error_response(exc)
+        return view
+    return decorator
+
+
+@async_read_view(views.get_current_user_info)
+async def get_current_user_info(request, media_type):
+    user = request.user
+    return json_response({
+        "username": user.username,
+        "email": user.email,
+        "is_staff": user.is_staff,
+    })
+
+
+@async_read_view(views.low_stock_items)
+async def low_stock_items(request, media_type):
+    user = request.user
+    cache_key = low_stock_cache_key(user)
+    data = views.cache.get(cache_key)
+    if data is None:
+        # From the primary, like the sync view.
+        items = InventoryItem.objects.using(DEFAULT_DB_ALIAS).filter(quantity__lt=F('threshold'))
+        if not user.is_staff:
+            items = items.filter(user=user)
+        data = await views.InventoryViewSet.row_serializer.arender(items)
+        views.cache.set(cache_key, data, settings.LOW_STOCK_CACHE_TIMEOUT)
+    return json_response(data)
+
+
+@async_read_view(views.order_history)
+async def order_history(request, media_type):
+    status_filter = request.GET.get('status', None)
+    orders = views.order_queryset().filter(user=request.user).order_by('-created_at')
+    if status_filter and status_filter != 'ALL':
+        orders = orders.filter(status=status_filter)
+    return json_response(await views.OrderViewSet.row_serializer.arender(orders))
+
+
+def unpaginated_inventory_list(request):
+    return settings.FAST_LIST_SERIALIZERS and not any(param in request.GET for param in SYNC_INVENTORY_PARAMS)
+
+
+@async_read_view(views.InventoryViewSet.as_view({'get': 'list', 'post': 'create'}), native=unpaginated_inventory_list)
+async def inventory_list(request, media_type):
+    """The unpaginated list, with filters, ordering and conditional GET."""
+    drf_request = Request(request)
+    drf_request.user = request.user
+    drf_request.accepted_media_type = media_type
+    view = views.InventoryViewSet(
+        request=drf_request, basename='inventory', action='list', detail=False, args=(), kwargs={}, format_kwarg=None,
+    )
+
+    queryset = view.filter_queryset(view.get_queryset())
+    etag, last_modified = view.stats_validators(await queryset.order_by().aaggregate(**view.collection_stats))
+    response = view.evaluate_preconditions(etag, last_modified)
+    if response is None:
+        response = json_response(await view.row_serializer.arender(queryset))
+        view.validator_headers(response, etag, last_modified)
+    return response
@@ -0,0 +1,106 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+
+from .caching import cache_is_shared, user_cache_key
+
+# Everything the views and permission checks read from request.user.
+CACHED_USER_FIELDS = ('id', 'username', 'email', 'first_name', 'last_name', 'is_active', 'is_staff', 'is_superuser')
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that caches the user's identity and staff flags for
+    JWT_USER_CACHE_SECONDS, so authenticated requests need no query to
+    rebuild request.user. The token itself is still verified on every
+    request.
+
+    The cached user is built with the remaining fields (password,
+    last_login, ...) deferred; they load on first access. Entries are kept
+    per token and dropped when the user is saved or deleted. Only a cache
+    shared by all workers is used: with a per-process one, a user who was
+    deactivated or lost is_staff would keep that access on other workers.
+    Entries are filled from the primary for the same reason: this lookup
+    runs before request.user is set, so the router would send it to a
+    replica that may not have seen the change yet.
+    """
+
+    def get_user(self, validated_token):
+        key = self.cache_key(validated_token)
+        if key is None:
+            return super().get_user(validated_token)
+
+        values = cache.get(key)
+        if values is not None:
+            return self.cached_user(values)
+        try:
+            user = self.primary_users().get(**self.user_lookup(validated_token))
+        except self.user_model.DoesNotExist:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        self.check_active(user)
+        return self.remember(key, user)
+
+    async def aauthenticate(self, request):
+        """authenticate() for async views: the user lookup uses the async ORM."""
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        return await self.aget_user(validated_token), validated_token
+
+    async def aget_user(self, validated_token):
+        key = self.cache_key(validated_token)
+        if key is None:
+            return await sync_to_async(super().get_user)(validated_token)
+
+        values = cache.get(key)
+        if values is not None:
+            return self.cached_user(values)
+        try:
+            user = await self.primary_users().aget(**self.user_lookup(validated_token))
+        except self.user_model.DoesNotExist:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        self.check_active(user)
+        return self.remember(key, user)
+
+    def cache_key(self, validated_token):
+        # Token revocation checks need the password hash, so skip the cache.
+        if api_settings.CHECK_REVOKE_TOKEN or not settings.JWT_USER_CACHE_SECONDS or not cache_is_shared():
+            return None
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        token_id = validated_token.get(api_settings.JTI_CLAIM)
+        if user_id is None or token_id is None:
+            return None
+        return user_cache_key(user_id, token_id)
+
+    def primary_users(self):
+        return self.user_model._default_manager.db_manager(DEFAULT_DB_ALIAS)
+
+    def user_lookup(self, validated_token):
+        return {api_settings.USER_ID_FIELD: validated_token[api_settings.USER_ID_CLAIM]}
+
+    def cached_fields(self):
+        # from_db() wants the values in model field order.
+        return [field.attname for field in self.user_model._meta.concrete_fields if field.attname in CACHED_USER_FIELDS]
+
+    def remember(self, key, user):
+        values = [getattr(user, field) for field in self.cached_fields()]
+        cache.set(key, values, settings.JWT_USER_CACHE_SECONDS)
+        return user
+
+    def cached_user(self, values):
+        user = self.user_model.from_db(DEFAULT_DB_ALIAS, self.cached_fields(), values)
+        self.check_active(user)
+        return user
+
+    def check_active(self, user):
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
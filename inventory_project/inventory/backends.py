@@ -0,0 +1,47 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from rest_framework.exceptions import Throttled
+from rest_framework.request import Request
+
+from . import hashing
+
+UserModel = get_user_model()
+
+
+class PooledModelBackend(ModelBackend):
+    """
+    ModelBackend whose password checks run on the bounded hashing pool (see
+    inventory.hashing), so /api/token/ answers 429 under a login burst
+    instead of tying up every worker. Other callers, like the admin login,
+    get a failed sign-in.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        try:
+            return self.authenticate_pooled(username, password, **kwargs)
+        except Throttled:
+            # Only DRF turns this into a 429; the admin login and other
+            # plain authenticate() callers would answer 500, so they see a
+            # failed sign-in instead.
+            if isinstance(request, Request):
+                raise
+            return None
+
+    def authenticate_pooled(self, username, password, **kwargs):
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = UserModel._default_manager.get_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            # Hash anyway so unknown usernames take as long as wrong passwords.
+            hashing.make_password(password)
+            return None
+
+        if not hashing.check_password(password, user.password) or not self.user_can_authenticate(user):
+            return None
+        if hashing.must_update(user.password):
+            user.password = hashing.make_password(password)
+            user.save(update_fields=['password'])
+        return user
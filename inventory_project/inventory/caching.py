@@ -0,0 +1,76 @@
+import time
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+
+# Generation counters version every cached inventory result. Writes bump the
+# counter instead of deleting keys, so stale entries simply stop being read
+# and age out of the cache on their own.
+#
+# Scopes:
+#   <user id>  items owned by that user
+#   'all'      every item (the staff view); bumped by any inventory write
+#   'shared'   suppliers and usernames, which are nested in every item
+#   'user:<id>' the cached JWT identity of that user (authentication.py)
+ALL_SCOPE = 'all'
+SHARED_SCOPE = 'shared'
+
+
+def _generation_key(scope):
+    return f'inventory:generation:{scope}'
+
+
+def get_generations(*scopes):
+    keys = {_generation_key(scope): scope for scope in scopes}
+    found = cache.get_many(keys)
+    generations = {}
+    for key, scope in keys.items():
+        if key not in found:
+            # Seed with the clock rather than 0 so a counter that was evicted
+            # can never come back at a value an old entry was cached under.
+            cache.add(key, time.time_ns(), None)
+            found[key] = cache.get(key)
+        generations[scope] = found[key]
+    return [generations[scope] for scope in scopes]
+
+
+def bump_generations(*scopes):
+    for scope in scopes:
+        key = _generation_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), None)
+
+
+def inventory_changed(user_ids):
+    bump_generations(ALL_SCOPE, *set(user_ids))
+
+
+def low_stock_cache_key(user):
+    # Build the key before reading the database: a write that lands in
+    # between bumps the generation, so the result is stored under a key
+    # that is already out of date rather than one that looks current.
+    scope = ALL_SCOPE if user.is_staff else user.pk
+    generation, shared_generation = get_generations(scope, SHARED_SCOPE)
+    return f'inventory:low-stock:{scope}:{generation}:{shared_generation}'
+
+
+def _user_scope(user_id):
+    return f'user:{user_id}'
+
+
+def user_cache_key(user_id, token_id):
+    # Per token, and versioned like the inventory keys so that forgetting a
+    # user drops the entries of all their tokens at once.
+    generation, = get_generations(_user_scope(user_id))
+    return f'inventory:jwt-user:{user_id}:{generation}:{token_id}'
+
+
+def forget_user(user_id):
+    bump_generations(_user_scope(user_id))
+
+
+def cache_is_shared():
+    """False for the per-process locmem cache, whose invalidations other processes never see."""
+    return not isinstance(caches['default'], LocMemCache)
@@ -0,0 +1,114 @@
+import hashlib
+
+from django.db import transaction
+from django.db.models import Count, Max
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+from .caching import get_generations
+
+
+def make_etag(*parts):
+    return quote_etag(hashlib.md5(repr(parts).encode(), usedforsecurity=False).hexdigest())
+
+
+class ConditionalRequestMixin:
+    """
+    ETag / Last-Modified support for viewsets over models with `updated_at`.
+
+    list: the ETag is derived from (max(updated_at), count) of the filtered
+    queryset, so a matching If-None-Match is answered with 304 after one
+    aggregate query and before any rows are fetched or serialized.
+    retrieve/update/destroy: per-object ETag from `updated_at`; a stale
+    If-Match on a write gets 412, which gives optimistic concurrency.
+
+    Both also fold in the cache generations of `etag_scopes`, for nested data
+    (suppliers, usernames, item names) whose changes do not touch
+    `updated_at`. Validation uses the ETag only: Last-Modified is sent for
+    information, as it cannot reflect deletes or nested changes.
+    """
+    etag_scopes = ()
+    collection_stats = {'last_modified': Max('updated_at'), 'count': Count('pk')}
+
+    def etag_parts(self):
+        request = self.request
+        return (
+            self.basename,
+            request.user.pk,
+            request.accepted_media_type,
+            request.get_full_path(),
+            *get_generations(*self.etag_scopes),
+        )
+
+    def collection_validators(self, queryset):
+        return self.stats_validators(queryset.order_by().aggregate(**self.collection_stats))
+
+    def stats_validators(self, stats):
+        etag = make_etag(*self.etag_parts(), stats['last_modified'], stats['count'])
+        return etag, stats['last_modified']
+
+    def object_validators(self, instance):
+        return make_etag(*self.etag_parts(), instance.pk, instance.updated_at), instance.updated_at
+
+    def validator_headers(self, response, etag, last_modified):
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified.timestamp())
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    def evaluate_preconditions(self, etag, last_modified):
+        """A 304/412 response if the request's preconditions say so, else None."""
+        headers = self.validator_headers(HttpResponse(), etag, last_modified)
+        response = get_conditional_response(self.request, etag=etag, response=headers)
+        return None if response is headers else response
+
+    def list(self, request, *args, **kwargs):
+        etag, last_modified = self.collection_validators(self.filter_queryset(self.get_queryset()))
+        response = self.evaluate_preconditions(etag, last_modified)
+        if response is None:
+            response = super().list(request, *args, **kwargs)
+            self.validator_headers(response, etag, last_modified)
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        etag, last_modified = self.object_validators(instance)
+        response = self.evaluate_preconditions(etag, last_modified)
+        if response is None:
+            response = self.validator_headers(Response(self.get_serializer(instance).data), etag, last_modified)
+        return response
+
+    def has_preconditions(self):
+        meta = self.request.META
+        return 'HTTP_IF_MATCH' in meta or 'HTTP_IF_NONE_MATCH' in meta
+
+    def locked_preconditions(self):
+        # Lock the row so nobody else can change it between the check and the write.
+        instance = self.get_object()
+        instance.updated_at = type(instance)._default_manager.select_for_update().values_list(
+            'updated_at', flat=True
+        ).get(pk=instance.pk)
+        return self.evaluate_preconditions(*self.object_validators(instance))
+
+    def update(self, request, *args, **kwargs):
+        with transaction.atomic():
+            response = self.locked_preconditions() if self.has_preconditions() else None
+            if response is None:
+                response = super().update(request, *args, **kwargs)
+        if response.status_code == 200 and hasattr(self, 'updated_object'):
+            self.validator_headers(response, *self.object_validators(self.updated_object))
+        return response
+
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        self.updated_object = serializer.instance
+
+    def destroy(self, request, *args, **kwargs):
+        with transaction.atomic():
+            response = self.locked_preconditions() if self.has_preconditions() else None
+            if response is None:
+                response = super().destroy(request, *args, **kwargs)
+        return response
@@ -0,0 +1,33 @@
+"""
+The inventory CSV export: streamed by the export view, or written to a file
+by the background job in inventory.tasks.
+"""
+import csv
+
+from .models import InventoryItem
+
+CSV_EXPORT_HEADER = ['Name', 'SKU', 'Quantity', 'Price', 'Supplier', 'Expiration Date', 'Threshold', 'Added By']
+CSV_EXPORT_COLUMNS = ('name', 'sku', 'quantity', 'price', 'supplier__name', 'expiration_date', 'threshold', 'user__username')
+CSV_EXPORT_CHUNK_SIZE = 2000
+
+
+def export_items(user):
+    return InventoryItem.objects.all() if user.is_staff else InventoryItem.objects.filter(user=user)
+
+
+def export_rows(user, using=None):
+    items = export_items(user).using(using) if using else export_items(user)
+    return items.values_list(*CSV_EXPORT_COLUMNS).iterator(chunk_size=CSV_EXPORT_CHUNK_SIZE)
+
+
+class Echo:
+    """File-like object whose write() hands the formatted line straight back."""
+    def write(self, value):
+        return value
+
+
+def stream_csv(header, rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(header)
+    for row in rows:
+        yield writer.writerow(row)
@@ -0,0 +1,265 @@
+"""
+Read-only list rendering straight from `.values()` rows.
+
+A RowSerializer produces the same dicts as its DRF serializer without
+building model instances or dispatching through serializer fields per row:
+each field is compiled once into a plain row accessor. Values that need
+formatting (decimals, dates, datetimes) still go through the DRF field's own
+to_representation, so the rendered JSON is byte-identical.
+"""
+from decimal import Decimal
+from operator import itemgetter
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from .instrumentation import serializing
+from .models import Discount, Order, OrderItem
+from .serializers import DiscountSerializer, InventorySerializer, OrderItemSerializer, OrderSerializer
+
+FORMATTED_FIELDS = (serializers.DecimalField, serializers.DateTimeField, serializers.DateField)
+RELATED_BATCH_SIZE = 2000
+
+# Returned by an accessor when DRF would leave the key out altogether.
+SKIP = object()
+
+
+def _datetime_formatter(field, current_timezone):
+    # DateTimeField.to_representation, minus its per-value timezone lookup.
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    field_timezone = getattr(field, 'timezone', current_timezone)
+    if output_format is None or output_format.lower() != ISO_8601 or field_timezone is None:
+        return field.to_representation
+
+    def formatter(value):
+        if isinstance(value, str) or timezone.is_naive(value):
+            return field.to_representation(value)
+        value = value.astimezone(field_timezone).isoformat()
+        if value.endswith('+00:00'):
+            value = value[:-6] + 'Z'
+        return value
+    return formatter
+
+
+def _decimal_formatter(field):
+    # DecimalField.to_representation, skipping the quantize for values the
+    # database already returns at the field's precision.
+    coerce_to_string = getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+    if not coerce_to_string or field.localize or field.normalize_output or field.decimal_places is None:
+        return field.to_representation
+    exponent = -field.decimal_places
+
+    def formatter(value):
+        if type(value) is not Decimal or value.as_tuple().exponent != exponent:
+            return field.to_representation(value)
+        return f'{value:f}'
+    return formatter
+
+
+def _formatter(field, current_timezone):
+    if isinstance(field, serializers.DateTimeField):
+        return _datetime_formatter(field, current_timezone)
+    if isinstance(field, serializers.DecimalField):
+        return _decimal_formatter(field)
+    return field.to_representation
+
+
+def _formatted(get, formatter):
+    def accessor(row):
+        value = get(row)
+        return None if value is None else formatter(value)
+    return accessor
+
+
+def _guarded(guard, get):
+    # Fields sourced through a nullable relation are omitted (DRF's SkipField)
+    # when the relation is empty.
+    def accessor(row):
+        if row[guard] is None:
+            return SKIP
+        return get(row)
+    return accessor
+
+
+def _nested(guard, fields):
+    def accessor(row):
+        if row[guard] is None:
+            return None
+        return _build(row, fields)
+    return accessor
+
+
+def _build(row, fields):
+    data = {}
+    for name, accessor in fields:
+        value = accessor(row)
+        if value is not SKIP:
+            data[name] = value
+    return data
+
+
+def compile_fields(serializer, current_timezone, prefix='', computed=None):
+    """
+    Compile the readable fields of `serializer` into (name, accessor) pairs,
+    and collect the `.values()` columns the accessors read.
+    """
+    computed = computed or {}
+    fields, columns = [], []
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        if name in computed:
+            fields.append((name, computed[name]))
+            continue
+
+        path = field.source.split('.')
+        column = prefix + '__'.join(path)
+        guard = prefix + '__'.join(path[:-1]) if len(path) > 1 else None
+        if isinstance(field, serializers.BaseSerializer):
+            nested_fields, nested_columns = compile_fields(field, current_timezone, prefix=column + '__')
+            fields.append((name, _nested(column, nested_fields)))
+            columns.append(column)
+            columns.extend(nested_columns)
+            continue
+
+        accessor = itemgetter(column)
+        if isinstance(field, FORMATTED_FIELDS):
+            accessor = _formatted(accessor, _formatter(field, current_timezone))
+        if guard:
+            accessor = _guarded(guard, accessor)
+            columns.append(guard)
+        fields.append((name, accessor))
+        columns.append(column)
+    return fields, list(dict.fromkeys(columns))
+
+
+def _current_timezone():
+    return timezone.get_current_timezone() if settings.USE_TZ else None
+
+
+class RowSerializer:
+    """
+    Compiled once per active timezone, since datetimes are rendered in it.
+    """
+    serializer_class = None
+
+    def __init__(self):
+        self.serializer = self.serializer_class()
+        self.compiled = {}
+        self.columns = self.compile(_current_timezone())[1]
+
+    def compile(self, current_timezone):
+        if current_timezone not in self.compiled:
+            self.compiled[current_timezone] = compile_fields(
+                self.serializer, current_timezone, computed=self.computed_fields()
+            )
+        return self.compiled[current_timezone]
+
+    def computed_fields(self):
+        return {}
+
+    def values(self, queryset):
+        return queryset.select_related(None).prefetch_related(None).values(*self.columns)
+
+    def render(self, rows):
+        fields = self.compile(_current_timezone())[0]
+        with serializing():
+            return [_build(row, fields) for row in rows]
+
+    async def arender(self, queryset):
+        """Fetch `queryset` with the async ORM and render it."""
+        return self.render([row async for row in self.values(queryset)])
+
+
+class InventoryRowSerializer(RowSerializer):
+    serializer_class = InventorySerializer
+
+
+class DiscountRowSerializer(RowSerializer):
+    serializer_class = DiscountSerializer
+
+
+class OrderItemRowSerializer(RowSerializer):
+    serializer_class = OrderItemSerializer
+
+
+class OrderRowSerializer(RowSerializer):
+    """
+    Orders plus their items and discounts: one query for the orders and one
+    per RELATED_BATCH_SIZE orders for each relation, grouped in Python.
+    """
+    serializer_class = OrderSerializer
+
+    def __init__(self):
+        self.items = OrderItemRowSerializer()
+        self.discounts = DiscountRowSerializer()
+        super().__init__()
+
+    def computed_fields(self):
+        labels = dict(Order._meta.get_field('status').flatchoices)
+        return {
+            'items': lambda row: row['items'],
+            'discounts': lambda row: row['discounts'],
+            'status_display': lambda row: labels.get(row['status'], row['status']),
+        }
+
+    def render(self, rows):
+        rows = list(rows)
+        items, discounts = {}, {}
+        for order_ids in self.batches(rows):
+            self.group(items, self.items, list(self.related(OrderItem, self.items, order_ids)))
+            self.group(discounts, self.discounts, list(self.related(Discount, self.discounts, order_ids)))
+        return self.finish(rows, items, discounts)
+
+    async def arender(self, queryset):
+        rows = [row async for row in self.values(queryset)]
+        items, discounts = {}, {}
+        for order_ids in self.batches(rows):
+            self.group(items, self.items, [row async for row in self.related(OrderItem, self.items, order_ids)])
+            self.group(discounts, self.discounts, [row async for row in self.related(Discount, self.discounts, order_ids)])
+        return self.finish(rows, items, discounts)
+
+    def batches(self, rows):
+        for start in range(0, len(rows), RELATED_BATCH_SIZE):
+            yield [row['id'] for row in rows[start:start + RELATED_BATCH_SIZE]]
+
+    def related(self, model, serializer, order_ids):
+        return model.objects.filter(order_id__in=order_ids).order_by('pk').values(*serializer.columns, 'order_id')
+
+    def group(self, groups, serializer, rows):
+        for row, data in zip(rows, serializer.render(rows)):
+            groups.setdefault(row['order_id'], []).append(data)
+
+    def finish(self, rows, items, discounts):
+        for row in rows:
+            row['items'] = items.get(row['id'], [])
+            row['discounts'] = discounts.get(row['id'], [])
+        return super().render(rows)
+
+
+class RowListMixin:
+    """
+    Renders the list action with `row_serializer` instead of the view's
+    serializer while settings.FAST_LIST_SERIALIZERS is on.
+    """
+    row_serializer = None
+
+    def use_row_serializer(self):
+        return settings.FAST_LIST_SERIALIZERS
+
+    def list(self, request, *args, **kwargs):
+        if not self.use_row_serializer():
+            return super().list(request, *args, **kwargs)
+        queryset = self.row_serializer.values(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(self.row_serializer.render(page))
+        return Response(self.row_serializer.render(queryset))
+
+    def serialize_rows(self, queryset):
+        if self.use_row_serializer():
+            return self.row_serializer.render(self.row_serializer.values(queryset))
+        return self.get_serializer(queryset, many=True).data
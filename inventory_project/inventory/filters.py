@@ -0,0 +1,71 @@
+from datetime import timedelta
+
+from django.db.models import F
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.filters import BaseFilterBackend, OrderingFilter
+
+
+class InventoryFilterParamsSerializer(serializers.Serializer):
+    supplier = serializers.IntegerField(required=False, min_value=1)
+    expires_before = serializers.DateField(required=False)
+    expires_after = serializers.DateField(required=False)
+    expires_within = serializers.IntegerField(required=False, min_value=0)
+    min_quantity = serializers.IntegerField(required=False, min_value=0)
+    max_quantity = serializers.IntegerField(required=False, min_value=0)
+    low_stock = serializers.BooleanField(required=False, allow_null=True, default=None)
+
+
+class ExpiringParamsSerializer(serializers.Serializer):
+    within = serializers.IntegerField(required=False, default=7, min_value=0, max_value=365)
+
+
+class InventoryFilterBackend(BaseFilterBackend):
+    """
+    Server-side filters for the inventory list:
+
+        ?supplier=<id>
+        ?expires_before=YYYY-MM-DD  ?expires_after=YYYY-MM-DD
+        ?expires_within=<days>      (expiring between today and today + days)
+        ?min_quantity=<n>           ?max_quantity=<n>
+        ?low_stock=true|false       (quantity below threshold)
+
+    Invalid values are rejected with a 400.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        # A plain dict: as a QueryDict, missing booleans would read as False.
+        params = InventoryFilterParamsSerializer(data=request.query_params.dict())
+        params.is_valid(raise_exception=True)
+        filters = params.validated_data
+
+        if 'supplier' in filters:
+            queryset = queryset.filter(supplier_id=filters['supplier'])
+        if 'expires_before' in filters:
+            queryset = queryset.filter(expiration_date__lt=filters['expires_before'])
+        if 'expires_after' in filters:
+            queryset = queryset.filter(expiration_date__gt=filters['expires_after'])
+        if 'expires_within' in filters:
+            today = timezone.localdate()
+            queryset = queryset.filter(
+                expiration_date__gte=today,
+                expiration_date__lte=today + timedelta(days=filters['expires_within'])
+            )
+        if 'min_quantity' in filters:
+            queryset = queryset.filter(quantity__gte=filters['min_quantity'])
+        if 'max_quantity' in filters:
+            queryset = queryset.filter(quantity__lte=filters['max_quantity'])
+        if filters.get('low_stock') is True:
+            queryset = queryset.filter(quantity__lt=F('threshold'))
+        elif filters.get('low_stock') is False:
+            queryset = queryset.filter(quantity__gte=F('threshold'))
+        return queryset
+
+
+class InventoryOrderingFilter(OrderingFilter):
+    """?ordering= on the view's ordering_fields; ranked search results keep rank order by default."""
+
+    def get_default_ordering(self, view):
+        if view.search_query():
+            return None
+        return super().get_default_ordering(view)
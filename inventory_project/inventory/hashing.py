@@ -0,0 +1,96 @@
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import django
+from django.conf import settings
+from django.contrib.auth import hashers
+from rest_framework.exceptions import Throttled
+
+
+class ConfigurablePBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    """
+    Django's PBKDF2 hasher with the work factor taken from
+    PASSWORD_HASH_ITERATIONS. Same algorithm name, so existing hashes keep
+    verifying and are re-hashed at the configured cost on the next login.
+    """
+
+    @property
+    def iterations(self):
+        return settings.PASSWORD_HASH_ITERATIONS or hashers.PBKDF2PasswordHasher.iterations
+
+
+class HashingPool:
+    """
+    Runs password hashing on a bounded pool, so a burst of logins cannot take
+    every worker thread's CPU. At most `workers` hashes run at once and
+    `queue_size` more may wait; past that callers get a 429 instead of
+    queueing without bound.
+
+    mode is 'thread' (hashlib releases the GIL while hashing), 'process',
+    or 'inline' to hash on the calling thread as Django normally does.
+    """
+
+    def __init__(self, mode, workers, queue_size):
+        self.mode = mode
+        self.workers = workers
+        self.queue_size = queue_size
+        self.slots = threading.BoundedSemaphore(workers + queue_size)
+        self.executor = None
+        self.lock = threading.Lock()
+
+    def get_executor(self):
+        with self.lock:
+            if self.executor is None:
+                if self.mode == 'process':
+                    self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=django.setup)
+                else:
+                    self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='password-hashing')
+            return self.executor
+
+    def run(self, func, *args):
+        if self.mode == 'inline':
+            return func(*args)
+        if not self.slots.acquire(blocking=False):
+            raise Throttled(wait=settings.PASSWORD_HASH_RETRY_AFTER, detail='Too many sign-ins in progress, retry shortly.')
+        try:
+            return self.get_executor().submit(func, *args).result()
+        finally:
+            self.slots.release()
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    config = (settings.PASSWORD_HASH_MODE, settings.PASSWORD_HASH_WORKERS, settings.PASSWORD_HASH_QUEUE_SIZE)
+    with _pool_lock:
+        if _pool is None or (_pool.mode, _pool.workers, _pool.queue_size) != config:
+            if _pool is not None:
+                _pool.shutdown()
+            _pool = HashingPool(*config)
+        return _pool
+
+
+def make_password(password):
+    return get_pool().run(hashers.make_password, password)
+
+
+def check_password(password, encoded):
+    """Like django.contrib.auth.hashers.check_password, without the setter."""
+    return get_pool().run(hashers.check_password, password, encoded)
+
+
+def must_update(encoded):
+    # The upgrade test check_password() would do before calling its setter.
+    preferred = hashers.get_hasher('default')
+    try:
+        hasher = hashers.identify_hasher(encoded)
+    except ValueError:
+        return False
+    return hasher.algorithm != preferred.algorithm or preferred.must_update(encoded)
@@ -0,0 +1,186 @@
+import csv
+import json
+
+from django.db import DatabaseError, transaction
+
+from .models import InventoryItem, Supplier
+from .serializers import InventoryImportSerializer
+from .signals import stock_changed
+
+IMPORT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+
+CSV_CONTENT_TYPES = ('text/csv', 'application/csv')
+NDJSON_CONTENT_TYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl')
+
+UPSERT_FIELDS = ['name', 'quantity', 'price', 'supplier', 'expiration_date', 'threshold', 'updated_at']
+# As on a PATCH, a new expiration date clears expired_at so the expiry job
+# looks at the item again; re-importing the same date keeps it expired.
+REDATED_UPSERT_FIELDS = UPSERT_FIELDS + ['expired_at']
+
+
+def detect_format(content_type, filename=''):
+    content_type = (content_type or '').split(';')[0].strip().lower()
+    filename = (filename or '').lower()
+    if content_type in CSV_CONTENT_TYPES or filename.endswith('.csv'):
+        return 'csv'
+    if content_type in NDJSON_CONTENT_TYPES or filename.endswith(('.ndjson', '.jsonl')):
+        return 'ndjson'
+    return None
+
+
+def _decoded_lines(stream):
+    first = True
+    for line in stream:
+        line = line.decode('utf-8', errors='replace')
+        if first:
+            line = line.lstrip('\ufeff')
+            first = False
+        yield line
+
+
+def iter_csv_rows(stream):
+    """Yield (row number, dict) pairs from a CSV upload with a header row."""
+    reader = csv.DictReader(_decoded_lines(stream))
+    for number, row in enumerate(reader, start=1):
+        yield number, row
+
+
+def iter_ndjson_rows(stream):
+    """Yield (line number, dict) pairs from an NDJSON upload, skipping blank lines."""
+    for number, line in enumerate(_decoded_lines(stream), start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as exc:
+            row = exc
+        yield number, row
+
+
+ROW_READERS = {
+    'csv': iter_csv_rows,
+    'ndjson': iter_ndjson_rows,
+}
+
+
+class InventoryImport:
+    """
+    Upserts rows into one user's inventory in batches.
+
+    The user's existing SKUs are loaded once up front; rows are then
+    validated without touching the database and written with one
+    INSERT ... ON CONFLICT (user, sku) DO UPDATE per batch. Bad rows are
+    reported and skipped rather than aborting the file; a batch the
+    database rejects is retried row by row to find the rows at fault.
+    """
+
+    def __init__(self, user, batch_size=IMPORT_BATCH_SIZE):
+        self.user = user
+        self.batch_size = batch_size
+        # SKU -> expiration date, to tell which rows change the date.
+        self.existing_skus = dict(InventoryItem.objects.filter(user=user).values_list('sku', 'expiration_date'))
+        self.seen_skus = set()
+        self.created = 0
+        self.updated = 0
+        self.error_count = 0
+        self.errors = []
+
+    def add_error(self, row_number, errors):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': row_number, 'errors': errors})
+
+    def validate(self, row_number, row):
+        if not isinstance(row, dict):
+            self.add_error(row_number, {'non_field_errors': ['Row is not a JSON object.']})
+            return None
+
+        # Blank CSV cells mean "not provided" for the optional columns.
+        data = {key: value for key, value in row.items() if key is not None and value not in ('', None)}
+        serializer = InventoryImportSerializer(data=data)
+        if not serializer.is_valid():
+            self.add_error(row_number, serializer.errors)
+            return None
+
+        values = serializer.validated_data
+        if values['sku'] in self.seen_skus:
+            self.add_error(row_number, {'sku': [f"SKU '{values['sku']}' appears more than once in this file."]})
+            return None
+        self.seen_skus.add(values['sku'])
+        return values
+
+    def run(self, rows):
+        batch = []
+        for row_number, row in rows:
+            values = self.validate(row_number, row)
+            if values is None:
+                continue
+            batch.append((row_number, values))
+            if len(batch) >= self.batch_size:
+                self.write(batch)
+                batch = []
+        if batch:
+            self.write(batch)
+        return self
+
+    def write(self, batch):
+        supplier_ids = {values['supplier_id'] for _, values in batch if values.get('supplier_id')}
+        known_suppliers = set(Supplier.objects.filter(pk__in=supplier_ids).values_list('pk', flat=True))
+
+        rows = []
+        for row_number, values in batch:
+            supplier_id = values.pop('supplier_id', None)
+            if supplier_id and supplier_id not in known_suppliers:
+                self.add_error(row_number, {'supplier_id': [f'Supplier {supplier_id} does not exist.']})
+                continue
+            rows.append((row_number, InventoryItem(user=self.user, supplier_id=supplier_id, **values)))
+        if not rows:
+            return
+        items = [item for _, item in rows]
+
+        try:
+            with transaction.atomic():
+                self.upsert(items)
+        except DatabaseError:
+            items = []
+            for row_number, item in rows:
+                try:
+                    with transaction.atomic():
+                        self.upsert([item])
+                except DatabaseError as exc:
+                    self.add_error(row_number, {'non_field_errors': [f'Row could not be saved: {exc}']})
+                else:
+                    items.append(item)
+            if not items:
+                return
+
+        for item in items:
+            if item.sku in self.existing_skus:
+                self.updated += 1
+            else:
+                self.created += 1
+            self.existing_skus[item.sku] = item.expiration_date
+        stock_changed.send(sender=InventoryItem, user_ids={self.user.pk})
+
+    def upsert(self, items):
+        kept, redated = [], []
+        for item in items:
+            previous = self.existing_skus.get(item.sku, item.expiration_date)
+            (kept if previous == item.expiration_date else redated).append(item)
+        for group, fields in ((kept, UPSERT_FIELDS), (redated, REDATED_UPSERT_FIELDS)):
+            if group:
+                InventoryItem.objects.bulk_create(
+                    group,
+                    update_conflicts=True,
+                    unique_fields=['user', 'sku'],
+                    update_fields=fields,
+                )
+
+    def summary(self):
+        return {
+            'created': self.created,
+            'updated': self.updated,
+            'error_count': self.error_count,
+            'errors': self.errors,
+        }
@@ -0,0 +1,293 @@
+"""
+Per-request instrumentation: SQL query count, database time, serialization
+time and response size for each view, kept as in-process histograms and
+served in the Prometheus text format at /metrics.
+
+Only a sample of requests (INSTRUMENTATION_SAMPLE_RATE) is measured, and
+those also get a Server-Timing header; every request is counted. The
+numbers are per process: with several workers, scrape each one (or add up
+in Prometheus).
+
+Database time comes from an execute wrapper installed on every connection,
+which reads the current request's stats from a context variable, so it
+also sees queries the async views run on the ORM's thread. Serialization
+is what runs inside `serializing()` - the row serializers, building `.data`
+on serializers using MeasuredSerializerMixin, and the JSON renderer - less
+any queries made meanwhile.
+"""
+import ipaddress
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+from rest_framework.serializers import ListSerializer
+
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+_current = ContextVar('inventory_request_stats', default=None)
+
+
+class RequestStats:
+    __slots__ = ('queries', 'db_time', 'serialize_time', 'serialize_depth', 'serialize_start', 'serialize_db_time')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serialize_time = 0.0
+        self.serialize_depth = 0
+
+
+def record_query(execute, sql, params, many, context):
+    """Database execute wrapper: times queries made while a sampled request is current."""
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.db_time += time.perf_counter() - start
+
+
+def install(connection, **kwargs):
+    # connection_created fires on every reconnect of the same wrapper.
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+@contextmanager
+def serializing():
+    """Count the enclosed time as serialization (nested uses count once)."""
+    stats = _current.get()
+    if stats is None:
+        yield
+        return
+    stats.serialize_depth += 1
+    if stats.serialize_depth == 1:
+        stats.serialize_start, stats.serialize_db_time = time.perf_counter(), stats.db_time
+    try:
+        yield
+    finally:
+        stats.serialize_depth -= 1
+        if stats.serialize_depth == 0:
+            elapsed = time.perf_counter() - stats.serialize_start
+            stats.serialize_time += elapsed - (stats.db_time - stats.serialize_db_time)
+
+
+class MeasuredListSerializer(ListSerializer):
+    @property
+    def data(self):
+        with serializing():
+            return super().data
+
+
+class MeasuredSerializerMixin:
+    """Counts building a DRF serializer's `.data` (many=True too) as serialization."""
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # many=True builds Meta.list_serializer_class.
+        meta = getattr(cls, 'Meta', None)
+        if meta is None:
+            cls.Meta = type('Meta', (), {'list_serializer_class': MeasuredListSerializer})
+        elif not hasattr(meta, 'list_serializer_class'):
+            meta.list_serializer_class = MeasuredListSerializer
+
+    @property
+    def data(self):
+        with serializing():
+            return super().data
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values):
+    return ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, *labels):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + 1
+
+    def samples(self):
+        with self.lock:
+            values = dict(self.values)
+        for labels, value in sorted(values.items()):
+            yield f'{self.name}_total{{{_labels(self.labelnames, labels)}}} {value}'
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self.values = {}  # labels -> [bucket counts..., +Inf count, sum]
+        self.lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self.lock:
+            counts = self.values.get(labels)
+            if counts is None:
+                counts = self.values[labels] = [0] * (len(self.buckets) + 2)
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            else:
+                counts[-2] += 1
+            counts[-1] += value
+
+    def samples(self):
+        with self.lock:
+            values = {labels: list(counts) for labels, counts in self.values.items()}
+        for labels, counts in sorted(values.items()):
+            label_text = _labels(self.labelnames, labels)
+            cumulative = 0
+            for bound, count in zip((*self.buckets, '+Inf'), counts):
+                cumulative += count
+                yield f'{self.name}_bucket{{{label_text},le="{bound}"}} {cumulative}'
+            yield f'{self.name}_sum{{{label_text}}} {counts[-1]}'
+            yield f'{self.name}_count{{{label_text}}} {cumulative}'
+
+
+LABELS = ('view', 'method')
+REQUESTS = Counter('inventory_http_requests', 'Requests served, sampled or not.', ('view', 'method', 'status'))
+DURATION = Histogram('inventory_http_request_duration_seconds', 'Time spent in the view stack (sampled requests).', LABELS, SECONDS_BUCKETS)
+QUERIES = Histogram('inventory_db_queries', 'SQL queries per request (sampled requests).', LABELS, QUERY_BUCKETS)
+DB_TIME = Histogram('inventory_db_duration_seconds', 'Time spent in SQL queries (sampled requests).', LABELS, SECONDS_BUCKETS)
+SERIALIZATION = Histogram('inventory_serialization_duration_seconds', 'Time spent serializing and rendering (sampled requests).', LABELS, SECONDS_BUCKETS)
+RESPONSE_SIZE = Histogram('inventory_http_response_size_bytes', 'Response body size (sampled, non-streaming responses).', LABELS, SIZE_BUCKETS)
+METRICS = (REQUESTS, DURATION, QUERIES, DB_TIME, SERIALIZATION, RESPONSE_SIZE)
+
+
+def exposition():
+    lines = []
+    for metric in METRICS:
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        lines.extend(metric.samples())
+    lines.append('# HELP inventory_instrumentation_sample_rate Fraction of requests measured in detail.')
+    lines.append('# TYPE inventory_instrumentation_sample_rate gauge')
+    lines.append(f'inventory_instrumentation_sample_rate {settings.INSTRUMENTATION_SAMPLE_RATE}')
+    return '\n'.join(lines) + '\n'
+
+
+METHODS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+
+
+def method_label(request):
+    # Any token is a valid method; keep the label set bounded.
+    return request.method if request.method in METHODS else 'OTHER'
+
+
+def view_label(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return match.view_name or match.route
+
+
+class InstrumentationMiddleware:
+    """Measures a sample of requests; see the module docstring."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.sampled():
+            response = self.get_response(request)
+            REQUESTS.inc(view_label(request), method_label(request), response.status_code)
+            return response
+        stats, start = RequestStats(), time.perf_counter()
+        token = _current.set(stats)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.record(request, response, stats, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        if not self.sampled():
+            response = await self.get_response(request)
+            REQUESTS.inc(view_label(request), method_label(request), response.status_code)
+            return response
+        stats, start = RequestStats(), time.perf_counter()
+        token = _current.set(stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.record(request, response, stats, time.perf_counter() - start)
+
+    def sampled(self):
+        rate = settings.INSTRUMENTATION_SAMPLE_RATE
+        return rate > 0 and (rate >= 1 or random.random() < rate)
+
+    def record(self, request, response, stats, duration):
+        labels = (view_label(request), method_label(request))
+        REQUESTS.inc(*labels, response.status_code)
+        DURATION.observe(duration, *labels)
+        QUERIES.observe(stats.queries, *labels)
+        DB_TIME.observe(stats.db_time, *labels)
+        SERIALIZATION.observe(stats.serialize_time, *labels)
+        if not response.streaming:
+            RESPONSE_SIZE.observe(len(response.content), *labels)
+        if settings.INSTRUMENTATION_SERVER_TIMING:
+            response['Server-Timing'] = (
+                f'db;dur={stats.db_time * 1000:.2f};desc="{stats.queries} queries", '
+                f'serialize;dur={stats.serialize_time * 1000:.2f}, '
+                f'total;dur={duration * 1000:.2f}'
+            )
+        return response
+
+
+def metrics_allowed(request):
+    token = settings.METRICS_TOKEN
+    if token:
+        return constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}')
+    if not settings.METRICS_ALLOWED_NETWORKS:
+        # Neither configured: behind a proxy on the same host every client
+        # looks local, so loopback is not trusted by default.
+        return False
+    try:
+        address = ipaddress.ip_address(request.META.get('REMOTE_ADDR', ''))
+    except ValueError:
+        return False
+    return any(address in ipaddress.ip_network(network) for network in settings.METRICS_ALLOWED_NETWORKS)
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint."""
+    if not metrics_allowed(request):
+        return HttpResponseForbidden()
+    return HttpResponse(exposition(), content_type='text/plain; version=0.0.4; charset=utf-8')
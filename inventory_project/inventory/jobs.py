@@ -0,0 +1,110 @@
+"""
+Background jobs on the database, without a broker.
+
+Views enqueue a Job row and answer 202; `manage.py runworker` claims jobs
+(SELECT ... FOR UPDATE SKIP LOCKED, so workers never block on or share a
+job), runs the task from inventory.tasks in a process pool, and records
+the result, renewing the job's lease while it runs. Clients poll /jobs/<id>/ and fetch files from
+/jobs/<id>/download/.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import Job
+from .serializers import JobSerializer
+
+
+def enqueue(kind, user, params=None, input_file=None):
+    """Create a pending job; `input_file` (a django File) is stored alongside it."""
+    job = Job(kind=kind, user=user, params=params or {})
+    if input_file is not None:
+        job.input_file.save(input_file.name, input_file, save=False)
+    job.save()
+    return job
+
+
+def accepted(request, job):
+    """The 202 response for a view that handed its work to `job`."""
+    data = JobSerializer(job, context={'request': request}).data
+    return Response(data, status=status.HTTP_202_ACCEPTED, headers={'Location': data['url']})
+
+
+def claimable():
+    # Pending jobs, and running ones whose worker went away.
+    return Job.objects.filter(
+        Q(status=Job.PENDING) | Q(status=Job.RUNNING, lease_expires_at__lt=timezone.now()),
+        attempts__lt=settings.JOB_MAX_ATTEMPTS,
+    )
+
+
+def claim():
+    """Take the oldest claimable job for this worker, or return None."""
+    while True:
+        with transaction.atomic():
+            job = claimable().select_for_update(skip_locked=True).order_by('created_at', 'pk').first()
+            if job is None:
+                return None
+            now = timezone.now()
+            changes = {
+                'status': Job.RUNNING,
+                'attempts': job.attempts + 1,
+                'started_at': now,
+                'lease_expires_at': now + timedelta(seconds=settings.JOB_LEASE_SECONDS),
+            }
+            # Also guarded by the old values, for backends without row locks.
+            if Job.objects.filter(pk=job.pk, status=job.status, attempts=job.attempts).update(**changes):
+                for field, value in changes.items():
+                    setattr(job, field, value)
+                return job
+
+
+def renew(job):
+    """Extend the lease of a job this worker is running; False if another worker has taken it over."""
+    return bool(Job.objects.filter(pk=job.pk, status=Job.RUNNING, attempts=job.attempts).update(
+        lease_expires_at=timezone.now() + timedelta(seconds=settings.JOB_LEASE_SECONDS)
+    ))
+
+
+def execute(job_id):
+    """Run the job's task and return its result. Called in a worker process."""
+    from .tasks import TASKS
+
+    job = Job.objects.select_related('user').get(pk=job_id)
+    return TASKS[job.kind](job)
+
+
+def complete(job, result):
+    return _finish(job, status=Job.DONE, result=result)
+
+
+def fail(job, exc):
+    return _finish(job, status=Job.FAILED, error=f'{type(exc).__name__}: {exc}')
+
+
+def _finish(job, **changes):
+    # Only if no other worker has taken the job over since (expired lease).
+    return Job.objects.filter(pk=job.pk, status=Job.RUNNING, attempts=job.attempts).update(
+        finished_at=timezone.now(), lease_expires_at=None, **changes
+    )
+
+
+def prune():
+    """Fail jobs that ran out of attempts, and delete old jobs with their files."""
+    now = timezone.now()
+    lost = Job.objects.filter(status=Job.RUNNING, lease_expires_at__lt=now, attempts__gte=settings.JOB_MAX_ATTEMPTS)
+    lost.update(status=Job.FAILED, error='The worker running this job stopped.', finished_at=now, lease_expires_at=None)
+
+    expired = Job.objects.filter(created_at__lt=now - timedelta(days=settings.JOB_RETENTION_DAYS)).exclude(status=Job.RUNNING)
+    deleted = 0
+    for job in expired.iterator():
+        job.input_file.delete(save=False)
+        job.result_file.delete(save=False)
+        job.delete()
+        deleted += 1
+    return deleted
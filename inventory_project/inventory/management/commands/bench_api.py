@@ -0,0 +1,193 @@
+import json
+import time
+import tracemalloc
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from rest_framework_simplejwt.tokens import AccessToken
+
+from inventory import caching
+from inventory.models import InventoryItem, Order
+
+SCENARIOS = ['inventory_list', 'low_stock', 'csv_export', 'order_create', 'order_history', 'status_update']
+METRICS = ['queries', 'p50_ms', 'p95_ms', 'p99_ms', 'peak_kib']
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the main API endpoints in-process with Django's test client "
+        "against data from `manage.py seed_bench`: query count, latency "
+        "percentiles and peak memory per request. Compares the results with a "
+        "baseline file and flags regressions; --save-baseline writes one. Each "
+        "scenario runs in a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prefix', default='bench', help='The seed_bench --prefix.')
+        parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=SCENARIOS)
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--memory-iterations', type=int, default=3, help='Requests traced for peak memory (slow).')
+        parser.add_argument('--baseline', default=str(Path(settings.BASE_DIR) / 'bench_baseline.json'))
+        parser.add_argument('--save-baseline', action='store_true', help='Write the results to --baseline.')
+        parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed slowdown of p50/p95 (0.25 = 25%%).')
+        parser.add_argument('--memory-tolerance', type=float, default=0.25, help='Allowed growth of peak memory.')
+        parser.add_argument('--fail-on-regression', action='store_true', help='Exit with an error when anything regressed.')
+
+    def handle(self, *args, **options):
+        prefix = options['prefix']
+        try:
+            self.user = User.objects.get(username=f'{prefix}-0')
+            self.admin = User.objects.get(username=f'{prefix}-admin')
+        except User.DoesNotExist:
+            raise CommandError(f'No {prefix}-0 / {prefix}-admin users; run `manage.py seed_bench` first.')
+        self.user_client = self.client_for(self.user)
+        self.admin_client = self.client_for(self.admin)
+        self.items = list(InventoryItem.objects.filter(user=self.user, quantity__gt=100).values_list('pk', flat=True))
+        # Cancelled orders re-reserve stock when their status changes, which
+        # costs extra queries; leave them out so the query count is stable.
+        self.orders = list(Order.objects.filter(user=self.user).exclude(status='CANCELLED').values_list('pk', flat=True))
+        if len(self.items) < 3 or not self.orders:
+            raise CommandError(f'{prefix}-0 needs at least 3 well-stocked items and an order that is not cancelled; seed more data.')
+
+        results = {}
+        for name in options['scenarios']:
+            results[name] = self.run(name, options)
+        baseline = self.load_baseline(options['baseline'])
+        regressions = self.report(results, baseline, options)
+
+        if options['save_baseline']:
+            Path(options['baseline']).write_text(json.dumps(
+                {**baseline, **results}, indent=2, sort_keys=True
+            ) + '\n')
+            self.stdout.write(f"Saved the baseline to {options['baseline']}.")
+        if regressions and options['fail_on_regression']:
+            raise CommandError(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+
+    def client_for(self, user):
+        return Client(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+
+    def run(self, name, options):
+        scenario = getattr(self, f'scenario_{name}')
+        latencies, queries = [], set()
+        peak = 0
+        try:
+            with transaction.atomic():
+                for _ in range(options['warmup']):
+                    scenario(0)
+                for n in range(options['iterations']):
+                    with CaptureQueriesContext(connection) as ctx:
+                        start = time.perf_counter()
+                        scenario(n)
+                        latencies.append(time.perf_counter() - start)
+                    queries.add(len(ctx.captured_queries))
+                # Traced separately: tracemalloc slows everything down.
+                tracemalloc.start()
+                try:
+                    for n in range(options['memory_iterations']):
+                        tracemalloc.reset_peak()
+                        baseline_memory = tracemalloc.get_traced_memory()[0]
+                        scenario(n)
+                        peak = max(peak, tracemalloc.get_traced_memory()[1] - baseline_memory)
+                finally:
+                    tracemalloc.stop()
+                raise Rollback
+        except Rollback:
+            pass
+
+        latencies.sort()
+        return {
+            'queries': max(queries),
+            'p50_ms': round(self.percentile(latencies, 0.50) * 1000, 2),
+            'p95_ms': round(self.percentile(latencies, 0.95) * 1000, 2),
+            'p99_ms': round(self.percentile(latencies, 0.99) * 1000, 2),
+            'peak_kib': round(peak / 1024, 1),
+        }
+
+    def percentile(self, values, fraction):
+        return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0
+
+    def expect(self, response, *statuses):
+        if response.status_code not in statuses:
+            raise CommandError(f'{response.request["PATH_INFO"]} answered {response.status_code}: {response.content[:200]!r}')
+        return response
+
+    def scenario_inventory_list(self, n):
+        self.expect(self.user_client.get('/inventory/'), 200)
+
+    def scenario_low_stock(self, n):
+        # The uncached path: the cached one is a single cache read. Bumping
+        # the user's generation leaves the rest of the cache alone.
+        caching.inventory_changed([self.user.pk])
+        self.expect(self.user_client.get('/low-stock/'), 200)
+
+    def scenario_csv_export(self, n):
+        response = self.expect(self.user_client.get('/inventory-report/'), 200, 202)
+        if response.streaming:
+            b''.join(response.streaming_content)
+
+    def scenario_order_create(self, n):
+        lines = [{'id': self.items[(n * 3 + k) % len(self.items)], 'quantity': 1} for k in range(3)]
+        self.expect(self.user_client.post('/orders/', {
+            'items': lines,
+            'delivery_address': '1 Bench St',
+            'billing_address': '1 Bench St',
+        }, content_type='application/json'), 201)
+
+    def scenario_order_history(self, n):
+        self.expect(self.user_client.get('/orders/history/'), 200)
+
+    def scenario_status_update(self, n):
+        order_id = self.orders[n % len(self.orders)]
+        self.expect(self.admin_client.post(
+            f'/orders/{order_id}/update-status/',
+            {'status': 'PROCESSING' if n % 2 else 'SHIPPED'},
+            content_type='application/json',
+        ), 200)
+
+    def load_baseline(self, path):
+        try:
+            return json.loads(Path(path).read_text())
+        except FileNotFoundError:
+            return {}
+        except ValueError as exc:
+            raise CommandError(f'Could not read the baseline {path}: {exc}')
+
+    def report(self, results, baseline, options):
+        """Print the results against the baseline; return the regressed scenario/metric names."""
+        limits = {
+            'queries': 0,
+            'p50_ms': options['tolerance'],
+            'p95_ms': options['tolerance'],
+            'peak_kib': options['memory_tolerance'],
+        }
+        regressions = []
+        self.stdout.write(f"{'scenario':<15}" + ''.join(f'{metric:>22}' for metric in METRICS))
+        for name, result in results.items():
+            cells = []
+            for metric in METRICS:
+                value, before = result[metric], baseline.get(name, {}).get(metric)
+                cell = f'{value:g}'
+                if before is not None:
+                    cell += f' ({(value - before) / before:+.0%})' if before else f' (was {before:g})'
+                    if metric in limits and value > before * (1 + limits[metric]):
+                        regressions.append(f'{name}.{metric}')
+                        cell += ' !'
+                cells.append(f'{cell:>22}')
+            self.stdout.write(f'{name:<15}' + ''.join(cells))
+        if not baseline:
+            self.stdout.write(f"No baseline at {options['baseline']}; run with --save-baseline to store one.")
+        elif regressions:
+            self.stdout.write(self.style.ERROR(f"Regressions (marked !): {', '.join(regressions)}"))
+        else:
+            self.stdout.write(self.style.SUCCESS('No regressions against the baseline.'))
+        return regressions
@@ -0,0 +1,137 @@
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework_simplejwt.tokens import AccessToken
+
+DEFAULT_PATHS = ['/me/', '/low-stock/', '/orders/history/', '/inventory/']
+
+
+class Command(BaseCommand):
+    help = (
+        "Serve the project under uvicorn twice - sync read views, then the async "
+        "ones (ASYNC_READ_VIEWS) - and compare requests/s and latency percentiles "
+        "for the read endpoints at high concurrency. Needs uvicorn installed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', required=True, help='Existing user to authenticate as.')
+        parser.add_argument('--paths', nargs='+', default=DEFAULT_PATHS)
+        parser.add_argument('--concurrency', type=int, default=200, help='Open keep-alive connections.')
+        parser.add_argument('--duration', type=float, default=10.0, help='Seconds per endpoint.')
+        parser.add_argument('--workers', type=int, default=1, help='uvicorn worker processes.')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--modes', nargs='+', default=['sync', 'async'], choices=['sync', 'async'])
+
+    def handle(self, *args, **options):
+        try:
+            import uvicorn  # noqa: F401
+        except ImportError:
+            raise CommandError('bench_asgi needs uvicorn: pip install uvicorn')
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"User {options['username']!r} does not exist")
+        self.token = str(AccessToken.for_user(user))
+        self.port = options['port']
+
+        results = {}
+        for mode in options['modes']:
+            server = self.start_server(mode, options['workers'])
+            try:
+                for path in options['paths']:
+                    results[mode, path] = asyncio.run(self.load(path, options['concurrency'], options['duration']))
+            finally:
+                server.terminate()
+                server.wait()
+
+        for path in options['paths']:
+            for mode in options['modes']:
+                self.report(mode, path, *results[mode, path], options['duration'])
+
+    def start_server(self, mode, workers):
+        env = dict(os.environ, ASYNC_READ_VIEWS='true' if mode == 'async' else 'false')
+        env.setdefault('DJANGO_SETTINGS_MODULE', settings.SETTINGS_MODULE)
+        server = subprocess.Popen(
+            [
+                sys.executable, '-m', 'uvicorn', 'inventory_project.asgi:application',
+                '--port', str(self.port), '--workers', str(workers), '--no-access-log', '--log-level', 'warning',
+            ],
+            cwd=settings.BASE_DIR, env=env,
+        )
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError(f'uvicorn exited with status {server.returncode}')
+            try:
+                socket.create_connection(('127.0.0.1', self.port), timeout=1).close()
+                return server
+            except OSError:
+                time.sleep(0.2)
+        server.terminate()
+        raise CommandError('uvicorn did not start listening within 30s')
+
+    async def load(self, path, concurrency, duration):
+        request = (
+            f'GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nAccept: application/json\r\n'
+            f'Authorization: Bearer {self.token}\r\n\r\n'
+        ).encode()
+        timings, errors = [], []
+        # Warm up caches and connections before measuring.
+        await self.client(request, time.monotonic() + 1, [], [])
+        deadline = time.monotonic() + duration
+        await asyncio.gather(*(self.client(request, deadline, timings, errors) for _ in range(concurrency)))
+        return timings, errors
+
+    async def client(self, request, deadline, timings, errors):
+        try:
+            reader, writer = await asyncio.open_connection('127.0.0.1', self.port)
+        except OSError as exc:
+            errors.append(type(exc).__name__)
+            return
+        try:
+            while time.monotonic() < deadline:
+                start = time.perf_counter()
+                writer.write(request)
+                status = await self.read_response(reader)
+                elapsed = (time.perf_counter() - start) * 1000
+                if status == 200:
+                    timings.append(elapsed)
+                else:
+                    errors.append(status)
+        except (OSError, asyncio.IncompleteReadError) as exc:
+            errors.append(type(exc).__name__)
+        finally:
+            writer.close()
+
+    async def read_response(self, reader):
+        status = int((await reader.readline()).split()[1])
+        headers = {}
+        while (line := await reader.readline()) not in (b'\r\n', b''):
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        if 'content-length' in headers:
+            await reader.readexactly(int(headers['content-length']))
+        elif headers.get('transfer-encoding') == 'chunked':
+            while size := int((await reader.readline()).strip(), 16):
+                await reader.readexactly(size + 2)
+            await reader.readline()
+        return status
+
+    def report(self, mode, path, timings, errors, duration):
+        if not timings:
+            self.stdout.write(f'{path:>18} {mode:>5}: no successful requests ({len(errors)} errors)')
+            return
+        timings.sort()
+        p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+        self.stdout.write(
+            f'{path:>18} {mode:>5}: {len(timings) / duration:>7.0f} req/s  '
+            f'p50 {statistics.median(timings):>7.1f} ms  p99 {p99:>7.1f} ms  errors {len(errors)}'
+        )
@@ -0,0 +1,90 @@
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from rest_framework_simplejwt.tokens import AccessToken
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare per-request latency with a new database connection per request, "
+        "persistent connections, and psycopg's connection pool."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', required=True, help='Existing user to authenticate as.')
+        parser.add_argument('--requests', type=int, default=500)
+        # Needs to query the database: /me/ is served from the user cache.
+        parser.add_argument('--path', default='/inventory/?page_size=1', help='Endpoint to request; it must query the database.')
+        parser.add_argument(
+            '--modes', nargs='+', default=['fresh', 'persistent', 'pool'],
+            choices=['fresh', 'persistent', 'pool'],
+        )
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"User {options['username']!r} does not exist")
+
+        client = Client(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+        connection = connections['default']
+        original = dict(connection.settings_dict, OPTIONS=dict(connection.settings_dict.get('OPTIONS', {})))
+
+        try:
+            for mode in options['modes']:
+                if mode == 'pool' and connection.vendor != 'postgresql':
+                    self.stdout.write(f'{mode:>10}: skipped (needs PostgreSQL with psycopg[pool])')
+                    continue
+                self.configure(connection, original, mode)
+                timings = self.run(client, options['path'], options['requests'])
+                self.report(mode, timings)
+        finally:
+            self.configure(connection, original, None)
+
+    def configure(self, connection, original, mode):
+        connection.close()
+        if hasattr(connection, 'close_pool'):
+            connection.close_pool()
+        connection.settings_dict.update(original, OPTIONS=dict(original['OPTIONS']))
+        if mode == 'fresh':
+            connection.settings_dict['CONN_MAX_AGE'] = 0
+            connection.settings_dict['OPTIONS'].pop('pool', None)
+        elif mode == 'persistent':
+            connection.settings_dict['CONN_MAX_AGE'] = 600
+            connection.settings_dict['CONN_HEALTH_CHECKS'] = True
+            connection.settings_dict['OPTIONS'].pop('pool', None)
+        elif mode == 'pool':
+            connection.settings_dict['CONN_MAX_AGE'] = 0
+            connection.settings_dict['OPTIONS'].setdefault('pool', {'min_size': 2, 'max_size': 4})
+
+    def run(self, client, path, count):
+        # The test client deliberately keeps connections open between
+        # requests; close_old_connections() does what a real server does at
+        # the end of each request, honouring CONN_MAX_AGE and the pool.
+        with CaptureQueriesContext(connections['default']) as ctx:
+            client.get(path)
+        close_old_connections()
+        if not ctx.captured_queries:
+            raise CommandError(f'{path} made no queries, so it would not measure connection set-up; pick another --path.')
+        timings = []
+        for _ in range(count):
+            start = time.perf_counter()
+            response = client.get(path)
+            close_old_connections()
+            timings.append((time.perf_counter() - start) * 1000)
+            if response.status_code != 200:
+                raise CommandError(f'{path} returned {response.status_code}')
+        return timings
+
+    def report(self, mode, timings):
+        timings.sort()
+        p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+        self.stdout.write(
+            f'{mode:>10}: mean {statistics.mean(timings):.2f} ms  '
+            f'p50 {statistics.median(timings):.2f} ms  p99 {p99:.2f} ms'
+        )
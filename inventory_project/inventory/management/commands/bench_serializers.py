@@ -0,0 +1,108 @@
+import time
+import uuid
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from inventory.models import Discount, InventoryItem, Order, OrderItem, Supplier
+from inventory.renderers import FastJSONRenderer
+from inventory.serializers import InventorySerializer, OrderSerializer
+from inventory.views import INVENTORY_RELATED, InventoryViewSet, OrderViewSet, order_queryset
+
+SEED_BATCH_SIZE = 5000
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare list rendering throughput of the DRF model serializers against "
+        "the .values() row serializers. Seeds throwaway rows inside a transaction "
+        "that is rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=[1000, 10000, 100000])
+        parser.add_argument('--repeat', type=int, default=3, help='Best of this many runs per measurement.')
+        parser.add_argument('--lists', nargs='+', default=['inventory', 'orders'], choices=['inventory', 'orders'])
+
+    def handle(self, *args, **options):
+        self.repeat = options['repeat']
+        try:
+            with transaction.atomic():
+                user = self.seed(max(options['sizes']), options['lists'])
+                for name in options['lists']:
+                    for size in sorted(options['sizes']):
+                        getattr(self, f'bench_{name}')(user, size)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def seed(self, count, lists):
+        user = User.objects.create_user(f'bench-{uuid.uuid4().hex[:12]}')
+        supplier = Supplier.objects.create(name='Bench Supplier', address='1 Bench St', created_by=user)
+        self.stdout.write(f'Seeding {count} rows per list...')
+        for start in range(0, count, SEED_BATCH_SIZE):
+            InventoryItem.objects.bulk_create([
+                InventoryItem(
+                    user=user, name=f'Bench item {n}', sku=f'BENCH-{n}', quantity=n % 50,
+                    price='9.99', threshold=10, supplier=supplier if n % 2 else None,
+                )
+                for n in range(start, min(start + SEED_BATCH_SIZE, count))
+            ])
+        if 'orders' in lists:
+            item = InventoryItem.objects.filter(user=user).first()
+            for start in range(0, count, SEED_BATCH_SIZE):
+                orders = Order.objects.bulk_create([
+                    Order(user=user, subtotal='19.98', total_amount='17.98',
+                          delivery_address='1 Bench St', billing_address='1 Bench St')
+                    for _ in range(start, min(start + SEED_BATCH_SIZE, count))
+                ])
+                OrderItem.objects.bulk_create([
+                    OrderItem(order=order, item=item, quantity=2, price_at_order='9.99') for order in orders
+                ])
+                Discount.objects.bulk_create([
+                    Discount(order=order, discount_type='FIXED', value='2.00') for order in orders
+                ])
+        return user
+
+    def bench_inventory(self, user, size):
+        queryset = InventoryItem.objects.filter(user=user).order_by('-created_at', '-id')[:size]
+        rows = InventoryViewSet.row_serializer
+        self.compare(
+            'inventory', size,
+            lambda: JSONRenderer().render(InventorySerializer(queryset.select_related(*INVENTORY_RELATED), many=True).data),
+            lambda: FastJSONRenderer().render(rows.render(rows.values(queryset))),
+        )
+
+    def bench_orders(self, user, size):
+        queryset = order_queryset().filter(user=user).order_by('-created_at', '-id')[:size]
+        rows = OrderViewSet.row_serializer
+        self.compare(
+            'orders', size,
+            lambda: JSONRenderer().render(OrderSerializer(queryset, many=True).data),
+            lambda: FastJSONRenderer().render(rows.render(rows.values(queryset))),
+        )
+
+    def compare(self, name, size, model_path, row_path):
+        model_seconds, expected = self.best_of(model_path)
+        row_seconds, actual = self.best_of(row_path)
+        if actual != expected:
+            raise CommandError(f'{name}: row serializer output differs from the model serializer')
+        self.stdout.write(
+            f'{name:>10} {size:>7} rows: model {size / model_seconds:>9.0f} rows/s  '
+            f'rows {size / row_seconds:>9.0f} rows/s  x{model_seconds / row_seconds:.1f}'
+        )
+
+    def best_of(self, func):
+        best = None
+        for _ in range(self.repeat):
+            start = time.perf_counter()
+            output = func()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best, output
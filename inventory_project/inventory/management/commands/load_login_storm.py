@@ -0,0 +1,94 @@
+import json
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        "Load test against a running server: measure read latency on its own, then "
+        "again while other clients hammer /api/token/ with logins. With the bounded "
+        "hashing pool the read p99 should hold, and excess logins get 429s."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+        parser.add_argument('--username', required=True)
+        parser.add_argument('--password', required=True)
+        parser.add_argument('--read-path', default='/inventory/')
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--logins', type=int, default=32, help='Concurrent login clients during the storm.')
+        parser.add_argument('--duration', type=float, default=10.0, help='Seconds per phase.')
+        parser.add_argument('--retry-pause', type=float, default=0.2, help='Seconds a login client waits after a 429.')
+
+    def handle(self, *args, **options):
+        self.base_url = options['base_url'].rstrip('/')
+        self.credentials = json.dumps({'username': options['username'], 'password': options['password']}).encode()
+        status, body = self.request('/api/token/', self.credentials)
+        if status != 200:
+            raise CommandError(f'Could not log in ({status}): {body[:200]!r}')
+        self.token = json.loads(body)['access']
+
+        baseline = self.phase(options, logins=0)
+        storm = self.phase(options, logins=options['logins'])
+        self.report('reads alone', baseline['reads'])
+        self.report('reads during storm', storm['reads'])
+        outcomes = storm['logins']
+        self.stdout.write(
+            f"{'logins':>20}: {len(outcomes)} total, {outcomes.count(200)} ok, "
+            f"{outcomes.count(429)} throttled (429), {len(outcomes) - outcomes.count(200) - outcomes.count(429)} other"
+        )
+
+    def request(self, path, data=None):
+        headers = {'Content-Type': 'application/json'}
+        if data is None:
+            headers['Authorization'] = f'Bearer {self.token}'
+        request = urllib.request.Request(self.base_url + path, data=data, headers=headers)
+        try:
+            with urllib.request.urlopen(request, timeout=60) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as exc:
+            return exc.code, exc.read()
+
+    def phase(self, options, logins):
+        results = {'reads': [], 'logins': []}
+        deadline = time.monotonic() + options['duration']
+
+        def read():
+            while time.monotonic() < deadline:
+                start = time.perf_counter()
+                status, _ = self.request(options['read_path'])
+                elapsed = (time.perf_counter() - start) * 1000
+                if status == 200:
+                    results['reads'].append(elapsed)
+
+        def login():
+            while time.monotonic() < deadline:
+                status, _ = self.request('/api/token/', self.credentials)
+                results['logins'].append(status)
+                if status == 429:
+                    # Well-behaved clients back off; a fixed short pause
+                    # keeps the storm heavy.
+                    time.sleep(options['retry_pause'])
+
+        threads = [threading.Thread(target=read) for _ in range(options['readers'])]
+        threads += [threading.Thread(target=login) for _ in range(logins)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def report(self, label, timings):
+        if not timings:
+            self.stdout.write(f'{label:>20}: no successful requests')
+            return
+        timings.sort()
+        p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+        self.stdout.write(
+            f'{label:>20}: {len(timings)} requests  p50 {statistics.median(timings):.1f} ms  p99 {p99:.1f} ms'
+        )
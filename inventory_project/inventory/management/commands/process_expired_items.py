@@ -0,0 +1,64 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from inventory.caching import cache_is_shared
+from inventory.models import InventoryItem
+from inventory.signals import stock_changed
+
+
+class Command(BaseCommand):
+    help = (
+        "Mark items whose expiration date has passed as expired (expired_at), and "
+        "with --write-down also set their quantity to 0. Works through them in "
+        "small batches, each in its own short transaction that locks only that "
+        "batch's rows and skips rows locked by someone else; run it nightly."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--write-down', action='store_true', help='Also write the stock down to 0.')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--pause', type=float, default=0.0, help='Seconds to sleep between batches.')
+        parser.add_argument(
+            '--before', type=date.fromisoformat,
+            help='Process items expiring before this day (YYYY-MM-DD) instead of today.',
+        )
+
+    def handle(self, *args, **options):
+        if not cache_is_shared():
+            raise CommandError('The default cache is per-process, so the web workers would keep serving stale stock; configure a shared cache.')
+        before = options['before'] or timezone.localdate()
+        pending = InventoryItem.objects.filter(expiration_date__lt=before, expired_at__isnull=True).order_by('pk')
+        processed = written_down = 0
+        last_pk = 0
+        while True:
+            with transaction.atomic():
+                # Walk forward by primary key so each batch is an index range
+                # scan, and skip (until the next run) rows being edited.
+                batch = list(
+                    pending.filter(pk__gt=last_pk)
+                    .select_for_update(skip_locked=True)
+                    .values_list('pk', 'user_id')[:options['batch_size']]
+                )
+                if not batch:
+                    break
+                last_pk = batch[-1][0]
+                items = InventoryItem.objects.filter(pk__in=[pk for pk, _ in batch])
+                now = timezone.now()
+                updates = {'expired_at': now, 'updated_at': now}
+                if options['write_down']:
+                    written_down += items.aggregate(units=Sum('quantity'))['units'] or 0
+                    updates['quantity'] = 0
+                processed += items.update(**updates)
+                stock_changed.send(sender=InventoryItem, user_ids={user_id for _, user_id in batch})
+            if options['pause']:
+                time.sleep(options['pause'])
+
+        message = f'Marked {processed} items expiring before {before} as expired'
+        if options['write_down']:
+            message += f', writing down {written_down} units'
+        self.stdout.write(message + '.')
@@ -0,0 +1,26 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from inventory.models import Tombstone
+
+
+class Command(BaseCommand):
+    help = "Delete tombstones older than TOMBSTONE_RETENTION_DAYS, in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.TOMBSTONE_RETENTION_DAYS)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        old = Tombstone.objects.filter(deleted_at__lt=cutoff)
+        deleted = 0
+        while True:
+            batch = list(old.values_list('pk', flat=True)[:options['batch_size']])
+            if not batch:
+                break
+            deleted += Tombstone.objects.filter(pk__in=batch).delete()[0]
+        self.stdout.write(f'Deleted {deleted} tombstones older than {options["days"]} days.')
@@ -0,0 +1,27 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from inventory import analytics
+
+
+class Command(BaseCommand):
+    help = (
+        "Take today's stock value snapshot for the analytics endpoints (run it "
+        "daily, e.g. from cron). With --rebuild-sales, also recompute the sales "
+        "rollups from the order lines."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild-sales', action='store_true')
+        parser.add_argument(
+            '--since', type=date.fromisoformat,
+            help='Only rebuild sales from this day (YYYY-MM-DD) on.',
+        )
+
+    def handle(self, *args, **options):
+        rows = analytics.snapshot_stock_value()
+        self.stdout.write(f'Stored {rows} stock value rows.')
+        if options['rebuild_sales']:
+            rows = analytics.rebuild_sales(options['since'])
+            self.stdout.write(f'Rebuilt {rows} sales rollup rows.')
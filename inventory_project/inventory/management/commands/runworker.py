@@ -0,0 +1,143 @@
+import multiprocessing
+import os
+import signal
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from inventory import jobs
+from inventory.caching import cache_is_shared
+
+PRUNE_INTERVAL = 3600
+
+
+class Command(BaseCommand):
+    help = (
+        "Run background jobs: claim pending jobs from the database and run them "
+        "in a pool of worker processes. Start as many of these as you like; "
+        "they never pick up the same job."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes', type=int, default=os.cpu_count() or 1,
+            help=(
+                'Jobs run at once, each in its own process; 0 runs one at a time in this process, '
+                'without renewing leases (keep JOB_LEASE_SECONDS above the longest job).'
+            ),
+        )
+        parser.add_argument('--poll', type=float, default=1.0, help='Seconds between checks for new jobs when idle.')
+        parser.add_argument('--once', action='store_true', help='Exit once no jobs are left.')
+
+    def handle(self, *args, **options):
+        if not cache_is_shared():
+            # Imports bump the inventory cache generations from here.
+            raise CommandError('The default cache is per-process, so the web workers would keep serving stale stock; configure a shared cache.')
+        self.stopping = False
+        previous_handlers = {signum: signal.signal(signum, self.stop) for signum in (signal.SIGTERM, signal.SIGINT)}
+        self.processes = options['processes']
+        self.executor = self.make_executor()
+        running = {}
+        next_prune = next_renewal = 0
+        try:
+            while not self.stopping:
+                close_old_connections()
+                if time.monotonic() >= next_prune:
+                    jobs.prune()
+                    next_prune = time.monotonic() + PRUNE_INTERVAL
+
+                claimed = 0
+                while not self.stopping and len(running) < max(self.processes, 1):
+                    job = jobs.claim()
+                    if job is None:
+                        break
+                    claimed += 1
+                    self.stdout.write(f'Running {job.kind} job #{job.pk}')
+                    if self.executor is None:
+                        self.run_inline(job)
+                    else:
+                        running[self.executor.submit(jobs.execute, job.pk)] = (job, time.perf_counter(), self.executor)
+
+                if running:
+                    done, _ = wait(running, timeout=options['poll'], return_when=FIRST_COMPLETED)
+                    for future in done:
+                        self.finish(*running.pop(future), future)
+                    if time.monotonic() >= next_renewal:
+                        self.renew(running)
+                        next_renewal = time.monotonic() + settings.JOB_LEASE_SECONDS / 3
+                elif not claimed:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll'])
+        finally:
+            # Let running jobs finish, still renewing their leases.
+            while running:
+                for future in wait(running, timeout=settings.JOB_LEASE_SECONDS / 3).done:
+                    self.finish(*running.pop(future), future)
+                self.renew(running)
+            if self.executor is not None:
+                self.executor.shutdown()
+            for signum, handler in previous_handlers.items():
+                signal.signal(signum, handler)
+
+    def stop(self, signum, frame):
+        self.stdout.write('Stopping once the running jobs finish...')
+        self.stopping = True
+
+    def make_executor(self):
+        if not self.processes:
+            return None
+        # Spawned, not forked: children must not share the parent's database connections.
+        return ProcessPoolExecutor(
+            max_workers=self.processes, mp_context=multiprocessing.get_context('spawn'), initializer=django.setup
+        )
+
+    def renew(self, running):
+        # Keep the leases of running jobs so that no other worker takes them over.
+        for job, _, _ in running.values():
+            if not jobs.renew(job):
+                self.stdout.write(f'{job.kind} job #{job.pk} was taken over by another worker')
+
+    def run_inline(self, job):
+        start = time.perf_counter()
+        try:
+            result = jobs.execute(job.pk)
+        except Exception as exc:
+            self.failed(job, exc)
+        else:
+            self.completed(job, result, start)
+
+    def finish(self, job, start, executor, future):
+        try:
+            result = future.result()
+        except BrokenProcessPool as exc:
+            self.failed(job, exc, 'a worker process died')
+            if executor is self.executor and not self.stopping:
+                self.executor.shutdown(wait=False)
+                self.executor = self.make_executor()
+        except Exception as exc:
+            self.failed(job, exc)
+        else:
+            self.completed(job, result, start)
+
+    def completed(self, job, result, start):
+        if jobs.complete(job, result):
+            self.stdout.write(f'{job.kind} job #{job.pk} done in {time.perf_counter() - start:.1f}s')
+        else:
+            self.taken_over(job)
+
+    def failed(self, job, exc, reason=None):
+        if jobs.fail(job, exc):
+            self.stdout.write(f'{job.kind} job #{job.pk} failed: {reason or exc}')
+        else:
+            self.taken_over(job)
+
+    def taken_over(self, job):
+        self.stdout.write(
+            f'{job.kind} job #{job.pk} finished after another worker took it over; its outcome was not recorded'
+        )
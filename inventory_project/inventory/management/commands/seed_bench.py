@@ -0,0 +1,112 @@
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from inventory import analytics
+from inventory.models import InventoryItem, Order, OrderItem, Supplier
+
+STATUSES = [status for status, _ in Order.STATUS_CHOICES]
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed synthetic data for `manage.py bench_api`: users <prefix>-0..N-1 "
+        "(password --password) with their items and orders, plus a staff user "
+        "<prefix>-admin who owns the suppliers. Everything is written with "
+        "bulk_create; the analytics rollups are rebuilt at the end."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10)
+        parser.add_argument('--suppliers', type=int, default=50)
+        parser.add_argument('--items', type=int, default=1000, help='Inventory items per user.')
+        parser.add_argument('--orders', type=int, default=200, help='Orders per user.')
+        parser.add_argument('--lines', type=int, default=3, help='Lines per order.')
+        parser.add_argument('--prefix', default='bench')
+        parser.add_argument('--password', default='bench-pass')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0, help='Random seed, so runs produce the same data.')
+        parser.add_argument('--flush', action='store_true', help='Delete the users of an earlier run (and their data) first.')
+
+    def handle(self, *args, **options):
+        if options['lines'] > options['items']:
+            raise CommandError('--lines cannot exceed --items.')
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        prefix = options['prefix']
+        existing = User.objects.filter(username__startswith=f'{prefix}-')
+        with transaction.atomic():
+            if existing.exists():
+                if not options['flush']:
+                    raise CommandError(f'Users named {prefix}-* already exist; pass --flush to replace them.')
+                existing.delete()
+
+            # One hash for everyone: hashing is deliberately slow.
+            password = make_password(options['password'])
+            admin = User.objects.create(username=f'{prefix}-admin', password=password, is_staff=True)
+            users = User.objects.bulk_create([
+                User(username=f'{prefix}-{n}', password=password) for n in range(options['users'])
+            ], batch_size=self.batch_size)
+            suppliers = Supplier.objects.bulk_create([
+                Supplier(name=f'Bench Supplier {n}', email=f'supplier{n}@example.com', address=f'{n} Bench St', created_by=admin)
+                for n in range(options['suppliers'])
+            ], batch_size=self.batch_size)
+
+            items = orders = lines = 0
+            for user in users:
+                user_items = self.seed_items(user, suppliers, options['items'])
+                created_orders, created_lines = self.seed_orders(user, user_items, options['orders'], options['lines'])
+                items += len(user_items)
+                orders += created_orders
+                lines += created_lines
+            analytics.rebuild_sales()
+            analytics.snapshot_stock_value()
+
+        self.stdout.write(
+            f'Seeded {len(users)} users (+ {admin.username}), {len(suppliers)} suppliers, '
+            f'{items} items, {orders} orders and {lines} order lines.'
+        )
+
+    def seed_items(self, user, suppliers, count):
+        today = timezone.localdate()
+        return InventoryItem.objects.bulk_create([
+            InventoryItem(
+                user=user,
+                name=f'Bench item {n}',
+                sku=f'BENCH-{n:06d}',
+                quantity=self.random.randint(0, 200),
+                price=Decimal(self.random.randint(100, 50000)) / 100,
+                threshold=self.random.choice([5, 10, 20]),
+                supplier=self.random.choice(suppliers) if suppliers and self.random.random() < 0.9 else None,
+                expiration_date=today + timedelta(days=self.random.randint(-30, 365)) if n % 4 == 0 else None,
+            )
+            for n in range(count)
+        ], batch_size=self.batch_size)
+
+    def seed_orders(self, user, items, count, lines_per_order):
+        created_orders = created_lines = 0
+        for start in range(0, count, self.batch_size):
+            picks = [self.random.sample(items, lines_per_order) for _ in range(start, min(start + self.batch_size, count))]
+            quantities = [[self.random.randint(1, 5) for _ in lines] for lines in picks]
+            orders = []
+            for lines, amounts in zip(picks, quantities):
+                subtotal = sum(item.price * quantity for item, quantity in zip(lines, amounts))
+                orders.append(Order(
+                    user=user, subtotal=subtotal, total_amount=subtotal, status=self.random.choice(STATUSES),
+                    delivery_address='1 Bench St', billing_name=user.username, billing_address='1 Bench St',
+                ))
+            orders = Order.objects.bulk_create(orders)
+            order_lines = OrderItem.objects.bulk_create([
+                OrderItem(order=order, item=item, quantity=quantity, price_at_order=item.price)
+                for order, lines, amounts in zip(orders, picks, quantities)
+                for item, quantity in zip(lines, amounts)
+            ], batch_size=self.batch_size)
+            created_orders += len(orders)
+            created_lines += len(order_lines)
+        return created_orders, created_lines
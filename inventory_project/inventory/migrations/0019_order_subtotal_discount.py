@@ -0,0 +1,53 @@
+# Catches the migrations up with models.py, which already had
+# Order.subtotal and the Discount model: without it the test database
+# cannot be created, and the query-count tests need one.
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0018_alter_order_options_alter_supplier_options_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="order",
+            name="subtotal",
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+            preserve_default=False,
+        ),
+        migrations.CreateModel(
+            name="Discount",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "discount_type",
+                    models.CharField(
+                        choices=[("PERCENTAGE", "Percentage"), ("FIXED", "Fixed Amount")],
+                        max_length=20,
+                    ),
+                ),
+                ("value", models.DecimalField(decimal_places=2, max_digits=10)),
+                ("description", models.CharField(blank=True, max_length=255)),
+                (
+                    "order",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="discounts",
+                        to="inventory.order",
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0019_order_subtotal_discount"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="inventoryitem",
+            index=models.Index(
+                condition=models.Q(("quantity__lt", models.F("threshold"))),
+                fields=["user", "created_at"],
+                name="inventory_low_stock_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,54 @@
+import django.contrib.postgres.indexes
+from django.conf import settings
+from django.db import migrations
+
+
+class PostgresOnly:
+    """
+    Trigram search only exists on PostgreSQL; elsewhere these operations just
+    record the state. (django.contrib.postgres.operations is avoided because
+    importing it requires psycopg.)
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+class PostgresOnlyRunSQL(PostgresOnly, migrations.RunSQL):
+    pass
+
+
+class PostgresOnlyAddIndex(PostgresOnly, migrations.AddIndex):
+    pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0020_inventoryitem_low_stock_idx"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        PostgresOnlyRunSQL(
+            sql="CREATE EXTENSION IF NOT EXISTS pg_trgm",
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        PostgresOnlyAddIndex(
+            model_name="inventoryitem",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["name"], name="inventory_name_trgm_idx", opclasses=["gin_trgm_ops"]
+            ),
+        ),
+        PostgresOnlyAddIndex(
+            model_name="inventoryitem",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["sku"], name="inventory_sku_trgm_idx", opclasses=["gin_trgm_ops"]
+            ),
+        ),
+    ]
@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0024_analytics_rollups"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="inventoryitem",
+            name="expired_at",
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="inventoryitem",
+            index=models.Index(
+                fields=["user", "expiration_date"],
+                name="inventory_i_user_id_a33777_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="inventoryitem",
+            index=models.Index(
+                condition=models.Q(("expired_at__isnull", True)),
+                fields=["expiration_date"],
+                name="inventory_expiry_pending_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,65 @@
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.db import migrations
+
+
+class PostgresOnly:
+    """
+    The trigram indexes only exist on PostgreSQL (see 0021); elsewhere these
+    operations just record the state.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+class PostgresOnlyRemoveIndex(PostgresOnly, migrations.RemoveIndex):
+    pass
+
+
+class PostgresOnlyAddIndex(PostgresOnly, migrations.AddIndex):
+    pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0026_jobs"),
+    ]
+
+    # Index UPPER(name) and UPPER(sku) rather than the bare columns:
+    # icontains compiles to UPPER(column) LIKE UPPER(...), which the 0021
+    # indexes never matched.
+    operations = [
+        PostgresOnlyRemoveIndex(
+            model_name="inventoryitem",
+            name="inventory_name_trgm_idx",
+        ),
+        PostgresOnlyRemoveIndex(
+            model_name="inventoryitem",
+            name="inventory_sku_trgm_idx",
+        ),
+        PostgresOnlyAddIndex(
+            model_name="inventoryitem",
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.indexes.OpClass(
+                    django.db.models.functions.text.Upper("name"), name="gin_trgm_ops"
+                ),
+                name="inventory_name_trgm_idx",
+            ),
+        ),
+        PostgresOnlyAddIndex(
+            model_name="inventoryitem",
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.indexes.OpClass(
+                    django.db.models.functions.text.Upper("sku"), name="gin_trgm_ops"
+                ),
+                name="inventory_sku_trgm_idx",
+            ),
+        ),
+    ]
@@ -1,6 +1,18 @@
-from django.db import models
+import os
+from contextlib import nullcontext
+
+from django.db import IntegrityError, models, router, transaction
+from django.db.models import Case, F, Q, Value, When
+from django.db.models.functions import Upper
 from django.contrib.auth.models import User
+from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.core.files.storage import FileSystemStorage
 from django.core.exceptions import ValidationError
+from django.utils import timezone
+from .signals import stock_changed
+
+DUPLICATE_SKU_MESSAGE = "An item with SKU '{sku}' already exists in your inventory."
 
 class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
@@ -36,6 +48,8 @@ class InventoryItem(models.Model):
     price = models.DecimalField(max_digits=10, decimal_places=2)
     supplier = models.ForeignKey(Supplier, on_delete=models.SET_NULL, null=True, blank=True, related_name='inventory_items')
     expiration_date = models.DateField(null=True, blank=True)
+    # Set by `manage.py process_expired_items` once the item has expired.
+    expired_at = models.DateTimeField(null=True, blank=True, editable=False)
     threshold = models.PositiveIntegerField()
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -43,28 +57,122 @@ class InventoryItem(models.Model):
     def __str__(self):
         return f"{self.name} (SKU: {self.sku})"
 
+    def duplicate_sku_exists(self):
+        existing_items = InventoryItem.objects.filter(
+            user_id=self.user_id,
+            sku=self.sku
+        )
+        if self.pk:
+            existing_items = existing_items.exclude(pk=self.pk)
+        return existing_items.exists()
+
+    def duplicate_sku_error(self):
+        return ValidationError({'sku': DUPLICATE_SKU_MESSAGE.format(sku=self.sku)})
+
     def clean(self):
-        if self.sku:
-            existing_items = InventoryItem.objects.filter(
-                user=self.user, 
-                sku=self.sku
-            )
-            if self.pk:
-                existing_items = existing_items.exclude(pk=self.pk)
-            if existing_items.exists():
+        if self.sku and self.duplicate_sku_exists():
+            raise self.duplicate_sku_error()
+
+    def save(self, *args, **kwargs):
+        # SKU uniqueness is left to the (user, sku) constraint rather than
+        # checked up front, which saves a query per write and cannot race.
+        # Inside an outer transaction a savepoint keeps a failed INSERT from
+        # poisoning it; in autocommit mode the statement fails on its own.
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        in_transaction = transaction.get_connection(using).in_atomic_block
+        try:
+            with transaction.atomic(using=using) if in_transaction else nullcontext():
+                super().save(*args, **kwargs)
+        except IntegrityError:
+            if self.sku and self.duplicate_sku_exists():
+                raise self.duplicate_sku_error()
+            raise
+
+    @classmethod
+    def reserve_stock(cls, quantities):
+        """
+        Take `quantities` ({item_id: quantity}) out of stock. Must run inside
+        a transaction.
+
+        The rows are locked in id order first, so concurrent orders queue up
+        behind each other instead of deadlocking, and the UPDATE itself only
+        matches rows that still have enough stock, so nothing is ever
+        oversold even on backends without row locks.
+        """
+        locked = list(
+            cls.objects.select_for_update()
+            .filter(pk__in=quantities)
+            .order_by('pk')
+            .values_list('pk', 'quantity', 'user_id')
+        )
+        available = {item_id: quantity for item_id, quantity, _ in locked}
+        for item_id in sorted(quantities):
+            if available.get(item_id, 0) < quantities[item_id]:
                 raise ValidationError({
-                    'sku': f'An item with SKU "{self.sku}" already exists in your inventory.'
+                    'items': f'Not enough stock for item {item_id} (requested {quantities[item_id]}).'
                 })
 
-    def save(self, *args, **kwargs):
-        self.clean()
-        super().save(*args, **kwargs)
+        enough_stock = Q()
+        for item_id, quantity in quantities.items():
+            enough_stock |= Q(pk=item_id, quantity__gte=quantity)
+        reserved = cls.objects.filter(enough_stock).update(
+            quantity=F('quantity') - cls._per_item(quantities),
+            updated_at=timezone.now()
+        )
+        if reserved != len(quantities):
+            raise ValidationError({'items': 'Not enough stock to place this order.'})
+        stock_changed.send(sender=cls, user_ids={user_id for _, _, user_id in locked})
+
+    @classmethod
+    def release_stock(cls, quantities):
+        if not quantities:
+            return
+        items = cls.objects.filter(pk__in=quantities)
+        items.update(
+            quantity=F('quantity') + cls._per_item(quantities),
+            updated_at=timezone.now()
+        )
+        stock_changed.send(sender=cls, user_ids=set(items.values_list('user_id', flat=True)))
+
+    @staticmethod
+    def _per_item(quantities):
+        return Case(
+            *[When(pk=item_id, then=Value(quantity)) for item_id, quantity in quantities.items()],
+            default=Value(0),
+            output_field=models.PositiveIntegerField()
+        )
 
     class Meta:
         unique_together = ['user', 'sku']
         indexes = [
             models.Index(fields=["sku"]),
             models.Index(fields=["user", "sku"]),
+            # Default list ordering and the keyset pagination cursor.
+            models.Index(fields=["user", "created_at"]),
+            # ?updated_since= delta sync.
+            models.Index(fields=["user", "updated_at"]),
+            # /inventory/expiring/ and the ?expires_* filters.
+            models.Index(fields=["user", "expiration_date"]),
+            # Expired items the nightly job has yet to process.
+            models.Index(
+                fields=["expiration_date"],
+                name="inventory_expiry_pending_idx",
+                condition=Q(expired_at__isnull=True),
+            ),
+            # Partial index serving low_stock_items: only rows below their
+            # threshold are indexed, so it stays small and matches the
+            # quantity < threshold filter directly.
+            models.Index(
+                fields=["user", "created_at"],
+                name="inventory_low_stock_idx",
+                condition=Q(quantity__lt=F("threshold")),
+            ),
+            # Trigram indexes for ?q= search and admin search. icontains
+            # compiles to UPPER(column) LIKE UPPER('%x%') on PostgreSQL, so
+            # the indexed expression has to be UPPER(column) too. PostgreSQL
+            # only; the migrations skip them on other backends.
+            GinIndex(OpClass(Upper("name"), name="gin_trgm_ops"), name="inventory_name_trgm_idx"),
+            GinIndex(OpClass(Upper("sku"), name="gin_trgm_ops"), name="inventory_sku_trgm_idx"),
         ]
         ordering = ['-created_at']
 
@@ -111,35 +219,53 @@ class Order(models.Model):
             self.subtotal = self.calculate_subtotal()
         super().save(*args, **kwargs)
 
+    def line_quantities(self):
+        quantities = {}
+        for item_id, quantity in self.order_items.values_list('item_id', 'quantity'):
+            quantities[item_id] = quantities.get(item_id, 0) + quantity
+        return quantities
+
     def calculate_subtotal(self):
         return sum(
             item.price_at_order * item.quantity
             for item in self.order_items.all()
         )
 
-    def apply_discounts(self, discounts_data):
-        self.subtotal = self.calculate_subtotal()
-        total = float(self.subtotal)
-        
+    @staticmethod
+    def calculate_total(subtotal, discounts_data):
+        total = float(subtotal)
+
         for discount_data in discounts_data:
             if discount_data['type'].upper() == 'PERCENTAGE':
                 total -= total * (float(discount_data['value']) / 100)
             else:
                 total -= float(discount_data['value'])
-        
-        self.total_amount = max(0, total)
-        self.save()
-        
-        for discount_data in discounts_data:
-            Discount.objects.create(
+
+        return max(0, total)
+
+    def build_discounts(self, discounts_data):
+        return [
+            Discount(
                 order=self,
                 discount_type=discount_data['type'].upper(),
                 value=discount_data['value'],
                 description=discount_data.get('description', '')
             )
+            for discount_data in discounts_data
+        ]
+
+    def apply_discounts(self, discounts_data):
+        self.subtotal = self.calculate_subtotal()
+        self.total_amount = self.calculate_total(self.subtotal, discounts_data)
+        self.save()
+        Discount.objects.bulk_create(self.build_discounts(discounts_data))
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # ?updated_since= delta sync.
+            models.Index(fields=["user", "updated_at"]),
+        ]
 
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='order_items')
@@ -156,4 +282,134 @@ class OrderItem(models.Model):
         super().save(*args, **kwargs)
 
     class Meta:
-        unique_together = ['order', 'item']
\ No newline at end of file
+        unique_together = ['order', 'item']
+
+class Tombstone(models.Model):
+    """
+    Records a deleted inventory item or order, so that ?updated_since=
+    delta sync can report deletes as well as changes.
+    """
+    kind = models.CharField(max_length=20)  # model_name of the deleted row
+    object_id = models.BigIntegerField()
+    # No FK constraint: the owner may be deleted in the same cascade.
+    user = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["kind", "user", "deleted_at"]),
+            models.Index(fields=["kind", "deleted_at"]),
+        ]
+
+class DailyRollup(models.Model):
+    """Base for the analytics rollups: one row per user and day."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    day = models.DateField()
+
+    class Meta:
+        abstract = True
+
+class DailySales(DailyRollup):
+    """
+    Sales per user (who placed the order) and order day: lines of orders
+    that are not cancelled, at quantity * price_at_order, before discounts.
+    Kept up to date by inventory.analytics as orders are placed and change
+    status.
+    """
+    orders = models.PositiveIntegerField(default=0)
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ['user', 'day']
+        indexes = [models.Index(fields=["day"])]
+
+class DailySkuSales(DailyRollup):
+    sku = models.CharField(max_length=50)
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ['user', 'day', 'sku']
+        indexes = [models.Index(fields=["day"])]
+
+class DailySupplierSales(DailyRollup):
+    # Lines for items without a supplier are only counted in DailySales.
+    supplier = models.ForeignKey(Supplier, on_delete=models.CASCADE, related_name='+')
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ['user', 'day', 'supplier']
+        indexes = [models.Index(fields=["day"])]
+
+class DailyStockValue(DailyRollup):
+    """Snapshot of stock on hand (quantity * price) per owner and supplier, taken by `manage.py refresh_analytics`."""
+    supplier = models.ForeignKey(Supplier, on_delete=models.CASCADE, null=True, related_name='+')
+    items = models.PositiveIntegerField(default=0)
+    units = models.PositiveBigIntegerField(default=0)
+    value = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "day"]),
+            models.Index(fields=["day"]),
+        ]
+
+class JobFileStorage(FileSystemStorage):
+    """Job inputs and results live under JOB_FILES_ROOT, not MEDIA_ROOT: they are only served through the job download endpoint."""
+
+    @property
+    def base_location(self):
+        return str(settings.JOB_FILES_ROOT)
+
+    @property
+    def location(self):
+        return os.path.abspath(self.base_location)
+
+_job_file_storage = JobFileStorage()
+
+def job_file_storage():
+    return _job_file_storage
+
+class Job(models.Model):
+    """
+    A unit of background work (see inventory.jobs), claimed and run by
+    `manage.py runworker`.
+    """
+    PENDING = 'PENDING'
+    RUNNING = 'RUNNING'
+    DONE = 'DONE'
+    FAILED = 'FAILED'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='jobs')
+    kind = models.CharField(max_length=50)
+    params = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    input_file = models.FileField(upload_to='inputs/%Y/%m/%d/', storage=job_file_storage, blank=True)
+    result_file = models.FileField(upload_to='results/%Y/%m/%d/', storage=job_file_storage, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    # A running job whose lease has expired lost its worker and may be claimed again.
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.kind} job #{self.id} ({self.get_status_display()})"
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            # Claiming: the oldest claimable job first.
+            models.Index(fields=["status", "created_at"]),
+            models.Index(fields=["user", "created_at"]),
+        ]
@@ -0,0 +1,148 @@
+import json
+from functools import reduce
+from operator import or_
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class KeysetCursorPagination(CursorPagination):
+    """
+    CursorPagination whose cursor holds every ordering column, plus `id`
+    to break ties, so the next page starts with a WHERE on all of them.
+
+    DRF's own cursor holds only the first column and steps over rows that
+    share it with OFFSET, which slows down with the number of ties and gives
+    up at offset_cutoff. The ordering columns must not be nullable.
+    """
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if not any(field.lstrip('-') in ('id', 'pk') for field in ordering):
+            ordering += ('-id' if ordering[0].startswith('-') else 'id',)
+        return ordering
+
+    def _get_position_from_instance(self, instance, ordering):
+        position = []
+        for field in ordering:
+            name = field.lstrip('-')
+            position.append(str(instance[name] if isinstance(instance, dict) else getattr(instance, name)))
+        return json.dumps(position)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # CursorPagination.paginate_queryset filters on the first column
+        # only; this is the same with the keyset filter swapped in.
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            (offset, reverse, current_position) = (0, False, None)
+        else:
+            (offset, reverse, current_position) = self.cursor
+
+        if reverse:
+            queryset = queryset.order_by(*[field[1:] if field.startswith('-') else f'-{field}' for field in self.ordering])
+        else:
+            queryset = queryset.order_by(*self.ordering)
+        if current_position is not None:
+            try:
+                queryset = queryset.filter(self.keyset_filter(current_position, reverse))
+            except (DjangoValidationError, ValueError):
+                raise NotFound(self.invalid_cursor_message)
+
+        results = list(queryset[offset:offset + self.page_size + 1])
+        self.page = list(results[:self.page_size])
+        if len(results) > len(self.page):
+            has_following_position = True
+            following_position = self._get_position_from_instance(results[-1], self.ordering)
+        else:
+            has_following_position = False
+            following_position = None
+
+        if reverse:
+            self.page = list(reversed(self.page))
+            self.has_next = (current_position is not None) or (offset > 0)
+            self.has_previous = has_following_position
+            if self.has_next:
+                self.next_position = current_position
+            if self.has_previous:
+                self.previous_position = following_position
+        else:
+            self.has_next = has_following_position
+            self.has_previous = (current_position is not None) or (offset > 0)
+            if self.has_next:
+                self.next_position = following_position
+            if self.has_previous:
+                self.previous_position = current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def keyset_filter(self, position, reverse):
+        """Rows after `position` in the ordering (before it for a reverse cursor)."""
+        try:
+            values = json.loads(position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+
+        # (a, b, c) after (x, y, z): a > x, or a = x and b > y, or ...
+        conditions = []
+        for index, field in enumerate(self.ordering):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') != reverse else 'gt'
+            equal = {self.ordering[previous].lstrip('-'): values[previous] for previous in range(index)}
+            conditions.append(Q(**equal, **{f'{name}__{lookup}': values[index]}))
+        return reduce(or_, conditions)
+
+
+class CreatedAtCursorPagination(KeysetCursorPagination):
+    """
+    Keyset pagination over the default `-created_at` ordering, with `id`
+    breaking ties between rows created in the same instant.
+
+    Pagination is opt-in so existing clients that expect a plain list keep
+    working: it only applies when the request carries `cursor` or `page_size`.
+    """
+    ordering = ('-created_at', '-id')
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        if self.cursor_query_param not in params and self.page_size_query_param not in params:
+            return None
+        return super().paginate_queryset(queryset, request, view)
+
+
+class ExpirationCursorPagination(KeysetCursorPagination):
+    """Keyset pagination for /inventory/expiring/, soonest first. Always applies."""
+    ordering = ('expiration_date', 'id')
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+    def get_ordering(self, request, queryset, view):
+        # Fixed: not taken from the view's ?ordering= filter.
+        return self.ordering
+
+
+class SearchPagination(PageNumberPagination):
+    """
+    Page-number pagination for ranked search results, whose order (by rank)
+    cannot be expressed as a keyset cursor. Always applies.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
@@ -0,0 +1,96 @@
+import random
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.permissions import SAFE_METHODS
+
+_current_request = ContextVar('inventory_current_request', default=None)
+
+
+def _pin_key(user_id):
+    return f'inventory:replica-pin:{user_id}'
+
+
+def pin_to_primary(user):
+    """Send this user's reads to the primary for a while, so they see their own writes."""
+    cache.set(_pin_key(user.pk), True, settings.REPLICA_PIN_SECONDS)
+
+
+def reads_may_use_replica(request):
+    if request is None or request.method not in SAFE_METHODS:
+        return False
+    # DRF copies the authenticated user onto the HttpRequest, so this is the
+    # JWT user once authentication has run (the user lookup itself happens
+    # before that, so anything it caches is read from the primary).
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return True
+    pinned = getattr(request, '_replica_pin', None)
+    if pinned is None or pinned[0] != user.pk:
+        pinned = (user.pk, bool(cache.get(_pin_key(user.pk))))
+        request._replica_pin = pinned
+    return not pinned[1]
+
+
+class ReplicaRouter:
+    """
+    Sends reads made while serving GET/HEAD/OPTIONS requests to one of
+    settings.DATABASE_REPLICAS. Everything else - writes, reads inside unsafe
+    requests, management commands, and reads by users who wrote within the
+    last REPLICA_PIN_SECONDS - stays on the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+        if replicas and reads_may_use_replica(_current_request.get()):
+            return random.choice(replicas)
+        return None
+
+    def db_for_write(self, model, **hints):
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.DATABASE_REPLICAS
+
+
+class ReplicaRoutingMiddleware:
+    """Exposes the current request to ReplicaRouter and pins writers to the primary."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = _current_request.set(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_request.reset(token)
+        self.pin_writer(request)
+        return response
+
+    async def __acall__(self, request):
+        token = _current_request.set(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_request.reset(token)
+        self.pin_writer(request)
+        return response
+
+    def pin_writer(self, request):
+        if request.method not in SAFE_METHODS:
+            user = getattr(request, 'user', None)
+            if user is not None and user.is_authenticated:
+                pin_to_primary(user)
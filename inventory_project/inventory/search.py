@@ -0,0 +1,30 @@
+from django.db import connections
+from django.db.models import Case, FloatField, Q, Value, When
+from django.db.models.functions import Greatest
+
+
+def search_inventory(queryset, query):
+    """
+    Filter `queryset` to items whose name or SKU contains `query` and rank
+    them best match first.
+
+    On PostgreSQL the substring filter (UPPER(column) LIKE UPPER('%q%')) is
+    served by the trigram GIN indexes on UPPER(name) and UPPER(sku), and
+    results are ranked by trigram similarity. Other
+    backends fall back to LIKE with a simple exact / prefix / substring rank.
+    """
+    matches = queryset.filter(Q(name__icontains=query) | Q(sku__icontains=query))
+
+    if connections[queryset.db].vendor == 'postgresql':
+        # Imported lazily: django.contrib.postgres.search needs psycopg.
+        from django.contrib.postgres.search import TrigramSimilarity
+        rank = Greatest(TrigramSimilarity('name', query), TrigramSimilarity('sku', query))
+    else:
+        rank = Case(
+            When(Q(sku__iexact=query) | Q(name__iexact=query), then=Value(1.0)),
+            When(Q(sku__istartswith=query) | Q(name__istartswith=query), then=Value(0.5)),
+            default=Value(0.1),
+            output_field=FloatField(),
+        )
+
+    return matches.annotate(rank=rank).order_by('-rank', '-created_at', '-id')
@@ -1,12 +1,17 @@
 from rest_framework import serializers
+from rest_framework.reverse import reverse
 from django.contrib.auth.models import User
-from .models import InventoryItem, UserProfile, Supplier, Order, OrderItem, Discount
+from django.db import transaction
+from django.core.exceptions import ValidationError as DjangoValidationError
+from . import analytics
+from .instrumentation import MeasuredSerializerMixin
+from .models import InventoryItem, Job, UserProfile, Supplier, Order, OrderItem, Discount
 import re
 from rest_framework.exceptions import ValidationError
 
 GST_REGEX = r'^[0-9]{2}[A-Z]{5}[0-9]{4}[A-Z]{1}[1-9A-Z]{1}Z[0-9A-Z]{1}$'
 
-class SupplierSerializer(serializers.ModelSerializer):
+class SupplierSerializer(MeasuredSerializerMixin, serializers.ModelSerializer):
     created_by = serializers.ReadOnlyField(source='created_by.username')
     gst_number = serializers.CharField(required=False, allow_blank=True)
 
@@ -26,7 +31,7 @@ class SupplierSerializer(serializers.ModelSerializer):
             raise ValidationError('Invalid GST format. Expected format: 22AAAAA0000A1Z5')
         return value
 
-class InventorySerializer(serializers.ModelSerializer):
+class InventorySerializer(MeasuredSerializerMixin, serializers.ModelSerializer):
     user = serializers.CharField(source='user.username', read_only=True)
     supplier = SupplierSerializer(read_only=True)
     supplier_name = serializers.CharField(source='supplier.name', read_only=True)
@@ -43,38 +48,89 @@ class InventorySerializer(serializers.ModelSerializer):
         fields = [
             'id', 'user', 'name', 'sku', 'quantity', 'price',
             'supplier', 'supplier_name', 'supplier_id',
-            'expiration_date', 'threshold', 'created_at', 'updated_at'
+            'expiration_date', 'expired_at', 'threshold', 'created_at', 'updated_at'
         ]
 
+    # Database columns each readable field needs, for sparse fieldsets.
+    SUPPLIER_COLUMNS = tuple(
+        f'supplier__{name}' for name in
+        ('id', 'name', 'gst_number', 'email', 'phone', 'address', 'created_at', 'updated_at', 'created_by__username')
+    )
+    FIELD_COLUMNS = {
+        'id': ('id',),
+        'user': ('user__username',),
+        'name': ('name',),
+        'sku': ('sku',),
+        'quantity': ('quantity',),
+        'price': ('price',),
+        'supplier': SUPPLIER_COLUMNS,
+        'supplier_name': ('supplier__name',),
+        'expiration_date': ('expiration_date',),
+        'expired_at': ('expired_at',),
+        'threshold': ('threshold',),
+        'created_at': ('created_at',),
+        'updated_at': ('updated_at',),
+    }
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    @classmethod
+    def sparse_queryset(cls, queryset, fields, extra_columns=()):
+        """Restrict `queryset` to the joins and columns that `fields` read."""
+        columns = {column for name in fields for column in cls.FIELD_COLUMNS[name]}
+        columns.update(extra_columns)
+        relations = set()
+        for column in columns:
+            path = column.split('__')[:-1]
+            relations.update('__'.join(path[:depth]) for depth in range(1, len(path) + 1))
+        queryset = queryset.select_related(None)
+        if relations:
+            queryset = queryset.select_related(*relations)
+        return queryset.only(*columns)
+
     def validate_sku(self, value):
         if not value:
             raise ValidationError("SKU is required.")
-        
-        user = self.context['request'].user
-        
-        if self.instance:
-            existing_items = InventoryItem.objects.filter(
-                user=user, 
-                sku=value
-            ).exclude(id=self.instance.id)
-        else:
-            existing_items = InventoryItem.objects.filter(
-                user=user, 
-                sku=value
-            )
-        
-        if existing_items.exists():
-            raise ValidationError(f"An item with SKU '{value}' already exists in your inventory.")
-        
+        # Uniqueness per user is enforced by the database on save.
         return value
 
-class DiscountSerializer(serializers.ModelSerializer):
+    def create(self, validated_data):
+        try:
+            return super().create(validated_data)
+        except DjangoValidationError as exc:
+            raise ValidationError(exc.message_dict)
+
+    def update(self, instance, validated_data):
+        if validated_data.get('expiration_date', instance.expiration_date) != instance.expiration_date:
+            # A new date means new stock: let the expiry job look at it again.
+            validated_data['expired_at'] = None
+        try:
+            return super().update(instance, validated_data)
+        except DjangoValidationError as exc:
+            raise ValidationError(exc.message_dict)
+
+class InventoryImportSerializer(serializers.ModelSerializer):
+    """
+    Validates one row of a bulk import. Deliberately free of database
+    lookups: SKU and supplier checks are done per batch by the importer.
+    """
+    supplier_id = serializers.IntegerField(required=False, allow_null=True)
+
+    class Meta:
+        model = InventoryItem
+        fields = ['name', 'sku', 'quantity', 'price', 'supplier_id', 'expiration_date', 'threshold']
+
+class DiscountSerializer(MeasuredSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Discount
         fields = ['id', 'discount_type', 'value', 'description']
         read_only_fields = ['id']
 
-class OrderItemSerializer(serializers.ModelSerializer):
+class OrderItemSerializer(MeasuredSerializerMixin, serializers.ModelSerializer):
     item_name = serializers.CharField(source='item.name', read_only=True)
     item_sku = serializers.CharField(source='item.sku', read_only=True)
 
@@ -83,7 +139,7 @@ class OrderItemSerializer(serializers.ModelSerializer):
         fields = ['id', 'item', 'item_name', 'item_sku', 'quantity', 'price_at_order']
         read_only_fields = ['price_at_order']
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(MeasuredSerializerMixin, serializers.ModelSerializer):
     items = OrderItemSerializer(source='order_items', many=True, read_only=True)
     user = serializers.CharField(source='user.username', read_only=True)
     discounts = DiscountSerializer(many=True, read_only=True)
@@ -96,45 +152,90 @@ class OrderSerializer(serializers.ModelSerializer):
             'delivery_address', 'billing_name', 'billing_address', 'tax_id',
             'status', 'status_display', 'created_at', 'updated_at', 'discounts'
         ]
-        read_only_fields = ['created_at', 'updated_at', 'subtotal', 'total_amount']
+        # Status changes go through update_order_status, which reserves and
+        # releases the stock.
+        read_only_fields = ['status', 'created_at', 'updated_at', 'subtotal', 'total_amount']
 
+    @transaction.atomic
     def create(self, validated_data):
         items_data = self.context.get('items', [])
         discounts_data = self.context.get('discounts', [])
-        
-        subtotal = sum(
-            InventoryItem.objects.get(id=item['id']).price * item['quantity']
-            for item in items_data
+
+        try:
+            item_ids = [int(item_data['id']) for item_data in items_data]
+        except (KeyError, TypeError, ValueError):
+            raise ValidationError({'items': 'Each item needs a numeric id.'})
+        quantities_valid = all(
+            # bool is an int subclass: reject true/false as quantities.
+            isinstance(item_data.get('quantity'), int) and not isinstance(item_data['quantity'], bool)
+            and item_data['quantity'] > 0
+            for item_data in items_data
         )
-        
+        if not quantities_valid:
+            raise ValidationError({'items': 'Each item needs a positive whole quantity.'})
+
+        inventory = InventoryItem.objects.in_bulk(item_ids)
+        missing = [item_id for item_id in item_ids if item_id not in inventory]
+        if missing:
+            raise ValidationError({'items': f'Inventory items not found: {missing}'})
+
+        # An item listed twice becomes one line (orders have one per item).
+        quantities = {}
+        for item_id, item_data in zip(item_ids, items_data):
+            quantities[item_id] = quantities.get(item_id, 0) + item_data['quantity']
+        try:
+            InventoryItem.reserve_stock(quantities)
+        except DjangoValidationError as exc:
+            raise ValidationError(exc.message_dict)
+
+        subtotal = sum(inventory[item_id].price * quantity for item_id, quantity in quantities.items())
+
         order = Order.objects.create(
             user=validated_data['user'],
             subtotal=subtotal,
-            total_amount=subtotal,
+            total_amount=Order.calculate_total(subtotal, discounts_data) if discounts_data else subtotal,
             delivery_address=validated_data['delivery_address'],
             billing_name=validated_data.get('billing_name', ''),
             billing_address=validated_data['billing_address'],
             tax_id=validated_data.get('tax_id', '')
         )
-        
-        for item_data in items_data:
-            item = InventoryItem.objects.get(id=item_data['id'])
-            OrderItem.objects.create(
+
+        OrderItem.objects.bulk_create([
+            OrderItem(
                 order=order,
-                item=item,
-                quantity=item_data['quantity'],
-                price_at_order=item.price
+                item=inventory[item_id],
+                quantity=quantity,
+                price_at_order=inventory[item_id].price
             )
-        
+            for item_id, quantity in quantities.items()
+        ])
+
         if discounts_data:
-            order.apply_discounts(discounts_data)
-        
+            Discount.objects.bulk_create(order.build_discounts(discounts_data))
+
+        analytics.record_order(order)
         return order
 
-class UserProfileSerializer(serializers.ModelSerializer):
+class UserProfileSerializer(MeasuredSerializerMixin, serializers.ModelSerializer):
     username = serializers.CharField(source='user.username', read_only=True)
     email = serializers.CharField(source='user.email', read_only=True)
 
     class Meta:
         model = UserProfile
-        fields = ['username', 'email', 'mobile', 'age', 'gender', 'address']
\ No newline at end of file
+        fields = ['username', 'email', 'mobile', 'age', 'gender', 'address']
+
+class JobSerializer(MeasuredSerializerMixin, serializers.ModelSerializer):
+    url = serializers.HyperlinkedIdentityField(view_name='jobs-detail')
+    download_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Job
+        fields = [
+            'id', 'url', 'kind', 'status', 'result', 'error', 'download_url',
+            'created_at', 'started_at', 'finished_at'
+        ]
+
+    def get_download_url(self, job):
+        if job.status != Job.DONE or not job.result_file:
+            return None
+        return reverse('jobs-download', args=[job.pk], request=self.context.get('request'))
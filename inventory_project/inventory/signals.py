@@ -0,0 +1,54 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+
+from . import instrumentation
+from .caching import SHARED_SCOPE, bump_generations, forget_user, inventory_changed
+
+# Sent with `user_ids` by bulk writes that bypass Model.save(), such as the
+# stock reservation UPDATEs.
+stock_changed = Signal()
+
+
+def _on_commit(func, *args):
+    # Bump only once the write is visible to other connections, otherwise a
+    # concurrent reader could cache the old rows under the new generation.
+    transaction.on_commit(lambda: func(*args))
+
+
+@receiver(post_save, sender='inventory.InventoryItem')
+@receiver(post_delete, sender='inventory.InventoryItem')
+def inventory_item_changed(sender, instance, **kwargs):
+    _on_commit(inventory_changed, [instance.user_id])
+
+
+@receiver(post_delete, sender='inventory.InventoryItem')
+@receiver(post_delete, sender='inventory.Order')
+def record_tombstone(sender, instance, **kwargs):
+    from .models import Tombstone
+    Tombstone.objects.create(kind=sender._meta.model_name, object_id=instance.pk, user_id=instance.user_id)
+
+
+@receiver(stock_changed)
+def inventory_stock_changed(sender, user_ids, **kwargs):
+    _on_commit(inventory_changed, user_ids)
+
+
+@receiver(post_save, sender='inventory.Supplier')
+@receiver(post_delete, sender='inventory.Supplier')
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def shared_data_changed(sender, **kwargs):
+    _on_commit(bump_generations, SHARED_SCOPE)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def user_changed(sender, instance, **kwargs):
+    _on_commit(forget_user, instance.pk)
+
+
+# Query counts and timings for sampled requests (inventory/instrumentation.py).
+connection_created.connect(instrumentation.install)
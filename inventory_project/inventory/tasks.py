@@ -0,0 +1,49 @@
+"""
+Background tasks, by Job.kind. Each takes the Job and returns a JSON-able
+result; tasks that produce a file store it in job.result_file.
+"""
+import io
+import tempfile
+from datetime import date
+
+from django.core.files import File
+
+from . import analytics
+from .exports import CSV_EXPORT_HEADER, export_rows, stream_csv
+from .importers import ROW_READERS, InventoryImport
+
+
+def export_inventory_csv(job):
+    rows = 0
+    with tempfile.TemporaryFile() as output:
+        text = io.TextIOWrapper(output, encoding='utf-8', newline='')
+        for line in stream_csv(CSV_EXPORT_HEADER, export_rows(job.user)):
+            text.write(line)
+            rows += 1
+        text.flush()
+        output.seek(0)
+        job.result_file.save('inventory.csv', File(output), save=False)
+        text.detach()
+    job.save(update_fields=['result_file'])
+    return {'rows': rows - 1, 'filename': 'inventory.csv'}
+
+
+def import_inventory(job):
+    with job.input_file.open('rb') as stream:
+        result = InventoryImport(job.user).run(ROW_READERS[job.params['format']](stream))
+    return result.summary()
+
+
+def refresh_analytics(job):
+    result = {'stock_value_rows': analytics.snapshot_stock_value()}
+    if job.params.get('rebuild_sales'):
+        since = job.params.get('since')
+        result['sales_rows'] = analytics.rebuild_sales(date.fromisoformat(since) if since else None)
+    return result
+
+
+TASKS = {
+    'inventory_csv': export_inventory_csv,
+    'inventory_import': import_inventory,
+    'analytics_refresh': refresh_analytics,
+}
@@ -1,3 +1,1482 @@
-from django.test import TestCase
+import base64
+import json
+import re
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from io import StringIO
+from decimal import Decimal
+from unittest import mock, skipUnless
+from urllib.parse import urlencode
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth import authenticate
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import DatabaseError, connection, connections
+from django.db.models import F, Sum
+from django.http import HttpResponse
+from django.test import AsyncRequestFactory, Client, RequestFactory, TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import analytics, async_views, hashing, instrumentation, jobs, search, views
+from .authentication import CachedJWTAuthentication
+from .management.commands import runworker
+from .models import DailySales, DailySkuSales, DailySupplierSales, Discount, InventoryItem, Job, Order, OrderItem, Supplier
+from .renderers import FastJSONRenderer
+from .serializers import InventorySerializer
+from .routers import ReplicaRouter, ReplicaRoutingMiddleware
+
+
+class QueryCountMixin:
+    """Helpers for asserting that an endpoint's query count does not grow with row count."""
+
+    def count_queries(self, func):
+        with CaptureQueriesContext(connection) as ctx:
+            func()
+        return len(ctx.captured_queries)
+
+    def assertConstantQueries(self, func, grow):
+        """
+        Call `func`, let `grow()` add more rows, then call `func` again and
+        assert both calls issued the same number of queries.
+        """
+        before = self.count_queries(func)
+        grow()
+        after = self.count_queries(func)
+        self.assertEqual(
+            before, after,
+            f'Query count grew from {before} to {after} as rows were added (N+1 query?)'
+        )
+
+
+# Query-count assertions watch the default connection, so keep reads there
+# even when replicas are configured; replica tests opt back in.
+@override_settings(DATABASE_REPLICAS=[])
+class InventoryTestCase(QueryCountMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.staff = User.objects.create_user('admin', password='pass', is_staff=True)
+        self.user = User.objects.create_user('alice', password='pass')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self._seq = 0
+
+    def make_item(self, user=None, **kwargs):
+        self._seq += 1
+        supplier = Supplier.objects.create(name=f'Supplier {self._seq}', created_by=self.staff)
+        defaults = {
+            'user': user or self.user,
+            'name': f'Item {self._seq}',
+            'sku': f'SKU-{self._seq}',
+            'quantity': 10,
+            'price': '9.99',
+            'threshold': 5,
+            'supplier': supplier,
+        }
+        defaults.update(kwargs)
+        return InventoryItem.objects.create(**defaults)
+
+    def make_items(self, count, **kwargs):
+        return [self.make_item(**kwargs) for _ in range(count)]
+
+    def committed(self):
+        # Cache invalidation runs on commit; TestCase never commits, so run the hooks.
+        return self.captureOnCommitCallbacks(execute=True)
+
+    def make_order(self, user=None, lines=2, **kwargs):
+        user = user or self.user
+        defaults = {
+            'user': user,
+            'subtotal': 0,
+            'total_amount': 0,
+            'delivery_address': '1 Main St',
+            'billing_address': '1 Main St',
+        }
+        defaults.update(kwargs)
+        order = Order.objects.create(**defaults)
+        for item in self.make_items(lines, user=user):
+            OrderItem.objects.create(order=order, item=item, quantity=1, price_at_order=item.price)
+        Discount.objects.create(order=order, discount_type='FIXED', value=1)
+        return order
+
+    def make_orders(self, count, **kwargs):
+        return [self.make_order(**kwargs) for _ in range(count)]
+
+
+class InventoryQueryCountTests(InventoryTestCase):
+    def test_inventory_list_query_count_is_constant(self):
+        self.make_items(2)
+        self.assertConstantQueries(
+            lambda: self.client.get('/inventory/'),
+            lambda: self.make_items(10),
+        )
+
+    def test_inventory_list_staff_query_count_is_constant(self):
+        self.client.force_authenticate(self.staff)
+        self.make_items(2)
+        self.assertConstantQueries(
+            lambda: self.client.get('/inventory/'),
+            lambda: self.make_items(10),
+        )
+
+    def test_low_stock_query_count_is_constant(self):
+        def grow():
+            with self.committed():
+                self.make_items(10, quantity=1)
+
+        self.make_items(2, quantity=1)
+        self.assertConstantQueries(lambda: self.client.get('/low-stock/'), grow)
+
+    def test_inventory_retrieve_uses_single_query(self):
+        item = self.make_item()
+        response = self.client.get(f'/inventory/{item.id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['supplier']['created_by'], 'admin')
+        self.assertEqual(self.count_queries(lambda: self.client.get(f'/inventory/{item.id}/')), 1)
+
+
+class OrderQueryCountTests(InventoryTestCase):
+    # The ETag aggregate, orders (joined with user), order items (joined
+    # with items) and discounts.
+    ORDER_LIST_QUERY_BUDGET = 4
+
+    def test_order_list_query_budget(self):
+        self.make_orders(2)
+        self.assertConstantQueries(
+            lambda: self.client.get('/orders/'),
+            lambda: self.make_orders(10, lines=3),
+        )
+        self.assertLessEqual(
+            self.count_queries(lambda: self.client.get('/orders/')),
+            self.ORDER_LIST_QUERY_BUDGET,
+        )
+
+    def test_order_history_query_budget(self):
+        self.make_orders(2)
+        self.assertConstantQueries(
+            lambda: self.client.get('/orders/history/'),
+            lambda: self.make_orders(10, lines=3),
+        )
+        self.assertLessEqual(
+            self.count_queries(lambda: self.client.get('/orders/history/')),
+            self.ORDER_LIST_QUERY_BUDGET,
+        )
+
+    def test_order_history_serializes_items_and_discounts(self):
+        order = self.make_order(lines=2)
+        response = self.client.get('/orders/history/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data[0]['id'], order.id)
+        self.assertEqual(len(response.data[0]['items']), 2)
+        self.assertEqual(len(response.data[0]['discounts']), 1)
+        self.assertEqual(response.data[0]['user'], 'alice')
+
+
+class InventoryExportTests(InventoryTestCase):
+    def test_csv_export_streams_rows_with_joined_names(self):
+        item = self.make_item(expiration_date=None)
+        response = self.client.get('/inventory-report/')
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'Name,SKU,Quantity,Price,Supplier,Expiration Date,Threshold,Added By')
+        self.assertEqual(lines[1], f'{item.name},{item.sku},10,9.99,{item.supplier.name},,5,alice')
+
+    def test_csv_export_query_count_is_constant(self):
+        def export():
+            b''.join(self.client.get('/inventory-report/').streaming_content)
+
+        self.make_items(2)
+        self.assertConstantQueries(export, lambda: self.make_items(10))
+
+
+class OrderCreateTests(InventoryTestCase):
+    def place_order(self, items, discounts=()):
+        return self.client.post('/orders/', {
+            'items': [{'id': item.id, 'quantity': 2} for item in items],
+            'discounts': list(discounts),
+            'delivery_address': '1 Main St',
+            'billing_address': '1 Main St',
+        }, format='json')
+
+    def test_create_order_with_discounts(self):
+        items = self.make_items(3)
+        response = self.place_order(items, [{'type': 'percentage', 'value': '10'}])
+        self.assertEqual(response.status_code, 201)
+        order = Order.objects.get(id=response.data['id'])
+        self.assertEqual(str(order.subtotal), '59.94')
+        self.assertEqual(str(order.total_amount), '53.95')
+        self.assertEqual(order.order_items.count(), 3)
+        self.assertEqual(order.discounts.get().discount_type, 'PERCENTAGE')
+
+    def test_create_order_query_count_is_independent_of_line_count(self):
+        few = self.make_items(2)
+        many = self.make_items(20)
+        discounts = [{'type': 'FIXED', 'value': '1'}, {'type': 'FIXED', 'value': '2'}]
+        self.assertEqual(
+            self.count_queries(lambda: self.place_order(few, discounts)),
+            self.count_queries(lambda: self.place_order(many, discounts)),
+        )
+
+    def test_create_order_with_unknown_item_is_rejected(self):
+        item = self.make_item()
+        item_id = item.id
+        item.delete()
+        response = self.place_order([InventoryItem(id=item_id)])
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+    def test_repeated_item_becomes_one_line(self):
+        item = self.make_item(quantity=10)
+        response = self.client.post('/orders/', {
+            'items': [{'id': item.id, 'quantity': 2}, {'id': item.id, 'quantity': 3}],
+            'delivery_address': '1 Main St',
+            'billing_address': '1 Main St',
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        order = Order.objects.get(id=response.data['id'])
+        self.assertEqual(list(order.order_items.values_list('item_id', 'quantity')), [(item.id, 5)])
+        self.assertEqual(str(order.subtotal), '49.95')
+        item.refresh_from_db()
+        self.assertEqual(item.quantity, 5)
+
+    def test_boolean_quantity_is_rejected(self):
+        item = self.make_item(quantity=10)
+        response = self.client.post('/orders/', {
+            'items': [{'id': item.id, 'quantity': True}],
+            'delivery_address': '1 Main St',
+            'billing_address': '1 Main St',
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+
+class StockReservationTests(InventoryTestCase):
+    def place_order(self, item, quantity):
+        return self.client.post('/orders/', {
+            'items': [{'id': item.id, 'quantity': quantity}],
+            'delivery_address': '1 Main St',
+            'billing_address': '1 Main St',
+        }, format='json')
+
+    def set_status(self, order_id, new_status):
+        self.client.force_authenticate(self.staff)
+        response = self.client.post(f'/orders/{order_id}/update-status/', {'status': new_status}, format='json')
+        self.client.force_authenticate(self.user)
+        return response
+
+    def test_order_decrements_stock(self):
+        item = self.make_item(quantity=5)
+        self.assertEqual(self.place_order(item, 3).status_code, 201)
+        item.refresh_from_db()
+        self.assertEqual(item.quantity, 2)
+
+    def test_order_exceeding_stock_is_rejected(self):
+        item = self.make_item(quantity=2)
+        response = self.place_order(item, 3)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Not enough stock', str(response.data['items']))
+        item.refresh_from_db()
+        self.assertEqual(item.quantity, 2)
+        self.assertFalse(Order.objects.exists())
+
+    def test_items_are_locked_in_id_order(self):
+        # The concurrent version is StockContentionTests; this checks the
+        # lock order on any backend.
+        first, second = self.make_items(2, quantity=1)
+        responses = []
+        with CaptureQueriesContext(connection) as ctx:
+            for items in ([second, first], [first, second]):
+                responses.append(self.client.post('/orders/', {
+                    'items': [{'id': item.id, 'quantity': 1} for item in items],
+                    'delivery_address': '1 Main St',
+                    'billing_address': '1 Main St',
+                }, format='json'))
+        self.assertEqual([response.status_code for response in responses], [201, 400])
+        locks = [
+            query['sql'] for query in ctx.captured_queries
+            if query['sql'].startswith('SELECT "inventory_inventoryitem"."id" AS "pk", "inventory_inventoryitem"."quantity"')
+        ]
+        self.assertEqual(len(locks), 2)
+        for sql in locks:
+            # Column 1 is the id.
+            self.assertRegex(sql, r'ORDER BY 1 ASC( FOR UPDATE)?$')
+        self.assertEqual(
+            list(InventoryItem.objects.filter(pk__in=[first.pk, second.pk]).values_list('quantity', flat=True)), [0, 0]
+        )
+
+    def test_cancel_restores_stock_once(self):
+        item = self.make_item(quantity=5)
+        order_id = self.place_order(item, 3).data['id']
+        self.assertEqual(self.set_status(order_id, 'CANCELLED').status_code, 200)
+        self.assertEqual(self.set_status(order_id, 'CANCELLED').status_code, 200)
+        item.refresh_from_db()
+        self.assertEqual(item.quantity, 5)
+
+    def test_uncancel_reserves_stock_again(self):
+        item = self.make_item(quantity=5)
+        order_id = self.place_order(item, 3).data['id']
+        self.set_status(order_id, 'CANCELLED')
+        self.place_order(item, 4)
+        self.assertEqual(self.set_status(order_id, 'PROCESSING').status_code, 400)
+        self.assertEqual(Order.objects.get(id=order_id).status, 'CANCELLED')
+
+    def test_status_only_changes_through_update_status(self):
+        item = self.make_item(quantity=5)
+        order_id = self.place_order(item, 5).data['id']
+        self.client.patch(f'/orders/{order_id}/', {'status': 'CANCELLED'}, format='json')
+        self.assertEqual(Order.objects.get(id=order_id).status, 'PENDING')
+        self.set_status(order_id, 'CANCELLED')
+        self.client.patch(f'/orders/{order_id}/', {'status': 'PENDING'}, format='json')
+        self.assertEqual(Order.objects.get(id=order_id).status, 'CANCELLED')
+        self.assertEqual(self.place_order(item, 5).status_code, 201)
+        item.refresh_from_db()
+        self.assertEqual(item.quantity, 0)
+
+    def test_delete_releases_live_orders_only(self):
+        item = self.make_item(quantity=5)
+        live, cancelled = self.place_order(item, 2).data['id'], self.place_order(item, 3).data['id']
+        self.set_status(cancelled, 'CANCELLED')
+        self.assertEqual(self.client.delete(f'/orders/{cancelled}/').status_code, 204)
+        self.assertEqual(self.client.delete(f'/orders/{live}/').status_code, 204)
+        item.refresh_from_db()
+        self.assertEqual(item.quantity, 5)
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class StockContentionTests(TransactionTestCase):
+    THREADS = 20
+    STOCK = 7
+
+    def checkout_concurrently(self, buyer, orders):
+        """Place each order (a list of item ids, one unit each) from its own thread at once."""
+        start = threading.Barrier(len(orders))
+        statuses = []
+
+        def checkout(item_ids):
+            client = APIClient()
+            client.force_authenticate(buyer)
+            try:
+                start.wait()
+                response = client.post('/orders/', {
+                    'items': [{'id': item_id, 'quantity': 1} for item_id in item_ids],
+                    'delivery_address': '1 Main St',
+                    'billing_address': '1 Main St',
+                }, format='json')
+                statuses.append(response.status_code)
+            except Exception as exc:
+                statuses.append(exc)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=checkout, args=(item_ids,)) for item_ids in orders]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return statuses
+
+    def test_concurrent_orders_never_oversell(self):
+        buyer = User.objects.create_user('buyer', password='pass')
+        item = InventoryItem.objects.create(
+            user=buyer, name='Widget', sku='W-1', quantity=self.STOCK, price='1.00', threshold=1
+        )
+        statuses = self.checkout_concurrently(buyer, [[item.id]] * self.THREADS)
+
+        item.refresh_from_db()
+        self.assertEqual(sorted(set(statuses), key=str), [201, 400])
+        self.assertEqual(statuses.count(201), self.STOCK)
+        self.assertEqual(item.quantity, 0)
+        self.assertEqual(OrderItem.objects.filter(item=item).count(), self.STOCK)
+
+    def test_opposite_line_order_does_not_deadlock(self):
+        # Locking rows in the order the lines arrive would deadlock these:
+        # half lock A then B, the other half B then A.
+        buyer = User.objects.create_user('buyer', password='pass')
+        first, second = [
+            InventoryItem.objects.create(
+                user=buyer, name='Widget', sku=sku, quantity=self.STOCK, price='1.00', threshold=1
+            )
+            for sku in ('W-1', 'W-2')
+        ]
+        orders = [[first.id, second.id], [second.id, first.id]] * (self.THREADS // 2)
+        statuses = self.checkout_concurrently(buyer, orders)
+
+        # A deadlock surfaces as a 500 or an exception, not a clean 400.
+        self.assertEqual(sorted(set(statuses), key=str), [201, 400])
+        self.assertEqual(statuses.count(201), self.STOCK)
+        for item in (first, second):
+            item.refresh_from_db()
+            self.assertEqual(item.quantity, 0)
+            self.assertEqual(OrderItem.objects.filter(item=item).count(), self.STOCK)
+
+
+class LowStockCacheTests(InventoryTestCase):
+    def low_stock_skus(self):
+        return sorted(item['sku'] for item in self.client.get('/low-stock/').data)
+
+    def test_cache_hit_skips_database(self):
+        self.make_items(3, quantity=1)
+        self.client.get('/low-stock/')
+        self.assertEqual(self.count_queries(lambda: self.client.get('/low-stock/')), 0)
+
+    def test_item_writes_invalidate(self):
+        with self.committed():
+            item = self.make_item(quantity=1)
+        self.assertEqual(self.low_stock_skus(), [item.sku])
+        with self.committed():
+            item.quantity = 50
+            item.save()
+        self.assertEqual(self.low_stock_skus(), [])
+        with self.committed():
+            other = self.make_item(quantity=0)
+        self.assertEqual(self.low_stock_skus(), [other.sku])
+        with self.committed():
+            other.delete()
+        self.assertEqual(self.low_stock_skus(), [])
+
+    def test_order_placement_invalidates(self):
+        item = self.make_item(quantity=6)
+        self.assertEqual(self.low_stock_skus(), [])
+        with self.committed():
+            self.client.post('/orders/', {
+                'items': [{'id': item.id, 'quantity': 2}],
+                'delivery_address': '1 Main St',
+                'billing_address': '1 Main St',
+            }, format='json')
+        self.assertEqual(self.low_stock_skus(), [item.sku])
+
+    def test_staff_view_sees_other_users_writes(self):
+        self.client.force_authenticate(self.staff)
+        self.assertEqual(self.low_stock_skus(), [])
+        with self.committed():
+            item = self.make_item(quantity=1)
+        self.assertEqual(self.low_stock_skus(), [item.sku])
+
+    def test_supplier_rename_invalidates(self):
+        item = self.make_item(quantity=1)
+        self.client.get('/low-stock/')
+        with self.committed():
+            item.supplier.name = 'Renamed'
+            item.supplier.save()
+        self.assertEqual(self.client.get('/low-stock/').data[0]['supplier_name'], 'Renamed')
+
+    def test_uncommitted_writes_do_not_invalidate(self):
+        self.client.get('/low-stock/')
+        self.make_item(quantity=1)
+        self.assertEqual(self.low_stock_skus(), [])
+
+
+class LowStockIndexTests(InventoryTestCase):
+    def test_low_stock_query_uses_partial_index(self):
+        self.make_items(20, quantity=50)
+        self.make_items(3, quantity=1)
+        items = InventoryItem.objects.filter(user=self.user, quantity__lt=F('threshold'))
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                # The test table is tiny; make the planner show which index it would use.
+                cursor.execute('SET LOCAL enable_seqscan = off')
+            elif connection.vendor == 'sqlite':
+                cursor.execute('ANALYZE')
+        self.assertIn('inventory_low_stock_idx', items.explain())
+
+
+class BulkImportTests(InventoryTestCase):
+    def post_bulk(self, body, content_type):
+        return self.client.generic('POST', '/inventory/bulk/', body, content_type=content_type)
+
+    def test_csv_import_creates_and_updates(self):
+        existing = self.make_item(sku='A-1', quantity=1)
+        body = (
+            'name,sku,quantity,price,threshold,expiration_date,supplier_id\n'
+            f'Aspirin,A-1,40,2.50,5,,{existing.supplier_id}\n'
+            'Bandage,B-1,10,1.00,2,2030-01-01,\n'
+        )
+        response = self.post_bulk(body, 'text/csv')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'created': 1, 'updated': 1, 'error_count': 0, 'errors': []})
+        existing.refresh_from_db()
+        self.assertEqual((existing.name, existing.quantity), ('Aspirin', 40))
+        self.assertEqual(InventoryItem.objects.get(user=self.user, sku='B-1').expiration_date.year, 2030)
+
+    def test_ndjson_import_reports_bad_rows_and_keeps_good_ones(self):
+        body = '\n'.join([
+            '{"name": "Gauze", "sku": "G-1", "quantity": 3, "price": "1.00", "threshold": 1}',
+            '{"name": "Gauze", "sku": "G-1", "quantity": 3, "price": "1.00", "threshold": 1}',
+            '{"name": "Tape", "sku": "T-1", "quantity": -1, "price": "1.00", "threshold": 1}',
+            'not json',
+            '{"name": "Swab", "sku": "S-1", "quantity": 3, "price": "1.00", "threshold": 1, "supplier_id": 999999}',
+        ])
+        response = self.post_bulk(body, 'application/x-ndjson')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual([error['row'] for error in response.data['errors']], [2, 3, 4, 5])
+        self.assertEqual(list(InventoryItem.objects.filter(user=self.user).values_list('sku', flat=True)), ['G-1'])
+
+    def test_reimport_keeps_items_expired_unless_redated(self):
+        kept = self.make_item(sku='K-1', expiration_date=datetime(2020, 1, 1).date())
+        redated = self.make_item(sku='R-1', expiration_date=datetime(2020, 1, 1).date())
+        InventoryItem.objects.filter(pk__in=[kept.pk, redated.pk]).update(expired_at=timezone.now())
+        body = (
+            'name,sku,quantity,price,threshold,expiration_date\n'
+            'Kept,K-1,5,1.00,1,2020-01-01\n'
+            'Redated,R-1,5,1.00,1,2031-01-01\n'
+        )
+        self.assertEqual(self.post_bulk(body, 'text/csv').data['updated'], 2)
+        kept.refresh_from_db()
+        redated.refresh_from_db()
+        self.assertIsNotNone(kept.expired_at)
+        self.assertIsNone(redated.expired_at)
+
+    def test_rejected_batch_is_retried_row_by_row(self):
+        bulk_create = InventoryItem.objects.bulk_create
+
+        def reject_bad_rows(items, **kwargs):
+            if any(item.sku == 'BAD-1' for item in items):
+                raise DatabaseError('value too long')
+            return bulk_create(items, **kwargs)
+
+        body = 'name,sku,quantity,price,threshold\nGood,G-1,1,1.00,1\nBad,BAD-1,1,1.00,1\nAlso good,G-2,1,1.00,1\n'
+        with mock.patch.object(InventoryItem.objects, 'bulk_create', side_effect=reject_bad_rows):
+            response = self.post_bulk(body, 'text/csv')
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual([error['row'] for error in response.data['errors']], [2])
+        self.assertEqual(set(InventoryItem.objects.filter(user=self.user).values_list('sku', flat=True)), {'G-1', 'G-2'})
+
+    def test_import_query_count_is_per_batch(self):
+        def rows(prefix, count):
+            return 'name,sku,quantity,price,threshold\n' + ''.join(
+                f'Item,{prefix}-{n},1,1.00,1\n' for n in range(count)
+            )
+
+        few = self.count_queries(lambda: self.post_bulk(rows('A', 5), 'text/csv'))
+        many = self.count_queries(lambda: self.post_bulk(rows('B', 80), 'text/csv'))
+        self.assertEqual(few, many)
+
+    def test_multipart_upload(self):
+        upload = SimpleUploadedFile('items.csv', b'name,sku,quantity,price,threshold\nPad,P-1,4,1.00,1\n', 'text/csv')
+        response = self.client.post('/inventory/bulk/', {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['created'], 1)
+
+    def test_unknown_format_is_rejected(self):
+        self.assertEqual(self.post_bulk('{}', 'application/json').status_code, 415)
+
+
+class SkuUniquenessTests(InventoryTestCase):
+    def create_item(self, sku):
+        return self.client.post('/inventory/', {
+            'name': 'Syringe', 'sku': sku, 'quantity': 1, 'price': '1.00', 'threshold': 1,
+        }, format='json')
+
+    def test_duplicate_sku_on_create_is_a_field_error(self):
+        self.make_item(sku='DUP-1')
+        response = self.create_item('DUP-1')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['sku'], ["An item with SKU 'DUP-1' already exists in your inventory."])
+
+    def test_duplicate_sku_on_update_is_a_field_error(self):
+        self.make_item(sku='DUP-1')
+        item = self.make_item(sku='DUP-2')
+        response = self.client.patch(f'/inventory/{item.id}/', {'sku': 'DUP-1'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('sku', response.data)
+
+    def test_same_sku_for_another_user_is_allowed(self):
+        self.make_item(user=self.staff, sku='SHARED')
+        self.assertEqual(self.create_item('SHARED').status_code, 201)
+
+    def test_create_does_not_check_sku_before_insert(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.create_item('NEW-1').status_code, 201)
+        selects = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('SELECT')]
+        self.assertEqual(selects, [])
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'])
+class ReplicaRoutingTests(InventoryTestCase):
+    def route_read(self, method, user):
+        routed = []
+
+        def view(request):
+            request.user = user
+            routed.append(ReplicaRouter().db_for_read(InventoryItem))
+            return HttpResponse()
+
+        ReplicaRoutingMiddleware(view)(RequestFactory().generic(method, '/inventory/'))
+        return routed[0]
+
+    def test_safe_requests_read_from_replica(self):
+        self.assertEqual(self.route_read('GET', self.user), 'replica1')
+
+    def test_unsafe_requests_read_from_primary(self):
+        self.assertIsNone(self.route_read('POST', self.user))
+
+    def test_reads_outside_requests_use_primary(self):
+        self.assertIsNone(ReplicaRouter().db_for_read(InventoryItem))
+
+    def test_writer_reads_own_writes_from_primary(self):
+        self.route_read('POST', self.user)
+        self.assertIsNone(self.route_read('GET', self.user))
+        self.assertEqual(self.route_read('GET', self.staff), 'replica1')
+        cache.clear()  # pin expired
+        self.assertEqual(self.route_read('GET', self.user), 'replica1')
+
+    def test_cache_fills_read_from_primary(self):
+        # replica1 has no connection, so any read routed to it fails - as a
+        # read from a lagging replica would put stale rows under the fresh
+        # generation.
+        self.make_item(quantity=1)
+        self.make_item(user=self.staff, quantity=1)
+        auth = f'Bearer {AccessToken.for_user(self.staff)}'
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=auth)
+        response = client.get('/low-stock/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 2)
+
+        cache.clear()
+        request = AsyncRequestFactory().get('/low-stock/', headers={'Authorization': auth})
+        response = async_to_sync(ReplicaRoutingMiddleware(async_views.low_stock_items))(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(json.loads(response.content)), 2)
+
+    @override_settings(CSV_EXPORT_INLINE_ROWS=0)
+    def test_csv_export_streams_from_replica(self):
+        # The export's rows are read after the middleware has returned.
+        request = APIRequestFactory().get('/inventory-report/')
+        force_authenticate(request, self.user)
+        with mock.patch('inventory.views.export_rows', return_value=iter([])) as export_rows:
+            ReplicaRoutingMiddleware(views.export_inventory_csv)(request)
+        export_rows.assert_called_once_with(self.user, using='replica1')
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_no_replicas_configured(self):
+        self.assertIsNone(self.route_read('GET', self.user))
+
+
+HAS_REPLICA = 'replica1' in settings.DATABASES
+
+
+@skipUnless(HAS_REPLICA, 'needs a replica1 database alias (see DB_REPLICA_HOSTS)')
+@override_settings(DATABASE_REPLICAS=['replica1'])
+class ReplicaEndToEndTests(InventoryTestCase):
+    databases = {'default', 'replica1'} if HAS_REPLICA else {'default'}
+
+    def test_list_is_served_by_replica(self):
+        self.make_item()
+        with CaptureQueriesContext(connections['replica1']) as replica:
+            self.assertEqual(self.client.get('/inventory/').status_code, 200)
+        self.assertTrue(any('inventory_inventoryitem' in q['sql'] for q in replica.captured_queries))
+
+
+class CursorPaginationTests(InventoryTestCase):
+    def test_pages_through_ties_without_offset(self):
+        items = self.make_items(7)
+        InventoryItem.objects.filter(user=self.user).update(created_at=timezone.now())
+        expected = sorted(item.id for item in items)[::-1]
+
+        seen, pages = [], []
+        url, params = '/inventory/', {'page_size': 3}
+        with CaptureQueriesContext(connection) as ctx:
+            while url:
+                page = self.client.get(url, params).data
+                pages.append(page)
+                seen += [item['id'] for item in page['results']]
+                url, params = page['next'], None
+        self.assertEqual(seen, expected)
+        self.assertEqual(len(pages), 3)
+        self.assertFalse([query['sql'] for query in ctx.captured_queries if 'OFFSET' in query['sql']])
+
+        back = self.client.get(pages[-1]['previous']).data
+        self.assertEqual([item['id'] for item in back['results']], expected[3:6])
+
+    def test_invalid_cursor(self):
+        self.make_items(2)
+        for position in ['["not a date", "1"]', '["2026-01-01"]', 'nope']:
+            cursor = base64.b64encode(urlencode({'p': position}).encode()).decode()
+            self.assertEqual(self.client.get('/inventory/', {'cursor': cursor}).status_code, 404)
+
+
+class InventorySearchTests(InventoryTestCase):
+    def test_search_matches_name_and_sku_ranked(self):
+        self.make_item(name='Paracetamol syrup', sku='PARA-2')
+        self.make_item(name='Bandage', sku='BAN-1')
+        self.make_item(name='Vitamin C', sku='para')
+        self.make_item(user=self.staff, name='Paracetamol', sku='PARA-9')
+
+        response = self.client.get('/inventory/', {'q': 'para'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual([item['sku'] for item in response.data['results']], ['para', 'PARA-2'])
+
+    @skipUnless(connection.vendor == 'postgresql', 'The trigram indexes are PostgreSQL only.')
+    def test_search_uses_trigram_indexes(self):
+        self.make_items(20, name='Gauze')
+        matches = search.search_inventory(InventoryItem.objects.filter(user=self.user), 'auz')
+        with connection.cursor() as cursor:
+            # The test table is tiny; make the planner show which index it would use.
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        plan = matches.explain()
+        self.assertIn('inventory_name_trgm_idx', plan)
+        self.assertIn('inventory_sku_trgm_idx', plan)
+
+    def test_search_is_paginated(self):
+        self.make_items(5, name='Gauze')
+        response = self.client.get('/inventory/', {'q': 'gauze', 'page_size': 2})
+        self.assertEqual(response.data['count'], 5)
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertIsNotNone(response.data['next'])
+
+
+class InventoryListParamsTests(InventoryTestCase):
+    def skus(self, **params):
+        response = self.client.get('/inventory/', params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return [item['sku'] for item in response.data]
+
+    def test_filters(self):
+        today = timezone.localdate()
+        soon = self.make_item(sku='SOON', quantity=2, expiration_date=today + timedelta(days=3))
+        self.make_item(sku='LATER', quantity=20, expiration_date=today + timedelta(days=60))
+        self.make_item(sku='NEVER', quantity=8)
+
+        self.assertEqual(self.skus(supplier=soon.supplier_id), ['SOON'])
+        self.assertEqual(self.skus(expires_within=7), ['SOON'])
+        self.assertEqual(self.skus(expires_after=today + timedelta(days=30)), ['LATER'])
+        self.assertEqual(self.skus(min_quantity=5, max_quantity=10), ['NEVER'])
+        self.assertEqual(self.skus(low_stock='true'), ['SOON'])
+        self.assertEqual(sorted(self.skus(low_stock='false')), ['LATER', 'NEVER'])
+
+    def test_invalid_filter_is_rejected(self):
+        response = self.client.get('/inventory/', {'min_quantity': 'lots'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('min_quantity', response.data)
+
+    def test_ordering(self):
+        for sku in ['B', 'C', 'A']:
+            self.make_item(sku=sku)
+        self.assertEqual(self.skus(ordering='sku'), ['A', 'B', 'C'])
+        self.assertEqual(self.skus(ordering='-sku'), ['C', 'B', 'A'])
+        self.assertEqual(self.skus(), ['A', 'C', 'B'])
+
+    def test_ordering_with_cursor_pagination(self):
+        for sku in ['B', 'C', 'A']:
+            self.make_item(sku=sku)
+        first = self.client.get('/inventory/', {'ordering': 'sku', 'page_size': 2}).data
+        self.assertEqual([item['sku'] for item in first['results']], ['A', 'B'])
+        second = self.client.get(first['next']).data
+        self.assertEqual([item['sku'] for item in second['results']], ['C'])
+
+    def test_sparse_fieldset_selects_only_requested_columns(self):
+        self.make_item(sku='S-1')
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/inventory/', {'fields': 'id,sku,quantity'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.data[0]), {'id', 'sku', 'quantity'})
+        # The ETag aggregate, then the rows.
+        self.assertEqual(len(ctx.captured_queries), 2)
+        sql = ctx.captured_queries[1]['sql']
+        self.assertNotIn('JOIN', sql)
+        self.assertNotIn('"name"', sql)
+
+    def test_sparse_fieldset_with_relations(self):
+        item = self.make_item()
+        response = self.client.get('/inventory/', {'fields': 'sku,supplier_name,user'})
+        self.assertEqual(response.data[0], {'sku': item.sku, 'supplier_name': item.supplier.name, 'user': 'alice'})
+        response = self.client.get(f'/inventory/{item.id}/', {'fields': 'supplier'})
+        self.assertEqual(response.data['supplier']['created_by'], 'admin')
+
+    def test_unknown_field_is_rejected(self):
+        self.assertEqual(self.client.get('/inventory/', {'fields': 'sku,secret'}).status_code, 400)
+
+
+class FastListRenderingTests(InventoryTestCase):
+    def assertSameBytes(self, path, params=None):
+        with override_settings(FAST_LIST_SERIALIZERS=False):
+            expected = self.client.get(path, params)
+        with override_settings(FAST_LIST_SERIALIZERS=True):
+            actual = self.client.get(path, params)
+        self.assertEqual(expected.status_code, 200)
+        self.assertEqual(actual.status_code, 200)
+        self.assertEqual(actual.content, expected.content)
+        return actual
+
+    def test_inventory_list_matches_model_serializer(self):
+        self.make_item(name='Crème brûlée\u2028 50% "off"', expiration_date=timezone.localdate())
+        self.make_item(supplier=None, price='0.10')
+        self.make_item(user=self.staff)
+        response = self.assertSameBytes('/inventory/')
+        self.assertEqual(len(response.data), 2)
+        self.assertNotIn('supplier_name', response.data[0])
+
+        self.client.force_authenticate(self.staff)
+        self.assertSameBytes('/inventory/')
+        self.assertSameBytes('/inventory/', {'page_size': 2, 'ordering': 'sku'})
+        self.assertSameBytes('/inventory/', {'q': 'brûlée'})
+
+    def test_order_list_matches_model_serializer(self):
+        self.make_order(status='SHIPPED')
+        self.make_order(lines=0)
+        order = self.make_order(lines=3)
+        Discount.objects.create(order=order, discount_type='PERCENTAGE', value='12.50', description='Loyalty')
+        response = self.assertSameBytes('/orders/')
+        self.assertEqual(len(response.data), 3)
+        self.assertSameBytes('/orders/', {'page_size': 2})
+        self.assertSameBytes('/orders/', {'status': 'SHIPPED'})
+
+    def test_fast_renderer_matches_json_renderer(self):
+        data = {'name': 'café \u2028\u2029 </script>', 'price': '1.50', 'at': timezone.now(),
+                'day': timezone.localdate(), 'nested': [1, None, True, {'x': 2.5}], 'amount': Decimal('2.25')}
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(FastJSONRenderer().render(None), b'')
+
+
+class ConditionalRequestTests(InventoryTestCase):
+    def test_inventory_list_not_modified(self):
+        item = self.make_item()
+        response = self.client.get('/inventory/')
+        etag = response['ETag']
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertIn('Last-Modified', response)
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/inventory/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(len(ctx.captured_queries), 1)
+
+        self.assertNotEqual(self.client.get('/inventory/', {'ordering': 'sku'})['ETag'], etag)
+        with self.committed():
+            item.supplier.name = 'Renamed'
+            item.supplier.save()
+        self.assertEqual(self.client.get('/inventory/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_inventory_list_etag_changes_on_write_and_delete(self):
+        items = self.make_items(2)
+        etag = self.client.get('/inventory/')['ETag']
+        items[0].delete()
+        response = self.client.get('/inventory/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        InventoryItem.objects.filter(pk=items[1].pk).update(quantity=1, updated_at=timezone.now() + timedelta(seconds=1))
+        self.assertEqual(self.client.get('/inventory/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_order_and_supplier_lists_not_modified(self):
+        self.make_order()
+        for path in ['/orders/', '/suppliers/']:
+            etag = self.client.get(path)['ETag']
+            self.assertEqual(self.client.get(path, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_retrieve_not_modified(self):
+        item = self.make_item()
+        etag = self.client.get(f'/inventory/{item.id}/')['ETag']
+        response = self.client.get(f'/inventory/{item.id}/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_update_with_stale_etag_is_rejected(self):
+        item = self.make_item()
+        url = f'/inventory/{item.id}/'
+        etag = self.client.get(url)['ETag']
+        data = {'name': 'Renamed', 'sku': item.sku, 'quantity': 3, 'price': '1.00', 'threshold': 1}
+
+        response = self.client.put(url, data, format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(self.client.get(url)['ETag'], response['ETag'])
+
+        response = self.client.put(url, dict(data, quantity=4), format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 412)
+        item.refresh_from_db()
+        self.assertEqual(item.quantity, 3)
+
+        self.assertEqual(self.client.delete(url, HTTP_IF_MATCH=etag).status_code, 412)
+        self.assertTrue(InventoryItem.objects.filter(pk=item.pk).exists())
+
+
+@override_settings(DELTA_SYNC_OVERLAP_SECONDS=0)
+class DeltaSyncTests(InventoryTestCase):
+    def changes(self, path, since, **params):
+        if not isinstance(since, str):
+            since = since.isoformat()
+        response = self.client.get(path, dict(params, updated_since=since))
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_changes_and_deletes_since_cursor(self):
+        start = timezone.now()
+        kept, dropped = self.make_items(2)
+        self.make_item(user=self.staff)
+        data = self.changes('/inventory/', start)
+        self.assertEqual([row['id'] for row in data['results']], [kept.id, dropped.id])
+        self.assertEqual(data['deleted'], [])
+        self.assertFalse(data['has_more'])
+
+        kept.quantity = 99
+        kept.save()
+        dropped_id = dropped.id
+        dropped.delete()
+        self.make_item(user=self.staff).delete()
+        data = self.changes('/inventory/', data['next_updated_since'])
+        self.assertEqual([(row['id'], row['quantity']) for row in data['results']], [(kept.id, 99)])
+        self.assertEqual(data['deleted'], [dropped_id])
+
+        self.assertEqual(self.changes('/inventory/', data['next_updated_since'])['results'], [])
+
+    def test_pages_do_not_split_equal_timestamps(self):
+        start = timezone.now()
+        items = self.make_items(4)
+        InventoryItem.objects.filter(pk__in=[items[1].pk, items[2].pk]).update(updated_at=items[1].updated_at)
+        first = self.changes('/inventory/', start, page_size=2)
+        self.assertTrue(first['has_more'])
+        self.assertEqual([row['id'] for row in first['results']], [items[0].id])
+        second = self.changes('/inventory/', first['next_updated_since'], page_size=2)
+        self.assertEqual([row['id'] for row in second['results']], [items[1].id, items[2].id])
+        third = self.changes('/inventory/', second['next_updated_since'], page_size=2)
+        self.assertEqual([row['id'] for row in third['results']], [items[3].id])
+        self.assertFalse(third['has_more'])
+
+    @override_settings(DELTA_SYNC_OVERLAP_SECONDS=60)
+    def test_cursor_trails_the_clock_while_paging(self):
+        start = timezone.now()
+        fresh = self.make_items(2)
+        first = self.changes('/inventory/', start, page_size=1)
+        self.assertFalse(first['has_more'])
+        self.assertEqual([row['id'] for row in first['results']], [fresh[0].id])
+        self.assertEqual(datetime.fromisoformat(first['next_updated_since']), start)
+        # Stamped at the first page's row but committed after it was read.
+        late = self.make_item()
+        InventoryItem.objects.filter(pk=late.pk).update(updated_at=fresh[0].updated_at)
+        second = self.changes('/inventory/', first['next_updated_since'])
+        self.assertIn(late.id, [row['id'] for row in second['results']])
+
+    def test_order_changes(self):
+        start = timezone.now()
+        order = self.make_order()
+        deleted = self.make_order()
+        deleted_id = deleted.id
+        deleted.delete()
+        data = self.changes('/orders/', start)
+        self.assertEqual([row['id'] for row in data['results']], [order.id])
+        self.assertEqual(len(data['results'][0]['items']), 2)
+        self.assertEqual(data['deleted'], [deleted_id])
+
+    def test_stale_or_invalid_cursor(self):
+        response = self.client.get('/inventory/', {'updated_since': 'yesterday'})
+        self.assertEqual(response.status_code, 400)
+        stale = timezone.now() - timedelta(days=settings.TOMBSTONE_RETENTION_DAYS + 1)
+        response = self.client.get('/inventory/', {'updated_since': stale.isoformat()})
+        self.assertEqual(response.status_code, 410)
+
+
+class CachedAuthenticationTests(InventoryTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+
+    def test_authenticated_get_needs_no_user_query(self):
+        self.assertEqual(self.client.get('/me/').data['username'], 'alice')
+        self.assertEqual(self.count_queries(lambda: self.client.get('/me/')), 0)
+
+    def test_user_save_invalidates_cached_identity(self):
+        self.client.get('/me/')
+        with self.committed():
+            self.user.is_staff = True
+            self.user.save()
+        response = self.client.get('/me/')
+        self.assertTrue(response.data['is_staff'])
+
+        with self.committed():
+            self.user.is_active = False
+            self.user.save()
+        self.assertEqual(self.client.get('/me/').status_code, 401)
+
+    def test_entries_are_per_token(self):
+        self.client.get('/me/')
+        other = APIClient()
+        other.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        self.assertEqual(self.count_queries(lambda: other.get('/me/')), 1)
+        self.assertEqual(self.count_queries(lambda: other.get('/me/')), 0)
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_per_process_cache_is_not_used(self):
+        self.client.get('/me/')
+        self.assertEqual(self.count_queries(lambda: self.client.get('/me/')), 1)
+
+    def test_cached_user_loads_other_fields_on_access(self):
+        self.client.get('/me/')
+        request = RequestFactory().get('/me/', HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        user, _ = CachedJWTAuthentication().authenticate(request)
+        self.assertEqual(user, self.user)
+        self.assertTrue(user.check_password('pass'))
+
+
+class PasswordHashingTests(InventoryTestCase):
+    def obtain_token(self, password='pass'):
+        return APIClient().post('/api/token/', {'username': 'alice', 'password': password}, format='json')
+
+    def test_login_and_registration_hash_on_the_pool(self):
+        self.assertEqual(self.obtain_token().status_code, 200)
+        self.assertEqual(self.obtain_token('wrong').status_code, 401)
+
+        response = APIClient().post('/register/', {
+            'username': 'bob', 'password': 's3cret-pass', 'email': 'Bob@EXAMPLE.com',
+            'mobile': '123', 'age': 30, 'gender': 'M', 'address': 'x',
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        bob = User.objects.get(username='bob')
+        self.assertEqual(bob.email, 'Bob@example.com')
+        self.assertTrue(bob.check_password('s3cret-pass'))
+
+    @override_settings(PASSWORD_HASH_ITERATIONS=1000)
+    def test_login_rehashes_at_configured_cost(self):
+        self.assertEqual(self.obtain_token().status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$1000$'))
+
+    @override_settings(PASSWORD_HASH_WORKERS=1, PASSWORD_HASH_QUEUE_SIZE=0)
+    def test_full_pool_answers_429(self):
+        started, release = threading.Event(), threading.Event()
+
+        def occupy():
+            started.set()
+            release.wait(10)
+
+        worker = threading.Thread(target=hashing.get_pool().run, args=(occupy,))
+        worker.start()
+        try:
+            started.wait(10)
+            response = self.obtain_token()
+            self.assertEqual(response.status_code, 429)
+            self.assertIn('Retry-After', response)
+            # The admin login is not a DRF view: a failed sign-in, not a 500.
+            response = Client().post('/admin/login/', {'username': 'admin', 'password': 'pass'})
+            self.assertEqual(response.status_code, 200)
+            self.assertIsNone(authenticate(RequestFactory().post('/admin/login/'), username='admin', password='pass'))
+        finally:
+            release.set()
+            worker.join()
+        self.assertEqual(self.obtain_token().status_code, 200)
+
+
+class AsyncReadViewTests(InventoryTestCase):
+    def setUp(self):
+        super().setUp()
+        self.auth = f'Bearer {AccessToken.for_user(self.user)}'
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=self.auth)
+
+    def call(self, view, path, data=None, **headers):
+        headers.setdefault('Authorization', self.auth)
+        request = AsyncRequestFactory().get(path, data, headers=headers)
+        return async_to_sync(view)(request)
+
+    def assertSameAsSync(self, view, path, data=None):
+        expected = self.client.get(path, data)
+        actual = self.call(view, path, data)
+        self.assertEqual(actual.status_code, expected.status_code)
+        self.assertEqual(actual['Content-Type'], expected['Content-Type'])
+        self.assertEqual(actual.content, expected.content)
+        return actual
+
+    def test_responses_match_sync_views(self):
+        self.make_item(quantity=1)
+        self.make_item(quantity=1, supplier=None)
+        self.make_item(user=self.staff, quantity=1)
+        self.make_order(status='SHIPPED')
+        self.make_order(lines=0)
+
+        self.assertSameAsSync(async_views.get_current_user_info, '/me/')
+        cache.clear()
+        self.assertSameAsSync(async_views.low_stock_items, '/low-stock/')
+        self.assertSameAsSync(async_views.low_stock_items, '/low-stock/')
+        self.assertSameAsSync(async_views.order_history, '/orders/history/')
+        self.assertSameAsSync(async_views.order_history, '/orders/history/', {'status': 'SHIPPED'})
+        self.assertSameAsSync(async_views.inventory_list, '/inventory/')
+        self.assertSameAsSync(async_views.inventory_list, '/inventory/', {'ordering': 'sku', 'supplier': 'none'})
+        self.assertSameAsSync(async_views.inventory_list, '/inventory/', {'page_size': 1})
+        self.assertSameAsSync(async_views.inventory_list, '/inventory/', {'ordering': 'bogus'})
+
+    def test_inventory_list_not_modified(self):
+        self.make_item()
+        response = self.call(async_views.inventory_list, '/inventory/')
+        self.assertEqual(response['ETag'], self.client.get('/inventory/')['ETag'])
+        response = self.call(async_views.inventory_list, '/inventory/', **{'If-None-Match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+
+    def test_authentication_errors(self):
+        request = AsyncRequestFactory().get('/me/')
+        response = async_to_sync(async_views.get_current_user_info)(request)
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response['WWW-Authenticate'], 'Bearer realm="api"')
+        response = self.call(async_views.order_history, '/orders/history/', Authorization='Bearer nope')
+        self.assertEqual(response.status_code, 401)
+        self.assertIn(b'token_not_valid', response.content)
+
+    def test_other_requests_fall_back_to_sync_view(self):
+        response = self.call(async_views.get_current_user_info, '/me/', Accept='text/html')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'<html', response.content)
+
+        request = AsyncRequestFactory().post('/inventory/', {
+            'name': 'Posted', 'sku': 'POST-1', 'quantity': 1, 'price': '1.00', 'threshold': 1,
+        }, content_type='application/json', headers={'Authorization': self.auth})
+        self.assertEqual(async_to_sync(async_views.inventory_list)(request).status_code, 201)
+        self.assertTrue(InventoryItem.objects.filter(sku='POST-1').exists())
+
+    def test_replica_middleware_is_async_capable(self):
+        async def view(request):
+            return HttpResponse()
+        middleware = ReplicaRoutingMiddleware(view)
+        response = async_to_sync(middleware)(AsyncRequestFactory().get('/'))
+        self.assertEqual(response.status_code, 200)
+
+
+class AnalyticsTests(InventoryTestCase):
+    def place_order(self, lines):
+        response = self.client.post('/orders/', {
+            'items': [{'id': item.id, 'quantity': quantity} for item, quantity in lines],
+            'delivery_address': '1 Main St',
+            'billing_address': '1 Main St',
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        return response.data['id']
+
+    def set_status(self, order_id, new_status):
+        self.client.force_authenticate(self.staff)
+        self.client.post(f'/orders/{order_id}/update-status/', {'status': new_status}, format='json')
+        self.client.force_authenticate(self.user)
+
+    def rollups(self):
+        return [
+            sorted(model.objects.values_list(*fields))
+            for model, fields in (
+                (DailySales, ('user_id', 'day', 'orders', 'units', 'revenue')),
+                (DailySkuSales, ('user_id', 'day', 'sku', 'units', 'revenue')),
+                (DailySupplierSales, ('user_id', 'day', 'supplier_id', 'units', 'revenue')),
+            )
+        ]
+
+    def test_sales_rollups_follow_orders(self):
+        widget, gadget = self.make_item(sku='W', quantity=50), self.make_item(sku='G', quantity=50, supplier=None)
+        self.place_order([(widget, 2), (gadget, 1)])
+        cancelled = self.place_order([(widget, 3)])
+        self.set_status(cancelled, 'CANCELLED')
+
+        response = self.client.get('/analytics/revenue/')
+        today = response.data['results'][-1]
+        self.assertEqual(len(response.data['results']), analytics.DEFAULT_WINDOW_DAYS)
+        self.assertEqual((today['orders'], today['units'], today['revenue']), (1, 3, '29.97'))
+        self.assertEqual(response.data['results'][0]['revenue'], '0.00')
+
+        self.set_status(cancelled, 'PENDING')
+        skus = self.client.get('/analytics/top-skus/', {'limit': 1}).data['results']
+        self.assertEqual(skus, [{'units': 5, 'revenue': '49.95', 'sku': 'W'}])
+        suppliers = self.client.get('/analytics/suppliers/').data['results']
+        self.assertEqual(suppliers, [
+            {'units': 5, 'revenue': '49.95', 'supplier_id': widget.supplier_id, 'supplier_name': widget.supplier.name},
+        ])
+
+        self.client.delete(f'/orders/{cancelled}/')
+        self.assertEqual(self.client.get('/analytics/top-skus/').data['results'][0]['units'], 2)
+
+        incremental = self.rollups()
+        analytics.rebuild_sales()
+        self.assertEqual(self.rollups(), [
+            [row for row in rows if row[-2]] for rows in incremental
+        ])
+
+    def test_other_users_sales_are_hidden(self):
+        other = User.objects.create_user('bob')
+        self.client.force_authenticate(other)
+        self.place_order([(self.make_item(user=other), 1)])
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.get('/analytics/top-skus/').data['results'], [])
+        self.client.force_authenticate(self.staff)
+        self.assertEqual(len(self.client.get('/analytics/top-skus/').data['results']), 1)
+
+    def test_stock_value_snapshot(self):
+        self.assertEqual(self.client.get('/analytics/stock-value/').data, {'day': None, 'results': []})
+        item = self.make_item(quantity=4, price='2.50')
+        self.make_item(quantity=1, price='1.00', supplier=None)
+        analytics.snapshot_stock_value()
+        analytics.snapshot_stock_value()
+        response = self.client.get('/analytics/stock-value/')
+        self.assertEqual(response.data['day'], timezone.localdate())
+        self.assertEqual(response.data['results'], [
+            {'supplier_id': item.supplier_id, 'supplier_name': item.supplier.name, 'items': 1, 'units': 4, 'value': '10.00'},
+            {'supplier_id': None, 'supplier_name': None, 'items': 1, 'units': 1, 'value': '1.00'},
+        ])
+
+    def test_invalid_window_is_rejected(self):
+        self.assertEqual(self.client.get('/analytics/revenue/', {'since': '2025-02-01', 'until': '2025-01-01'}).status_code, 400)
+        self.assertEqual(self.client.get('/analytics/revenue/', {'since': '2020-01-01', 'until': '2025-01-01'}).status_code, 400)
+
+
+class ExpiringItemsTests(InventoryTestCase):
+    def expiring_skus(self, **params):
+        response = self.client.get('/inventory/expiring/', params)
+        self.assertEqual(response.status_code, 200)
+        return [item['sku'] for item in response.data['results']], response.data['next']
+
+    def test_feed_lists_soonest_first_one_page_at_a_time(self):
+        today = timezone.localdate()
+        for sku, days in (('LATER', 5), ('TODAY', 0), ('SOON', 1), ('FAR', 30), ('PAST', -1)):
+            self.make_item(sku=sku, expiration_date=today + timedelta(days=days))
+        self.make_item(sku='NONE')
+        self.make_item(sku='OTHER', user=self.staff, expiration_date=today)
+
+        self.assertEqual(self.expiring_skus(), (['TODAY', 'SOON', 'LATER'], None))
+        self.assertEqual(self.expiring_skus(within=0)[0], ['TODAY'])
+        first, next_url = self.expiring_skus(page_size=2)
+        self.assertEqual(first, ['TODAY', 'SOON'])
+        self.assertEqual([item['sku'] for item in self.client.get(next_url).data['results']], ['LATER'])
+        self.assertEqual(self.client.get('/inventory/expiring/', {'within': -1}).status_code, 400)
+
+        with override_settings(FAST_LIST_SERIALIZERS=False):
+            expected = self.client.get('/inventory/expiring/')
+        self.assertEqual(self.client.get('/inventory/expiring/').content, expected.content)
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_refuses_per_process_cache(self):
+        with self.assertRaisesMessage(CommandError, 'shared cache'):
+            call_command('process_expired_items', stdout=StringIO())
+
+    def test_expired_items_are_processed_in_batches(self):
+        today = timezone.localdate()
+        expired = self.make_items(5, quantity=3, expiration_date=today - timedelta(days=1))
+        fresh = self.make_item(quantity=3, expiration_date=today)
+        out = StringIO()
+        call_command('process_expired_items', '--write-down', '--batch-size', '2', stdout=out)
+        self.assertIn('Marked 5 items', out.getvalue())
+        self.assertIn('writing down 15 units', out.getvalue())
+        self.assertEqual(InventoryItem.objects.filter(expired_at__isnull=False, quantity=0).count(), 5)
+        fresh.refresh_from_db()
+        self.assertIsNone(fresh.expired_at)
+
+        call_command('process_expired_items', stdout=out)
+        self.assertIn('Marked 0 items', out.getvalue())
+
+        response = self.client.patch(
+            f'/inventory/{expired[0].id}/', {'expiration_date': today + timedelta(days=3)}, format='json'
+        )
+        self.assertIsNone(response.data['expired_at'])
+
+
+@override_settings(CSV_EXPORT_INLINE_ROWS=2, BULK_IMPORT_INLINE_BYTES=100)
+class BackgroundJobTests(InventoryTestCase):
+    def setUp(self):
+        super().setUp()
+        job_files = tempfile.TemporaryDirectory()
+        self.addCleanup(job_files.cleanup)
+        self.enterContext(override_settings(JOB_FILES_ROOT=job_files.name))
+
+    def run_worker(self):
+        out = StringIO()
+        call_command('runworker', '--processes', '0', '--once', stdout=out)
+        return out.getvalue()
+
+    def test_large_export_runs_as_a_job(self):
+        self.make_items(2)
+        self.assertEqual(self.client.get('/inventory-report/').status_code, 200)
+        self.make_item(name='Third, "quoted"')
+        response = self.client.get('/inventory-report/')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['status'], 'PENDING')
+        self.assertIsNone(response.data['download_url'])
+        status_url = response['Location']
+
+        self.assertIn('done', self.run_worker())
+        job = self.client.get(status_url).data
+        self.assertEqual((job['status'], job['result']['rows']), ('DONE', 3))
+        download = self.client.get(job['download_url'])
+        self.assertEqual(download['Content-Disposition'], 'attachment; filename="inventory.csv"')
+        lines = b''.join(download.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 4)
+        self.assertIn('"Third, ""quoted"""', lines[1] + lines[2] + lines[3])
+
+        self.client.force_authenticate(User.objects.create_user('bob'))
+        self.assertEqual(self.client.get(status_url).status_code, 404)
+
+    def test_large_import_runs_as_a_job(self):
+        body = 'name,sku,quantity,price,threshold\n' + ''.join(
+            f'Imported {n},IMP-{n},5,1.50,2\n' for n in range(10)
+        )
+        response = self.client.post('/inventory/bulk/', body, content_type='text/csv')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(self.client.get(response['Location'] + 'download/').status_code, 409)
+        self.run_worker()
+        job = self.client.get(response['Location']).data
+        self.assertEqual(job['result']['created'], 10)
+        self.assertEqual(InventoryItem.objects.filter(sku__startswith='IMP-').count(), 10)
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_worker_refuses_per_process_cache(self):
+        with self.assertRaisesMessage(CommandError, 'shared cache'):
+            call_command('runworker', processes=0, once=True, stdout=StringIO())
+
+    def test_failures_and_claiming(self):
+        job = jobs.enqueue('inventory_import', self.user, {'format': 'csv'})
+        self.assertIn('failed', self.run_worker())
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertEqual(job.attempts, 1)
+        self.assertTrue(job.error)
+
+        first, second = jobs.enqueue('analytics_refresh', self.staff), jobs.enqueue('analytics_refresh', self.staff)
+        self.assertEqual(jobs.claim(), first)
+        self.assertEqual(jobs.claim(), second)
+        self.assertIsNone(jobs.claim())
+        # A job whose worker vanished is handed out again once its lease expires.
+        Job.objects.filter(pk=first.pk).update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(jobs.claim().attempts, 2)
+        self.assertEqual(jobs.complete(first, {}), 0)
+
+    def test_leases_are_renewed_until_taken_over(self):
+        jobs.enqueue('analytics_refresh', self.staff)
+        job = jobs.claim()
+        Job.objects.filter(pk=job.pk).update(lease_expires_at=timezone.now())
+        self.assertTrue(jobs.renew(job))
+        self.assertGreater(Job.objects.get(pk=job.pk).lease_expires_at, timezone.now())
+
+        Job.objects.filter(pk=job.pk).update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(jobs.claim().attempts, 2)
+        self.assertFalse(jobs.renew(job))
+        out = StringIO()
+        runworker.Command(stdout=out).completed(job, {}, 0)
+        self.assertIn('not recorded', out.getvalue())
+
+    def test_staff_can_queue_analytics_refresh(self):
+        self.assertEqual(self.client.post('/analytics/refresh/').status_code, 403)
+        self.client.force_authenticate(self.staff)
+        response = self.client.post('/analytics/refresh/', {'rebuild_sales': True}, format='json')
+        self.assertEqual(response.status_code, 202)
+        self.run_worker()
+        self.assertEqual(set(self.client.get(response['Location']).data['result']), {'stock_value_rows', 'sales_rows'})
+
+
+@override_settings(INSTRUMENTATION_SAMPLE_RATE=1, METRICS_TOKEN='scrape-me')
+class InstrumentationTests(InventoryTestCase):
+    def sample(self, name, labels):
+        for line in self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer scrape-me').content.decode().splitlines():
+            if line.startswith(f'{name}{{{labels}}} '):
+                return float(line.rsplit(' ', 1)[1])
+        return 0
+
+    def test_sampled_requests_are_measured(self):
+        self.make_items(3)
+        labels = 'view="inventory-list",method="GET"'
+        count, size = self.sample('inventory_db_queries_count', labels), self.sample('inventory_http_response_size_bytes_sum', labels)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/inventory/')
+        self.assertRegex(
+            response['Server-Timing'],
+            rf'^db;dur=[\d.]+;desc="{len(ctx.captured_queries)} queries", serialize;dur=[\d.]+, total;dur=[\d.]+$',
+        )
+        self.assertEqual(self.sample('inventory_db_queries_count', labels), count + 1)
+        self.assertEqual(self.sample('inventory_http_response_size_bytes_sum', labels), size + len(response.content))
+        self.assertEqual(
+            self.sample('inventory_db_queries_bucket', labels + f',le="+Inf"'),
+            self.sample('inventory_db_queries_count', labels),
+        )
+
+    @override_settings(INSTRUMENTATION_SAMPLE_RATE=0)
+    def test_unsampled_requests_are_only_counted(self):
+        labels = 'view="current_user",method="GET",status="200"'
+        before = self.sample('inventory_http_requests_total', labels)
+        response = self.client.get('/me/')
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(self.sample('inventory_http_requests_total', labels), before + 1)
+
+    def test_model_serializer_data_counts_as_serialization(self):
+        item = self.make_item(quantity=1)
+        to_representation = InventorySerializer.to_representation
+
+        def slow(serializer, instance):
+            time.sleep(0.02)
+            return to_representation(serializer, instance)
+
+        with mock.patch.object(InventorySerializer, 'to_representation', slow):
+            detail = self.client.get(f'/inventory/{item.id}/')
+            low_stock = self.client.get('/low-stock/')
+        for response in (detail, low_stock):
+            serialize = float(re.search(r'serialize;dur=([\d.]+)', response['Server-Timing'])[1])
+            self.assertGreaterEqual(serialize, 20)
+
+    def test_async_requests_and_serialization(self):
+        self.make_items(2)
+
+        async def view(request):
+            await InventoryItem.objects.acount()
+            with instrumentation.serializing(), instrumentation.serializing():
+                await InventoryItem.objects.aexists()
+            return HttpResponse(b'ok')
+
+        response = async_to_sync(instrumentation.InstrumentationMiddleware(view))(AsyncRequestFactory().get('/x/'))
+        db, serialize, total = [float(value) for value in re.findall(r'dur=([\d.]+)', response['Server-Timing'])]
+        self.assertIn('desc="2 queries"', response['Server-Timing'])
+        self.assertLessEqual(db + serialize, total)
+
+    @override_settings(INSTRUMENTATION_SAMPLE_RATE=0)
+    def test_unknown_methods_share_a_label(self):
+        labels = 'view="current_user",method="OTHER",status="405"'
+        before = self.sample('inventory_http_requests_total', labels)
+        self.client.generic('BREW', '/me/')
+        self.client.generic('PROPFIND', '/me/')
+        self.assertEqual(self.sample('inventory_http_requests_total', labels), before + 2)
+        self.assertEqual(self.sample('inventory_http_requests_total', 'view="current_user",method="BREW",status="405"'), 0)
+
+    def test_metrics_access(self):
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer scrape-me')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        self.assertIn('# TYPE inventory_http_request_duration_seconds histogram', response.content.decode())
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer scrape-you').status_code, 403)
+        with override_settings(METRICS_TOKEN=''):
+            # Loopback is not trusted unless listed.
+            self.assertEqual(self.client.get('/metrics').status_code, 403)
+            with override_settings(METRICS_ALLOWED_NETWORKS=['10.0.0.0/8']):
+                self.assertEqual(self.client.get('/metrics').status_code, 403)
+            with override_settings(METRICS_ALLOWED_NETWORKS=['127.0.0.0/8']):
+                self.assertEqual(self.client.get('/metrics').status_code, 200)
+
+
+class BenchmarkCommandTests(InventoryTestCase):
+    def test_seed_and_bench_against_a_baseline(self):
+        out = StringIO()
+        call_command('seed_bench', users=2, suppliers=3, items=20, orders=4, lines=2, stdout=out)
+        self.assertIn('2 users', out.getvalue())
+        self.assertEqual(InventoryItem.objects.filter(user__username='bench-1').count(), 20)
+        self.assertEqual(OrderItem.objects.filter(order__user__username='bench-0').count(), 8)
+        self.assertEqual(DailySales.objects.filter(user__username='bench-0').aggregate(n=Sum('orders'))['n'] or 0,
+                         Order.objects.filter(user__username='bench-0').exclude(status='CANCELLED').count())
+        with self.assertRaises(CommandError):
+            call_command('seed_bench', users=1, stdout=StringIO())
+        InventoryItem.objects.filter(user__username='bench-0').update(quantity=500)
+        orders_before = Order.objects.count()
+
+        with tempfile.TemporaryDirectory() as directory:
+            baseline = f'{directory}/baseline.json'
+            bench = {'iterations': 2, 'warmup': 0, 'memory_iterations': 1, 'baseline': baseline, 'stdout': StringIO()}
+            call_command('bench_api', save_baseline=True, **bench)
+            with open(baseline) as f:
+                results = json.load(f)
+            self.assertEqual(set(results), {'inventory_list', 'low_stock', 'csv_export', 'order_create', 'order_history', 'status_update'})
+            self.assertEqual(Order.objects.count(), orders_before)
+
+            results['order_history']['queries'] -= 1
+            with open(baseline, 'w') as f:
+                json.dump(results, f)
+            with self.assertRaisesMessage(CommandError, 'order_history.queries'):
+                call_command('bench_api', scenarios=['order_history'], fail_on_regression=True, **bench)
@@ -1,10 +1,13 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
-    InventoryViewSet, SupplierViewSet, OrderViewSet,
+    InventoryViewSet, SupplierViewSet, OrderViewSet, JobViewSet,
     export_inventory_csv, low_stock_items,
     register_user, get_current_user_info,
-    order_history, update_order_status
+    order_history, update_order_status,
+    revenue_analytics, top_skus_analytics, supplier_analytics, stock_value_analytics,
+    refresh_analytics
 )
 
 # Create a router and register our viewsets with it.
@@ -12,16 +15,34 @@ router = DefaultRouter()
 router.register(r'inventory', InventoryViewSet, basename='inventory')   # CRUD endpoints for inventory items
 router.register(r'suppliers', SupplierViewSet, basename='suppliers')   # CRUD endpoints for suppliers
 router.register(r'orders', OrderViewSet, basename='orders')            # CRUD endpoints for orders
+router.register(r'jobs', JobViewSet, basename='jobs')                  # Background job status and downloads
 
 # Define the URL patterns for the API.
 urlpatterns = [
-    path('', include(router.urls)),  # Include all router-generated endpoints
-
-    # Custom endpoints not covered by the router:
+    # Custom endpoints not covered by the router (listed first so that e.g.
+    # orders/history/ is not swallowed by the router's orders/<pk>/ route):
     path('inventory-report/', export_inventory_csv, name='inventory_csv'),  # Export inventory as CSV
     path('low-stock/', low_stock_items, name='low_stock'),                 # Get low-stock inventory items
     path('register/', register_user, name='register_user'),                # User registration endpoint
     path('me/', get_current_user_info, name='current_user'),               # Get current logged-in user's info
     path('orders/history/', order_history, name='order_history'),          # Get order history for user
     path('orders/<int:pk>/update-status/', update_order_status, name='update_order_status'),  # Admin: update order status
+    path('analytics/revenue/', revenue_analytics, name='analytics_revenue'),              # Revenue per day
+    path('analytics/top-skus/', top_skus_analytics, name='analytics_top_skus'),           # Best selling SKUs
+    path('analytics/suppliers/', supplier_analytics, name='analytics_suppliers'),         # Sales per supplier
+    path('analytics/stock-value/', stock_value_analytics, name='analytics_stock_value'),  # Stock value per supplier
+    path('analytics/refresh/', refresh_analytics, name='analytics_refresh'),              # Admin: recompute rollups (job)
+
+    path('', include(router.urls)),  # Include all router-generated endpoints
 ]
+
+if settings.ASYNC_READ_VIEWS:
+    from . import async_views
+
+    # Async versions take precedence over the sync routes above.
+    urlpatterns = [
+        path('inventory/', async_views.inventory_list, name='inventory-list'),
+        path('low-stock/', async_views.low_stock_items, name='low_stock'),
+        path('me/', async_views.get_current_user_info, name='current_user'),
+        path('orders/history/', async_views.order_history, name='order_history'),
+    ] + urlpatterns
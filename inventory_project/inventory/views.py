@@ -1,19 +1,47 @@
-from django.http import HttpResponse
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files import File
+from django.http import FileResponse, StreamingHttpResponse
 from django.contrib.auth.models import User
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.parsers import MultiPartParser
+from rest_framework.exceptions import ValidationError as APIValidationError
 from rest_framework.response import Response
 from rest_framework import viewsets, permissions, status
-from django.core.exceptions import PermissionDenied
-from django.db.models import F
-from .models import InventoryItem, UserProfile, Supplier, Order, OrderItem
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.db import DEFAULT_DB_ALIAS, router, transaction
+from django.db.models import F, Prefetch
+from django.utils import timezone
+from .models import InventoryItem, Job, UserProfile, Supplier, Order, OrderItem, Discount
 from .serializers import (
     InventorySerializer, 
     UserProfileSerializer, 
     SupplierSerializer, 
-    OrderSerializer
+    OrderSerializer,
+    JobSerializer
 )
+from .pagination import CreatedAtCursorPagination, ExpirationCursorPagination, SearchPagination
+from .search import search_inventory
+from .filters import ExpiringParamsSerializer, InventoryFilterBackend, InventoryOrderingFilter
+from .caching import ALL_SCOPE, SHARED_SCOPE, low_stock_cache_key
+from .importers import InventoryImport, ROW_READERS, detect_format
+from .exports import CSV_EXPORT_HEADER, export_items, export_rows, stream_csv
+from .fast_serializers import InventoryRowSerializer, OrderRowSerializer, RowListMixin
+from .conditional import ConditionalRequestMixin
+from .sync import DeltaSyncMixin
+from . import analytics, hashing, jobs
 from rest_framework.permissions import BasePermission, SAFE_METHODS
-import csv
+from datetime import timedelta
+
+# Relations read by InventorySerializer (including the nested SupplierSerializer).
+INVENTORY_RELATED = ('user', 'supplier', 'supplier__created_by')
+
+def order_queryset():
+    # Everything OrderSerializer reads, fetched in a fixed number of batched queries.
+    return Order.objects.select_related('user').prefetch_related(
+        Prefetch('order_items', queryset=OrderItem.objects.select_related('item').order_by('pk')),
+        Prefetch('discounts', queryset=Discount.objects.order_by('pk')),
+    )
 
 class IsAdminOrReadOnly(BasePermission):
     def has_permission(self, request, view):
@@ -21,9 +49,11 @@ class IsAdminOrReadOnly(BasePermission):
             return request.user and request.user.is_authenticated
         return request.user and request.user.is_staff
 
-class SupplierViewSet(viewsets.ModelViewSet):
+class SupplierViewSet(ConditionalRequestMixin, viewsets.ModelViewSet):
     serializer_class = SupplierSerializer
     permission_classes = [IsAdminOrReadOnly]
+    etag_scopes = (SHARED_SCOPE,)
+    pagination_class = CreatedAtCursorPagination
 
     def get_queryset(self):
         user = self.request.user
@@ -34,15 +64,68 @@ class SupplierViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
 
-class InventoryViewSet(viewsets.ModelViewSet):
+class InventoryViewSet(DeltaSyncMixin, ConditionalRequestMixin, RowListMixin, viewsets.ModelViewSet):
     serializer_class = InventorySerializer
+    row_serializer = InventoryRowSerializer()
+    # Suppliers and usernames are nested in each item.
+    etag_scopes = (SHARED_SCOPE,)
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = CreatedAtCursorPagination
+    filter_backends = [InventoryFilterBackend, InventoryOrderingFilter]
+    # Orderable columns are limited to indexed ones.
+    ordering_fields = ['created_at', 'sku']
+    ordering = ['-created_at', '-id']
 
     def get_queryset(self):
         user = self.request.user
-        if user.is_staff:
-            return InventoryItem.objects.all()
-        return InventoryItem.objects.filter(user=user)
+        queryset = InventoryItem.objects.select_related(*INVENTORY_RELATED)
+        if not user.is_staff:
+            queryset = queryset.filter(user=user)
+
+        query = self.search_query()
+        if query and self.action == 'list':
+            queryset = search_inventory(queryset, query)
+
+        fields = self.requested_fields()
+        if fields:
+            # Keep the orderable columns: the pagination cursor reads them.
+            queryset = InventorySerializer.sparse_queryset(queryset, fields, extra_columns=self.ordering_fields)
+        return queryset
+
+    def search_query(self):
+        return self.request.query_params.get('q', '').strip()
+
+    def requested_fields(self):
+        """Fields named in ?fields=a,b,c on reads, or None for all of them."""
+        if self.request.method not in SAFE_METHODS or not self.request.query_params.get('fields'):
+            return None
+        fields = [name.strip() for name in self.request.query_params['fields'].split(',') if name.strip()]
+        unknown = [name for name in fields if name not in InventorySerializer.FIELD_COLUMNS]
+        if unknown:
+            raise APIValidationError({'fields': f'Unknown fields: {", ".join(unknown)}'})
+        return fields
+
+    def get_serializer(self, *args, **kwargs):
+        fields = self.requested_fields()
+        if fields:
+            kwargs['fields'] = fields
+        return super().get_serializer(*args, **kwargs)
+
+    def use_row_serializer(self):
+        return super().use_row_serializer() and not self.requested_fields()
+
+    @property
+    def paginator(self):
+        # Ranked search results are paged by page number; everything else
+        # keeps the keyset cursor.
+        if not hasattr(self, '_paginator'):
+            if self.action == 'list' and self.search_query():
+                self._paginator = SearchPagination()
+            elif self.action == 'expiring':
+                self._paginator = ExpirationCursorPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
 
     def perform_create(self, serializer):
         data = self.request.data
@@ -67,15 +150,69 @@ class InventoryViewSet(viewsets.ModelViewSet):
 
         serializer.save(user=user, supplier=supplier)
 
-class OrderViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['get'])
+    def expiring(self, request):
+        """Items expiring between today and ?within= days (default 7), soonest first, one page at a time."""
+        params = ExpiringParamsSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        today = timezone.localdate()
+        queryset = self.get_queryset().filter(
+            expiration_date__gte=today,
+            expiration_date__lte=today + timedelta(days=params.validated_data['within'])
+        )
+        if self.use_row_serializer():
+            page = self.paginate_queryset(self.row_serializer.values(queryset))
+            return self.get_paginated_response(self.row_serializer.render(page))
+        page = self.paginate_queryset(queryset)
+        return self.get_paginated_response(self.get_serializer(page, many=True).data)
+
+    @action(detail=False, methods=['post'], url_path='bulk', parser_classes=[MultiPartParser])
+    def bulk(self, request):
+        """
+        Upsert many items at once. Send CSV (with a header row) or NDJSON,
+        either as the raw request body or as a multipart `file` field.
+        Files over BULK_IMPORT_INLINE_BYTES get a 202 and a job instead.
+        """
+        if request.content_type.startswith('multipart/'):
+            upload = request.FILES.get('file')
+            if upload is None:
+                return Response({'error': 'Upload a file in the "file" field'}, status=status.HTTP_400_BAD_REQUEST)
+            stream, fmt = upload, detect_format(upload.content_type, upload.name)
+            size, name = upload.size, upload.name
+        else:
+            stream, fmt = request.stream, detect_format(request.content_type)
+            size, name = int(request.META.get('CONTENT_LENGTH') or 0), f'import.{fmt}'
+
+        if fmt is None:
+            return Response(
+                {'error': 'Send text/csv or application/x-ndjson'},
+                status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+            )
+        if stream is None:
+            return Response({'error': 'Empty upload'}, status=status.HTTP_400_BAD_REQUEST)
+
+        limit = settings.BULK_IMPORT_INLINE_BYTES
+        if limit and size > limit:
+            # Large files are stored and imported by a worker.
+            job = jobs.enqueue('inventory_import', request.user, {'format': fmt}, input_file=File(stream, name=name))
+            return jobs.accepted(request, job)
+
+        result = InventoryImport(request.user).run(ROW_READERS[fmt](stream))
+        return Response(result.summary(), status=status.HTTP_200_OK)
+
+class OrderViewSet(DeltaSyncMixin, ConditionalRequestMixin, RowListMixin, viewsets.ModelViewSet):
     serializer_class = OrderSerializer
+    row_serializer = OrderRowSerializer()
+    # Line items show the current item name and SKU.
+    etag_scopes = (ALL_SCOPE,)
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = CreatedAtCursorPagination
 
     def get_queryset(self):
         user = self.request.user
         status_filter = self.request.query_params.get('status', None)
         
-        queryset = Order.objects.all().order_by('-created_at')
+        queryset = order_queryset().order_by('-created_at')
         if not user.is_staff:
             queryset = queryset.filter(user=user)
         
@@ -105,42 +242,74 @@ class OrderViewSet(viewsets.ModelViewSet):
             tax_id=request.data.get('tax_id', '')
         )
 
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+        # Re-read with the batched prefetches so rendering the new order
+        # does not cost one query per line item.
+        order = order_queryset().get(pk=order.pk)
+        return Response(self.get_serializer(order).data, status=status.HTTP_201_CREATED)
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        # Deleting a live order gives its stock back, like cancelling it;
+        # locked so a concurrent cancel cannot release it twice.
+        order = Order.objects.select_for_update().get(pk=instance.pk)
+        if order.status != 'CANCELLED':
+            InventoryItem.release_stock(order.line_quantities())
+        analytics.order_deleted(order)
+        super().perform_destroy(order)
+
+class JobViewSet(viewsets.ReadOnlyModelViewSet):
+    """Status of background jobs (see inventory.jobs), and their result files."""
+    serializer_class = JobSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = CreatedAtCursorPagination
+
+    def get_queryset(self):
+        user = self.request.user
+        return Job.objects.all() if user.is_staff else Job.objects.filter(user=user)
+
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        job = self.get_object()
+        if job.status != Job.DONE or not job.result_file:
+            return Response({'error': 'This job has no file to download yet'}, status=status.HTTP_409_CONFLICT)
+        filename = (job.result or {}).get('filename') or job.result_file.name.rsplit('/', 1)[-1]
+        return FileResponse(job.result_file.open('rb'), as_attachment=True, filename=filename)
 
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def export_inventory_csv(request):
+    """
+    Stream the CSV, or - past CSV_EXPORT_INLINE_ROWS rows, or with
+    ?background=true - answer 202 with a job that builds the file.
+    """
     user = request.user
-    items = InventoryItem.objects.all() if user.is_staff else InventoryItem.objects.filter(user=user)
+    limit = settings.CSV_EXPORT_INLINE_ROWS
+    background = request.query_params.get('background') == 'true'
+    if background or (limit and export_items(user).order_by()[limit:limit + 1].exists()):
+        return jobs.accepted(request, jobs.enqueue('inventory_csv', user))
 
-    response = HttpResponse(content_type='text/csv')
+    # The rows are read while the response streams, after the request is
+    # over for ReplicaRouter, so pick the database now.
+    rows = export_rows(user, using=router.db_for_read(InventoryItem))
+    response = StreamingHttpResponse(stream_csv(CSV_EXPORT_HEADER, rows), content_type='text/csv')
     response['Content-Disposition'] = 'attachment; filename="inventory.csv"'
-
-    writer = csv.writer(response)
-    writer.writerow(['Name', 'SKU', 'Quantity', 'Price', 'Supplier', 'Expiration Date', 'Threshold', 'Added By'])
-
-    for item in items:
-        writer.writerow([
-            item.name,
-            item.sku,
-            item.quantity,
-            item.price,
-            item.supplier.name if item.supplier else '',
-            item.expiration_date,
-            item.threshold,
-            item.user.username
-        ])
     return response
 
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def low_stock_items(request):
     user = request.user
-    items = InventoryItem.objects.filter(quantity__lt=F('threshold'))
-    if not user.is_staff:
-        items = items.filter(user=user)
-    serializer = InventorySerializer(items, many=True)
-    return Response(serializer.data)
+    cache_key = low_stock_cache_key(user)
+    data = cache.get(cache_key)
+    if data is None:
+        # From the primary: the key's generation was bumped there, and rows
+        # from a lagging replica would sit under it until the timeout.
+        items = InventoryItem.objects.using(DEFAULT_DB_ALIAS).select_related(*INVENTORY_RELATED).filter(quantity__lt=F('threshold'))
+        if not user.is_staff:
+            items = items.filter(user=user)
+        data = InventorySerializer(items, many=True).data
+        cache.set(cache_key, data, settings.LOW_STOCK_CACHE_TIMEOUT)
+    return Response(data)
 
 @api_view(['POST'])
 @permission_classes([permissions.AllowAny])
@@ -153,11 +322,13 @@ def register_user(request):
     if User.objects.filter(username=data['username']).exists():
         return Response({'error': 'Username taken'}, status=status.HTTP_400_BAD_REQUEST)
 
-    user = User.objects.create_user(
-        username=data['username'],
-        email=data['email'],
-        password=data['password']
+    # What create_user() does, with the hashing on the bounded pool.
+    user = User(
+        username=User.normalize_username(data['username']),
+        email=User.objects.normalize_email(data['email']),
+        password=hashing.make_password(data['password'])
     )
+    user.save()
 
     UserProfile.objects.create(
         user=user,
@@ -185,7 +356,7 @@ def order_history(request):
     user = request.user
     status_filter = request.query_params.get('status', None)
     
-    orders = Order.objects.filter(user=user).order_by('-created_at')
+    orders = order_queryset().filter(user=user).order_by('-created_at')
     if status_filter and status_filter != 'ALL':
         orders = orders.filter(status=status_filter)
         
@@ -201,25 +372,105 @@ def update_order_status(request, pk):
             status=status.HTTP_403_FORBIDDEN
         )
     
-    try:
-        order = Order.objects.get(pk=pk)
-    except Order.DoesNotExist:
-        return Response(
-            {'error': 'Order not found'},
-            status=status.HTTP_404_NOT_FOUND
-        )
-    
     new_status = request.data.get('status')
     if not new_status:
         return Response(
             {'error': 'Status is required'},
             status=status.HTTP_400_BAD_REQUEST
         )
-    
-    order.status = new_status
-    order.save()
+
+    with transaction.atomic():
+        # Lock the order so two concurrent status changes cannot both
+        # release (or re-reserve) its stock.
+        try:
+            order = Order.objects.select_for_update().get(pk=pk)
+        except Order.DoesNotExist:
+            return Response(
+                {'error': 'Order not found'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        old_status = order.status
+        was_cancelled = old_status == 'CANCELLED'
+        if new_status == 'CANCELLED' and not was_cancelled:
+            InventoryItem.release_stock(order.line_quantities())
+        elif was_cancelled and new_status != 'CANCELLED':
+            try:
+                InventoryItem.reserve_stock(order.line_quantities())
+            except ValidationError as exc:
+                transaction.set_rollback(True)
+                return Response(
+                    {'error': exc.message_dict['items'][0]},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+        order.status = new_status
+        order.save()
+        analytics.order_status_changed(order, old_status)
     
     return Response(
         {'message': f'Order status updated to {new_status}'},
         status=status.HTTP_200_OK
-    )
\ No newline at end of file
+    )
+
+def analytics_params(request):
+    params = analytics.AnalyticsParamsSerializer(data=request.query_params)
+    params.is_valid(raise_exception=True)
+    return params.validated_data
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def revenue_analytics(request):
+    """Revenue, orders and units per day, from ?since= to ?until= (default: the last 30 days)."""
+    params = analytics_params(request)
+    rows = analytics.revenue_by_day(request.user, params['since'], params['until'])
+    return Response({
+        'since': params['since'],
+        'until': params['until'],
+        'results': analytics.DailyRevenueSerializer(rows, many=True).data,
+    })
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def top_skus_analytics(request):
+    """The ?limit= best selling SKUs by units in the window."""
+    params = analytics_params(request)
+    rows = analytics.top_skus(request.user, params['since'], params['until'], params['limit'])
+    return Response({
+        'since': params['since'],
+        'until': params['until'],
+        'results': analytics.SkuSalesSerializer(rows, many=True).data,
+    })
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def supplier_analytics(request):
+    """Units and revenue per supplier in the window."""
+    params = analytics_params(request)
+    rows = analytics.sales_by_supplier(request.user, params['since'], params['until'])
+    return Response({
+        'since': params['since'],
+        'until': params['until'],
+        'results': analytics.SupplierSalesSerializer(rows, many=True).data,
+    })
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def stock_value_analytics(request):
+    """Stock value per supplier from the latest snapshot up to ?until= (default today)."""
+    params = analytics_params(request)
+    day, rows = analytics.stock_value_by_supplier(request.user, params['until'])
+    return Response({
+        'day': day,
+        'results': analytics.StockValueSerializer(rows, many=True).data,
+    })
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def refresh_analytics(request):
+    """Admin: snapshot stock value (and with rebuild_sales, recompute sales) in the background."""
+    if not request.user.is_staff:
+        return Response({'error': 'Only admin can refresh analytics'}, status=status.HTTP_403_FORBIDDEN)
+    params = analytics.RefreshParamsSerializer(data=request.data)
+    params.is_valid(raise_exception=True)
+    return jobs.accepted(request, jobs.enqueue('analytics_refresh', request.user, params.data))
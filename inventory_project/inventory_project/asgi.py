@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "inventory_project.settings")
+# Read by settings.py, which is only loaded by get_asgi_application().
+os.environ.setdefault("DJANGO_ASGI", "true")
 
 application = get_asgi_application()
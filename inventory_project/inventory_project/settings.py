@@ -1,6 +1,9 @@
+import os
 from pathlib import Path
 from datetime import timedelta
 
+from corsheaders.defaults import default_headers
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 SECRET_KEY = "your-secret-key"
@@ -23,7 +26,9 @@ INSTALLED_APPS = [
 
 # Middleware (no CSRF)
 MIDDLEWARE = [
+    "inventory.instrumentation.InstrumentationMiddleware",
     "corsheaders.middleware.CorsMiddleware",
+    "inventory.routers.ReplicaRoutingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -35,17 +40,66 @@ MIDDLEWARE = [
 
 # CORS
 CORS_ALLOW_ALL_ORIGINS = True
+# Conditional requests: let the frontend read validators and send them back.
+CORS_ALLOW_HEADERS = (*default_headers, 'if-match', 'if-none-match')
+CORS_EXPOSE_HEADERS = ['ETag', 'Last-Modified']
 
 # REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'inventory.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'inventory.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
 }
 
+# Render inventory and order lists from .values() rows instead of model serializers.
+FAST_LIST_SERIALIZERS = os.environ.get('FAST_LIST_SERIALIZERS', 'true').lower() == 'true'
+
+# Route the read-heavy endpoints to the native async views in
+# inventory/async_views.py. Only worth it when served over ASGI.
+ASYNC_READ_VIEWS = os.environ.get('ASYNC_READ_VIEWS', 'false').lower() == 'true'
+
+# ?updated_since= delta sync: how far the cursor trails the clock, and how
+# long deletes are remembered (older cursors get 410 Gone).
+DELTA_SYNC_OVERLAP_SECONDS = int(os.environ.get('DELTA_SYNC_OVERLAP_SECONDS', 5))
+TOMBSTONE_RETENTION_DAYS = int(os.environ.get('TOMBSTONE_RETENTION_DAYS', 30))
+
+# Background jobs (inventory/jobs.py, run by `manage.py runworker`).
+# Inputs and results are stored under JOB_FILES_ROOT and deleted with their
+# job after JOB_RETENTION_DAYS. A running job whose worker has not finished
+# it within JOB_LEASE_SECONDS is handed to another worker, up to
+# JOB_MAX_ATTEMPTS times.
+JOB_FILES_ROOT = Path(os.environ.get('JOB_FILES_ROOT', BASE_DIR / 'job_files'))
+JOB_RETENTION_DAYS = int(os.environ.get('JOB_RETENTION_DAYS', 7))
+JOB_LEASE_SECONDS = int(os.environ.get('JOB_LEASE_SECONDS', 3600))
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', 3))
+# Larger CSV exports (rows) and bulk imports (bytes) run as jobs and answer
+# 202 with the job; 0 keeps them in the request.
+CSV_EXPORT_INLINE_ROWS = int(os.environ.get('CSV_EXPORT_INLINE_ROWS', 10000))
+BULK_IMPORT_INLINE_BYTES = int(os.environ.get('BULK_IMPORT_INLINE_BYTES', 5 * 1024 * 1024))
+
+# Per-view query counts and timings (inventory/instrumentation.py): measured
+# for INSTRUMENTATION_SAMPLE_RATE of requests (0 turns it off, 1 measures
+# all), which also get a Server-Timing header unless
+# INSTRUMENTATION_SERVER_TIMING=false. /metrics serves them to Prometheus,
+# to callers presenting METRICS_TOKEN as a bearer token. Without a token,
+# set METRICS_ALLOWED_NETWORKS to scrape by address instead; with neither
+# it answers 403 (loopback is not trusted: a reverse proxy on the same host
+# makes every client look local).
+INSTRUMENTATION_SAMPLE_RATE = float(os.environ.get('INSTRUMENTATION_SAMPLE_RATE', 0.01))
+INSTRUMENTATION_SERVER_TIMING = os.environ.get('INSTRUMENTATION_SERVER_TIMING', 'true').lower() == 'true'
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+METRICS_ALLOWED_NETWORKS = [
+    network.strip() for network in os.environ.get('METRICS_ALLOWED_NETWORKS', '').split(',')
+    if network.strip()
+]
+
 # JWT settings
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=30),
@@ -56,6 +110,9 @@ SIMPLE_JWT = {
     'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
 }
 
+# How long CachedJWTAuthentication keeps a user's identity; 0 disables it.
+JWT_USER_CACHE_SECONDS = int(os.environ.get('JWT_USER_CACHE_SECONDS', 60))
+
 ROOT_URLCONF = "inventory_project.urls"
 
 TEMPLATES = [
@@ -75,18 +132,72 @@ TEMPLATES = [
 
 WSGI_APPLICATION = "inventory_project.wsgi.application"
 
+# Set by asgi.py.
+SERVED_OVER_ASGI = os.environ.get('DJANGO_ASGI', 'false').lower() == 'true'
+
 # PostgreSQL config
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
-        'NAME': 'inventory',
-        'USER': 'postgres',
-        'PASSWORD': 'Prerana@54',
-        'HOST': 'localhost',
-        'PORT': '5432',
+        'NAME': os.environ.get('DB_NAME', 'inventory'),
+        'USER': os.environ.get('DB_USER', 'postgres'),
+        'PASSWORD': os.environ.get('DB_PASSWORD', 'Prerana@54'),
+        'HOST': os.environ.get('DB_HOST', 'localhost'),
+        'PORT': os.environ.get('DB_PORT', '5432'),
+        # Reuse connections across requests instead of paying the TCP and
+        # auth handshake every time; health checks drop dead ones first.
+        # Not under ASGI or with the async views: their queries run on
+        # whichever thread is free, each keeping its own connection open,
+        # and Django's docs say to disable persistent connections in async
+        # mode and pool instead (DB_POOL below, or PgBouncer).
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 0 if SERVED_OVER_ASGI or ASYNC_READ_VIEWS else 60)),
+        'CONN_HEALTH_CHECKS': os.environ.get('DB_CONN_HEALTH_CHECKS', 'true').lower() == 'true',
+        'OPTIONS': {},
     }
 }
 
+# DB_POOL=true switches to psycopg 3's built-in connection pool (needs the
+# psycopg[pool] extra). Django requires CONN_MAX_AGE=0 with a pool.
+if os.environ.get('DB_POOL', 'false').lower() == 'true':
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default']['OPTIONS']['pool'] = {
+        'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+        'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+        'timeout': int(os.environ.get('DB_POOL_TIMEOUT', 10)),
+    }
+
+# Read replicas: DB_REPLICA_HOSTS=host1,host2 adds one alias per host
+# (replica1, replica2, ...) sharing the primary's credentials. Reads made
+# while serving safe requests are spread across them; a user who just wrote
+# reads from the primary for REPLICA_PIN_SECONDS.
+DATABASE_REPLICAS = []
+for index, host in enumerate(filter(None, os.environ.get('DB_REPLICA_HOSTS', '').split(',')), start=1):
+    alias = f'replica{index}'
+    DATABASES[alias] = dict(
+        DATABASES['default'],
+        HOST=host.strip(),
+        OPTIONS=dict(DATABASES['default']['OPTIONS']),
+        TEST={'MIRROR': 'default'},
+    )
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['inventory.routers.ReplicaRouter']
+REPLICA_PIN_SECONDS = int(os.environ.get('REPLICA_PIN_SECONDS', 5))
+
+# Cache (low-stock results, their generation counters, JWT users, replica
+# pins). It must be shared by every process that writes inventory - web
+# workers, `runworker`, `process_expired_items` - or cache invalidations in
+# one never reach the others; those commands refuse to run on locmem. The
+# default file cache is shared by the processes of one host; use Redis or
+# Memcached (DJANGO_CACHE_BACKEND / DJANGO_CACHE_LOCATION) across hosts.
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('DJANGO_CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.environ.get('DJANGO_CACHE_LOCATION', str(BASE_DIR / 'cache')),
+    }
+}
+LOW_STOCK_CACHE_TIMEOUT = int(os.environ.get('LOW_STOCK_CACHE_TIMEOUT', 300))
+
 AUTH_PASSWORD_VALIDATORS = [
     {"NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator"},
     {"NAME": "django.contrib.auth.password_validation.MinimumLengthValidator"},
@@ -94,6 +205,25 @@ AUTH_PASSWORD_VALIDATORS = [
     {"NAME": "django.contrib.auth.password_validation.NumericPasswordValidator"},
 ]
 
+# Password hashing. PBKDF2 cost comes from PASSWORD_HASH_ITERATIONS (0 keeps
+# Django's default); existing hashes are upgraded on login. Hashing for
+# logins and registration runs on a bounded pool (mode 'thread', 'process'
+# or 'inline'); when PASSWORD_HASH_WORKERS are busy and
+# PASSWORD_HASH_QUEUE_SIZE more are waiting, further requests get a 429.
+PASSWORD_HASHERS = [
+    "inventory.hashing.ConfigurablePBKDF2PasswordHasher",
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+    "django.contrib.auth.hashers.Argon2PasswordHasher",
+    "django.contrib.auth.hashers.BCryptSHA256PasswordHasher",
+    "django.contrib.auth.hashers.ScryptPasswordHasher",
+]
+AUTHENTICATION_BACKENDS = ["inventory.backends.PooledModelBackend"]
+PASSWORD_HASH_ITERATIONS = int(os.environ.get('PASSWORD_HASH_ITERATIONS', 0))
+PASSWORD_HASH_MODE = os.environ.get('PASSWORD_HASH_MODE', 'thread')
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', max(1, (os.cpu_count() or 2) // 2)))
+PASSWORD_HASH_QUEUE_SIZE = int(os.environ.get('PASSWORD_HASH_QUEUE_SIZE', 32))
+PASSWORD_HASH_RETRY_AFTER = int(os.environ.get('PASSWORD_HASH_RETRY_AFTER', 1))
+
 LANGUAGE_CODE = "en-us"
 TIME_ZONE = "UTC"
 USE_I18N = True
@@ -2,6 +2,8 @@ from django.contrib import admin
 from django.urls import path, include
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
+from inventory.instrumentation import metrics_view
+
 urlpatterns = [
     path("admin/", admin.site.urls),  # Django admin site
 
@@ -9,5 +11,7 @@ urlpatterns = [
     path("api/token/", TokenObtainPairView.as_view(), name="token_obtain_pair"),      # Obtain JWT access and refresh tokens
     path("api/token/refresh/", TokenRefreshView.as_view(), name="token_refresh"),      # Refresh JWT access token using refresh token
 
+    path("metrics", metrics_view, name="metrics"),  # Prometheus scrape endpoint
+
     path("", include("inventory.urls")),  # Include all URLs from the inventory app
 ]